@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Entry body transformation: body2html vs. the element-tree reference
+
+Times the streaming body2html() against body2html_tree(), which
+tests/test_transform_body.py checks it against. With --srcdir, every
+entry of the LDOCE5 'fs' archive is used; otherwise a synthetic entry.
+
+Usage: python benchmarks/bench_body2html.py [--srcdir LDOCE5_DATA_DIR]
+           [--entries N] [--rounds N]
+"""
+
+import os
+import os.path
+import sys
+import time
+from optparse import OptionParser
+
+import lxml.etree as et
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ldoce5viewer.ldoce5.transform_body import body2html
+from tests.body2html_tree import body2html_tree
+from tests.entries import BODY_ENTRY, archive_entries
+
+
+def timeit(f, entries, rounds):
+    best = None
+    for _ in range(rounds):
+        roots = [et.fromstring(data) for data in entries]
+        t = time.perf_counter()
+        for root in roots:
+            f(root)
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv):
+    optparser = OptionParser()
+    optparser.add_option("--srcdir", default=None)
+    optparser.add_option("--entries", type="int", default=2000)
+    optparser.add_option("--rounds", type="int", default=3)
+    (options, args) = optparser.parse_args(argv[1:])
+
+    if options.srcdir:
+        entries = archive_entries(options.srcdir)
+    else:
+        entries = [BODY_ENTRY] * options.entries
+
+    t_ref = timeit(body2html_tree, entries, options.rounds)
+    t_new = timeit(body2html, entries, options.rounds)
+    print(
+        f"{len(entries)} entries: body2html_tree {len(entries) / t_ref:.0f} entries/s"
+        f"  body2html {len(entries) / t_new:.0f} entries/s  ({t_ref / t_new:.1f}x)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
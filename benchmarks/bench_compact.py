@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Headword/phrase index: whoosh (fulltext) vs. compact backend
+
+Builds the same synthetic corpus with both backends, then reports build
+time, index size, open time and per-query latency. That both return the
+same results is checked by tests/test_compact.py.
+
+Usage: python benchmarks/bench_compact.py [--docs N] [--rounds N]
+"""
+
+import os
+import os.path
+import random
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ldoce5viewer import compact, fulltext
+
+# synthetic vocabulary: "back", "bake", "bell", ..., "tore"
+_WORDS = tuple(
+    c + v for c in "bcdfghlmprstw" for v in ("ack", "ake", "ell", "ing", "ore")
+) + ("a", "an", "the", "off", "up", "out")
+
+_QUERIES = (
+    ("take", None, ()),
+    ("take off", None, ()),
+    ("make NOT sell", None, ()),
+    ('"take off"', None, ()),
+    ("ta*", None, ("hm",)),
+    (None, "(asfilter:233 OR asfilter:234) AND (asfilter:u1)", ("hm",)),
+    ("bell", "asfilter:341", ("hm", "hp")),
+)
+
+
+def make_items(num_docs):
+    rand = random.Random(0)
+    items = []
+    for i in range(num_docs):
+        content = " ".join(rand.choice(_WORDS) for _ in range(rand.randint(1, 5)))
+        items.append(
+            (
+                rand.choice(("hm", "hv", "hp", "p", "pl")),
+                content,
+                " ".join(rand.sample(("233", "234", "235", "334", "341", "u1"), 2)),
+                f"<h><n>{content}</n></h>",
+                f"/fs/u{i:07d}",
+                rand.randint(1, 30),
+                content,
+            )
+        )
+    return items
+
+
+def build(maker, items, ranks):
+    t = time.perf_counter()
+    for item, rank in zip(items, ranks, strict=True):
+        maker.add_item(*item, rank)
+    maker.commit()
+    maker.close()
+    return time.perf_counter() - t
+
+
+def disk_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def run_queries(searcher, rounds):
+    timings = []
+    for _ in range(rounds):
+        for q1, q2, itemtypes in _QUERIES:
+            fulltext._result_cache.invalidate()
+            t = time.perf_counter()
+            searcher.search(searcher.make_collector(None), q1, q2, itemtypes)
+            timings.append(time.perf_counter() - t)
+    timings.sort()
+    n = len(timings)
+    return (1000 * sum(timings) / n, 1000 * timings[n // 2])
+
+
+def main(argv):
+    optparser = OptionParser()
+    optparser.add_option("--docs", type="int", default=50000)
+    optparser.add_option("--rounds", type="int", default=10)
+    (options, args) = optparser.parse_args(argv[1:])
+
+    items = make_items(options.docs)
+    ranks = fulltext.sort_ranks((item[6], item[5]) for item in items)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        whoosh_path = os.path.join(tmpdir, "fulltext")
+        compact_path = os.path.join(tmpdir, "compact.idx")
+        var_path = os.path.join(tmpdir, "none.cdb")
+
+        backends = (
+            (
+                "whoosh",
+                whoosh_path,
+                lambda: fulltext.Maker(whoosh_path),
+                lambda: fulltext.Searcher(whoosh_path, var_path),
+            ),
+            (
+                "compact",
+                compact_path,
+                lambda: compact.Maker(compact_path, compact_path + ".tmp"),
+                lambda: compact.Searcher(compact_path, var_path),
+            ),
+        )
+        for name, path, make_maker, open_searcher in backends:
+            build_time = build(make_maker(), items, ranks)
+            t = time.perf_counter()
+            searcher = open_searcher()
+            searcher.search(searcher.make_collector(1), "take")
+            open_time = time.perf_counter() - t
+            (mean, p50) = run_queries(searcher, options.rounds)
+            searcher.close()
+            print(
+                f"{name:>8}: build {build_time:6.2f} s  size {disk_size(path) / 1e6:6.2f} MB"
+                f"  open {1000 * open_time:7.2f} ms"
+                f"  query mean {mean:7.2f} ms  p50 {p50:7.2f} ms"
+            )
+    finally:
+        shutil.rmtree(tmpdir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Entry extraction throughput (ldoce5.extract.get_entry_items)
+
+With --srcdir, extracts the items of every entry of the LDOCE5 'fs'
+archive, as the indexer does; otherwise, of a synthetic entry that
+exercises every kind of item. Reports entries and items per second.
+
+Usage: python benchmarks/bench_extract.py [--srcdir LDOCE5_DATA_DIR] [--rounds N]
+"""
+
+import os
+import os.path
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ldoce5viewer.ldoce5.extract import get_entry_items
+from tests.entries import EXTRACT_ENTRY, archive_entries
+
+
+def main(argv):
+    optparser = OptionParser()
+    optparser.add_option("--srcdir", default=None)
+    optparser.add_option("--entries", type="int", default=5000)
+    optparser.add_option("--rounds", type="int", default=3)
+    (options, args) = optparser.parse_args(argv[1:])
+
+    if options.srcdir:
+        entries = archive_entries(options.srcdir)
+    else:
+        entries = [EXTRACT_ENTRY] * options.entries
+
+    best = None
+    for _ in range(options.rounds):
+        num_items = 0
+        t = time.perf_counter()
+        for data in entries:
+            (items, variations) = get_entry_items(data)
+            for item in items:
+                num_items += 1
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(
+        f"{len(entries)} entries, {num_items} items in {best:.3f} s:"
+        f"  {len(entries) / best:.0f} entries/s  {num_items / best:.0f} items/s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
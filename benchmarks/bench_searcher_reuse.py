@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Per-query overhead of fulltext.Searcher: reopened vs. long-lived searcher
+
+Builds a small synthetic full-text index in a temporary directory, then runs
+the same queries twice: once reopening the whoosh searcher before every query
+(the old behaviour), once reusing the long-lived searcher, and finally with
+the result cache enabled.
+
+Usage: python benchmarks/bench_searcher_reuse.py [--docs N] [--rounds N]
+"""
+
+import os.path
+import random
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ldoce5viewer import fulltext
+
+# synthetic vocabulary: "back", "bake", "bell", ..., "tore"
+_WORDS = tuple(
+    c + v for c in "bcdfghlmprstw" for v in ("ack", "ake", "ell", "ing", "ore")
+)
+
+_QUERIES = ("ring", "take off", "make AND sell", "bell NOT ring", "hack", "wing")
+
+
+def build_index(index_dir, num_docs):
+    rand = random.Random(0)
+    items = []
+    for i in range(num_docs):
+        words = rand.sample(_WORDS, rand.randint(1, 6))
+        content = " ".join(words)
+        items.append(
+            (
+                rand.choice(("hm", "hv", "p", "pl")),
+                content,
+                "",
+                f"<h><n>{words[0]}</n></h>",
+                f"/fs/u{i:07d}",
+                rand.randint(1, 30),
+                content,
+            )
+        )
+    ranks = fulltext.sort_ranks((item[6], item[5]) for item in items)
+
+    maker = fulltext.Maker(index_dir)
+    for item, rank in zip(items, ranks, strict=True):
+        maker.add_item(*item, rank)
+    maker.commit()
+    maker.close()
+
+
+def run_queries(searcher, rounds, reopen, cached=False):
+    timings = []
+    for _ in range(rounds):
+        for q in _QUERIES:
+            if reopen:
+                # drop the long-lived whoosh searcher, as the old code did
+                searcher._local.live.close()
+            if not cached:
+                fulltext._result_cache.invalidate()
+            t = time.perf_counter()
+            searcher.search(searcher.make_collector(1000), q)
+            timings.append(time.perf_counter() - t)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    n = len(timings)
+    mean = 1000 * sum(timings) / n
+    p50 = 1000 * timings[n // 2]
+    p95 = 1000 * timings[min(n - 1, n * 95 // 100)]
+    print(f"{name:>12}: mean {mean:7.3f} ms  p50 {p50:7.3f} ms  p95 {p95:7.3f} ms")
+
+
+def main(argv):
+    optparser = OptionParser()
+    optparser.add_option("--docs", type="int", default=20000)
+    optparser.add_option("--rounds", type="int", default=50)
+    (options, args) = optparser.parse_args(argv[1:])
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        index_dir = os.path.join(tmpdir, "fulltext")
+        build_index(index_dir, options.docs)
+        searcher = fulltext.Searcher(index_dir, os.path.join(tmpdir, "none.cdb"))
+        try:
+            run_queries(searcher, 1, False)  # warm up
+            report("reopened", run_queries(searcher, options.rounds, True))
+            report("long-lived", run_queries(searcher, options.rounds, False))
+            report("cached", run_queries(searcher, options.rounds, False, True))
+        finally:
+            searcher.close()
+    finally:
+        shutil.rmtree(tmpdir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
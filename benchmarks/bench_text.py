@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""normalize_token / normalize_index_key: reference vs. accelerated
+
+Times both implementations over a token stream; tests/test_text.py
+checks that they agree. With --srcdir, the stream is every token and sort key of the
+items extracted from the LDOCE5 'fs' archive (as the indexer sees
+them); otherwise it is a synthetic mix of ASCII and accented words.
+
+Usage: python benchmarks/bench_text.py [--srcdir LDOCE5_DATA_DIR] [--rounds N]
+"""
+
+import os
+import os.path
+import sys
+import time
+import unicodedata
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ldoce5viewer.utils.text import normalize_index_key, normalize_token
+from tests.entries import corpus_stream, synthetic_stream
+
+
+def reference_normalize_token(t):
+    key = t.replace("©", "c")
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", key) if unicodedata.category(c) != "Mn"
+    )
+
+
+def reference_normalize_index_key(key):
+    key = key.strip().lower().replace("©", "c")
+    return "".join(
+        c
+        for c in unicodedata.normalize("NFKD", key)
+        if unicodedata.category(c) in ("Ll", "Nd")
+    )
+
+
+def timeit(f, items, rounds):
+    best = None
+    for _ in range(rounds):
+        t = time.perf_counter()
+        for item in items:
+            f(item)
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv):
+    optparser = OptionParser()
+    optparser.add_option("--srcdir", default=None)
+    optparser.add_option("--tokens", type="int", default=1000000)
+    optparser.add_option("--rounds", type="int", default=3)
+    (options, args) = optparser.parse_args(argv[1:])
+
+    if options.srcdir:
+        (tokens, keys) = corpus_stream(options.srcdir)
+    else:
+        (tokens, keys) = synthetic_stream(options.tokens)
+
+    for name, items, ref, new in (
+        ("normalize_token", tokens, reference_normalize_token, normalize_token),
+        (
+            "normalize_index_key",
+            keys,
+            reference_normalize_index_key,
+            normalize_index_key,
+        ),
+    ):
+        t_ref = timeit(ref, items, options.rounds)
+        t_new = timeit(new, items, options.rounds)
+        print(
+            f"{name:>20}: {len(items)} calls  reference {t_ref:6.3f} s"
+            f"  accelerated {t_new:6.3f} s  ({t_ref / t_new:4.1f}x)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Keystroke-to-list latency of the main window (offscreen Qt)
+
+Runs MainWindow with QT_QPA_PLATFORM=offscreen on a synthetic LDOCE5
+data directory and index (see synthetic.py), with the configuration and
+the index in a temporary directory. Types words into the search box a
+key at a time, --interval ms apart, as a user does, and presses Return
+after each word to open the item selected. Times, per keystroke:
+
+    ui.search   MainWindow._instantSearch(): the incremental search
+    ui.list     from the key to the list filled with the incremental
+                results, after the delay of _incr_delay_func()
+    ui.merged   from the key to the list with the full-text results
+                merged in
+
+and per word:
+
+    ui.page     from Return to the page loaded
+
+A list not shown before the next key is pressed is not timed, as the
+user never sees it; the report counts the keys whose merged list was
+not shown as superseded.
+The latency percentiles are printed, and written with --json in the
+format of suite.py, which --compare reads back.
+
+Usage: python benchmarks/bench_ui.py [--entries N] [--words N]
+           [--interval MS] [--seed N] [--json FILE] [--compare BASELINE.json]
+"""
+
+import json
+import os
+import os.path
+import random
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import lxml.etree as et
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import synthetic
+from PySide6.QtCore import QEventLoop, Qt, QTimer
+from PySide6.QtTest import QTest
+from PySide6.QtWidgets import QApplication
+from suite import print_table, summarize, write_report
+
+from ldoce5viewer.qtgui.access import register_url_schemes
+from ldoce5viewer.qtgui.config import get_config
+from ldoce5viewer.qtgui.main import _INDEX_SUPPORTED, MainWindow
+
+_POLL_INTERVAL = 1  # ms
+
+
+class Session:
+    """The timings of a typing session"""
+
+    def __init__(self):
+        self.keys = []
+        self.pages = []
+        self.superseded = 0
+        self._key = None
+        self._page = None
+
+    def key_pressed(self):
+        if self._key is not None and "merged" not in self._key:
+            self.superseded += 1
+        self._key = {"t": time.perf_counter()}
+        self.keys.append(self._key)
+
+    def searched(self, elapsed):
+        if self._key is not None:
+            self._key.setdefault("search", elapsed)
+
+    def listed(self, merged):
+        key = self._key
+        if key is not None:
+            elapsed = time.perf_counter() - key["t"]
+            key.setdefault("list", elapsed)
+            if merged:
+                key.setdefault("merged", elapsed)
+
+    def settled(self):
+        return self._key is None or "merged" in self._key
+
+    def page_requested(self):
+        self._page = {"t": time.perf_counter()}
+        self.pages.append(self._page)
+
+    def page_loaded(self, succeeded):
+        page = self._page
+        if page is not None and "page" not in page:
+            page["page"] = time.perf_counter() - page["t"]
+            page["ok"] = succeeded
+
+    def page_done(self):
+        return self._page is None or "page" in self._page
+
+    def samples(self, name):
+        records = self.pages if name == "page" else self.keys
+        return [r[name] for r in records if name in r]
+
+
+class TimedMainWindow(MainWindow):
+    """MainWindow telling a session when the steps of a key end
+
+    The timers and signals are connected to the bound methods when the
+    window is set up, so overriding the methods is enough.
+    """
+
+    # MainWindow.__init__ already updates the list, untimed
+    _session = None
+
+    def __init__(self, session):
+        super().__init__()
+        self._session = session
+
+    def _instantSearch(self, pending=False, delay=True):
+        t = time.perf_counter()
+        super()._instantSearch(pending, delay)
+        if self._session is not None:
+            self._session.searched(time.perf_counter() - t)
+
+    def _updateIndex(self):
+        super()._updateIndex()
+        if self._session is not None:
+            self._session.listed(self._fts_results is not None)
+
+    def _onLoadFinished(self, succeeded, title=None):
+        super()._onLoadFinished(succeeded, title)
+        if self._session is not None:
+            self._session.page_loaded(succeeded)
+
+
+def wait(condition, timeout):
+    """Run the event loop until condition() is true or timeout (ms)"""
+    deadline = time.perf_counter() + timeout / 1000
+    loop = QEventLoop()
+    while not condition() and time.perf_counter() < deadline:
+        QTimer.singleShot(_POLL_INTERVAL, loop.quit)
+        loop.exec()
+    return condition()
+
+
+def type_words(window, session, words, interval, timeout):
+    le = window._ui.lineEditSearch
+    for word in words:
+        le.setFocus()
+        le.clear()
+        for c in word:
+            session.key_pressed()
+            QTest.keyClick(le, c)
+            wait(lambda: False, interval)
+        wait(session.settled, timeout)
+
+        session.page_requested()
+        QTest.keyClick(le, Qt.Key_Return)
+        wait(session.page_done, timeout)
+
+
+def headwords(entries):
+    words = set()
+    for data in entries:
+        base = et.fromstring(data).findtext("Head/HWD/BASE")
+        if base:
+            words.add(base.strip())
+    return sorted(words)
+
+
+def main(argv):
+    optparser = OptionParser()
+    optparser.add_option("--entries", type="int", default=2000)
+    optparser.add_option("--words", type="int", default=30)
+    optparser.add_option(
+        "--interval",
+        type="int",
+        default=120,
+        help="Milliseconds between keys (default: 120)",
+    )
+    optparser.add_option(
+        "--timeout",
+        type="int",
+        default=10000,
+        help="Milliseconds to wait for a list or a page (default: 10000)",
+    )
+    optparser.add_option("--seed", type="int", default=0)
+    optparser.add_option("--json", default=None, help="Write the report to a file")
+    optparser.add_option(
+        "--compare", default=None, help="Compare with an earlier JSON report"
+    )
+    optparser.add_option("--threshold", type="float", default=0.15)
+    (options, args) = optparser.parse_args(argv[1:])
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["benchmarks"]
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # the configuration and the index of the viewer
+        os.environ["XDG_CONFIG_HOME"] = os.path.join(tmpdir, "config")
+        os.environ["XDG_DATA_HOME"] = os.path.join(tmpdir, "share")
+        config = get_config()
+
+        print("making the data and the index", file=sys.stderr)
+        data_root = os.path.join(tmpdir, "ldoce5.data")
+        entries = synthetic.make_entries(options.entries, options.seed)
+        synthetic.make_ldoce5_dir(data_root, entries)
+        synthetic.make_viewer_index(config._data_dir, data_root)
+
+        rand = random.Random(options.seed)
+        words = headwords(entries)
+        words = rand.sample(words, min(options.words, len(words)))
+
+        register_url_schemes()
+        app = QApplication(argv[:1])
+        config["dataDir"] = data_root
+        config["versionIndexed"] = _INDEX_SUPPORTED
+
+        session = Session()
+        window = TimedMainWindow(session)
+        wait(window.isVisible, options.timeout)
+        window.activateWindow()
+        print(f"typing {len(words)} words", file=sys.stderr)
+        type_words(window, session, words, options.interval, options.timeout)
+        window.close()
+        app.processEvents()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    results = {}
+    for name in ("search", "list", "merged", "page"):
+        samples = session.samples(name)
+        if samples:
+            results[f"ui.{name}"] = summarize(samples)
+    regressions = print_table(results, baseline, options.threshold)
+
+    failed = sum(1 for page in session.pages if not page.get("ok"))
+    print(
+        f"{len(session.keys)} keys, {session.superseded} superseded;"
+        f" {len(session.pages)} pages, {failed} not loaded"
+    )
+
+    if options.json:
+        write_report(
+            options.json,
+            results,
+            entries=options.entries,
+            words=len(words),
+            interval=options.interval,
+            seed=options.seed,
+            superseded=session.superseded,
+        )
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
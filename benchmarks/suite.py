@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""Benchmark suite on synthetic data
+
+Builds, from a seed, a fake IDM archive, a CDB and the search indexes
+(see synthetic.py), so that no LDOCE5 data is needed, then times:
+
+    cdb.get                      CDBReader.get, hits and misses
+    cdb.finalize                 CDBMaker.finalize
+    incremental.search           incremental.Searcher.search, by prefix
+    fulltext.search              fulltext.Searcher.search (whoosh), uncached
+    compact.search               compact.Searcher.search, uncached
+    archive.read.sequential      ArchiveReader.read in archive order
+    archive.read.random          ArchiveReader.read in random order
+    extract.get_entry_items      get_entry_items on the archive's entries
+    transform.ARCHIVE            the transform of each archive type
+
+Each operation is timed on its own; the latency percentiles and the
+throughput of each benchmark are printed as a table and, with --json,
+written as JSON together with the versions and the parameters of the
+run. With --compare, the median latencies are compared with those of an
+earlier JSON report, and the exit status is 1 if any is slower by more
+than --threshold.
+
+Usage: python benchmarks/suite.py [--quick | --scale X] [--seed N]
+           [--only PATTERN] [--json FILE] [--compare BASELINE.json]
+"""
+
+import datetime
+import fnmatch
+import json
+import os
+import os.path
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+import lxml.etree as et
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import synthetic
+
+from ldoce5viewer import compact, fulltext, incremental
+from ldoce5viewer.ldoce5 import idmreader, transform
+from ldoce5viewer.ldoce5.extract import get_entry_items
+from ldoce5viewer.utils.cdb import CDBMaker, CDBReader
+
+_VERSION = 1  # of the JSON report
+_WARMUP = 10  # operations run before timing
+
+_BENCHMARKS = []
+
+
+def benchmark(name):
+    def register(f):
+        _BENCHMARKS.append((name, f))
+        return f
+
+    return register
+
+
+def time_ops(op, inputs):
+    """Call op on each input, return the latencies in seconds"""
+    inputs = list(inputs)
+    for x in inputs[:_WARMUP]:
+        op(x)
+    perf_counter = time.perf_counter
+    samples = []
+    for x in inputs:
+        t = perf_counter()
+        op(x)
+        samples.append(perf_counter() - t)
+    return samples
+
+
+def summarize(samples):
+    """Return the statistics of latencies, in microseconds"""
+    samples = sorted(samples)
+    n = len(samples)
+    total = sum(samples)
+
+    def percentile(p):
+        # nearest rank
+        return samples[max(0, min(n - 1, int(round(p / 100 * n + 0.5)) - 1))]
+
+    return {
+        "n": n,
+        "mean_us": 1e6 * total / n,
+        "p50_us": 1e6 * percentile(50),
+        "p90_us": 1e6 * percentile(90),
+        "p95_us": 1e6 * percentile(95),
+        "p99_us": 1e6 * percentile(99),
+        "max_us": 1e6 * samples[-1],
+        "ops_per_sec": n / total if total > 0 else float("inf"),
+    }
+
+
+class Data:
+    """The synthetic data, made on first use and shared by the benchmarks"""
+
+    def __init__(self, tmpdir, scale, seed):
+        self.tmpdir = tmpdir
+        self.seed = seed
+        self._scale = scale
+        self._cache = {}
+
+    def count(self, n):
+        return max(_WARMUP, int(n * self._scale))
+
+    def rand(self):
+        return random.Random(self.seed)
+
+    def _get(self, key, make):
+        if key not in self._cache:
+            self._cache[key] = make()
+        return self._cache[key]
+
+    @property
+    def cdb(self):
+        def make():
+            path = os.path.join(self.tmpdir, "bench.cdb")
+            return (path, synthetic.make_cdb(path, self.count(100000), self.seed))
+
+        return self._get("cdb", make)
+
+    @property
+    def items(self):
+        return self._get(
+            "items", lambda: synthetic.make_items(self.count(50000), self.seed)
+        )
+
+    @property
+    def archive(self):
+        """(data_root, [(entry data, location)]) of an 'fs' archive"""
+
+        def make():
+            root = os.path.join(self.tmpdir, "ldoce5")
+            entries = synthetic.make_entries(self.count(5000), self.seed)
+            files = [("", f"u{i:07d}", data) for (i, data) in enumerate(entries)]
+            synthetic.write_idm_archive(root, "fs", files)
+            locations = [loc for (d, n, loc) in idmreader.list_files(root, "fs")]
+            return (root, list(zip(entries, locations, strict=True)))
+
+        return self._get("archive", make)
+
+    @property
+    def var_path(self):
+        return os.path.join(self.tmpdir, "none.cdb")
+
+    def queries(self, num):
+        rand = self.rand()
+        return [synthetic.make_word(rand) for _ in range(num)]
+
+
+# Benchmarks
+
+
+@benchmark("cdb.get")
+def bench_cdb_get(data):
+    (path, keys) = data.cdb
+    rand = data.rand()
+    lookups = [rand.choice(keys) for _ in range(data.count(100000))]
+    # one in ten misses
+    lookups[::10] = [b"x" + key for key in lookups[::10]]
+    with CDBReader(path) as reader:
+        return time_ops(reader.get, lookups)
+
+
+@benchmark("cdb.finalize")
+def bench_cdb_finalize(data):
+    rand = data.rand()
+    records = [
+        (b"k%08d" % i, rand.randbytes(rand.randint(8, 200)))
+        for i in range(data.count(50000))
+    ]
+    path = os.path.join(data.tmpdir, "finalize.cdb")
+    samples = []
+    for _ in range(10):
+        with open(path, "w+b") as f:
+            maker = CDBMaker(f)
+            for k, v in records:
+                maker.add(k, v)
+            t = time.perf_counter()
+            maker.finalize()
+            samples.append(time.perf_counter() - t)
+    os.remove(path)
+    return samples
+
+
+@benchmark("incremental.search")
+def bench_incremental_search(data):
+    path = os.path.join(data.tmpdir, "incremental.db")
+    if not os.path.exists(path):
+        synthetic.make_incremental(path, data.items)
+    rand = data.rand()
+    keys = [w[: rand.randint(1, len(w))] for w in data.queries(data.count(5000))]
+    with incremental.Searcher(path) as searcher:
+        return time_ops(lambda key: searcher.search(key, 500), keys)
+
+
+def _queries(data, num):
+    rand = data.rand()
+    words = data.queries(num)
+    queries = []
+    for i, word in enumerate(words):
+        kind = i % 4
+        if kind == 0:
+            queries.append((word, None, ()))
+        elif kind == 1:
+            queries.append((f"{word} {rand.choice(synthetic.WORDS)}", None, ()))
+        elif kind == 2:
+            queries.append((word[:3] + "*", None, ("hm",)))
+        else:
+            queries.append((word, "asfilter:233 OR asfilter:u1", ("hm", "hp")))
+    return queries
+
+
+def _search(searcher, queries):
+    def op(query):
+        (q1, q2, itemtypes) = query
+        fulltext._result_cache.invalidate()
+        searcher.search(searcher.make_collector(None), q1, q2, itemtypes)
+
+    return time_ops(op, queries)
+
+
+@benchmark("fulltext.search")
+def bench_fulltext_search(data):
+    index_dir = os.path.join(data.tmpdir, "fulltext")
+    if not os.path.exists(index_dir):
+        os.mkdir(index_dir)
+        # whoosh indexes slowly; a fifth of the items is enough
+        synthetic.make_fulltext(index_dir, data.items[: len(data.items) // 5])
+    searcher = fulltext.Searcher(index_dir, data.var_path)
+    try:
+        return _search(searcher, _queries(data, data.count(500)))
+    finally:
+        searcher.close()
+
+
+@benchmark("compact.search")
+def bench_compact_search(data):
+    path = os.path.join(data.tmpdir, "compact.idx")
+    if not os.path.exists(path):
+        synthetic.make_compact(path, data.items)
+    searcher = compact.Searcher(path, data.var_path)
+    try:
+        return _search(searcher, _queries(data, data.count(2000)))
+    finally:
+        searcher.close()
+
+
+@benchmark("archive.read.sequential")
+def bench_archive_read_sequential(data):
+    (root, entries) = data.archive
+    with idmreader.ArchiveReader(root, "fs") as reader:
+        return time_ops(reader.read, [loc for (d, loc) in entries])
+
+
+@benchmark("archive.read.random")
+def bench_archive_read_random(data):
+    (root, entries) = data.archive
+    locations = [loc for (d, loc) in entries]
+    data.rand().shuffle(locations)
+    with idmreader.ArchiveReader(root, "fs") as reader:
+        return time_ops(reader.read, locations)
+
+
+@benchmark("extract.get_entry_items")
+def bench_extract(data):
+    def op(entry_data):
+        (items, variations) = get_entry_items(entry_data)
+        for item in items:
+            pass
+
+    return time_ops(op, [d for (d, loc) in data.archive[1][: data.count(2000)]])
+
+
+def _bench_transform(archive):
+    def bench(data):
+        f = getattr(transform, synthetic.TRANSFORMS[archive])
+        if archive == "fs":
+            docs = [(d,) for (d, loc) in data.archive[1][: data.count(2000)]]
+        else:
+            pages = synthetic.PAGES[archive]
+            docs = pages * (data.count(2000) // len(pages))
+        return time_ops(lambda args: f(*args), docs)
+
+    return bench
+
+
+for _archive in sorted(synthetic.TRANSFORMS):
+    benchmark(f"transform.{_archive}")(_bench_transform(_archive))
+
+
+# Reports
+
+
+def metadata(**params):
+    """Return the versions and the platform, and params"""
+    import whoosh
+
+    return {
+        "date": datetime.datetime.now(datetime.UTC).isoformat(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "lxml": ".".join(map(str, et.LXML_VERSION)),
+        "libxml2": ".".join(map(str, et.LIBXML_VERSION)),
+        "whoosh": whoosh.versionstring(),
+        **params,
+    }
+
+
+def write_report(filename, results, **params):
+    report = {"version": _VERSION, "meta": metadata(**params), "benchmarks": results}
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def print_table(results, baseline, threshold):
+    header = f"{'benchmark':<34}{'n':>7}{'p50 us':>11}{'p95 us':>11}"
+    header += f"{'p99 us':>11}{'ops/s':>12}"
+    if baseline is not None:
+        header += f"{'p50 vs base':>13}"
+    print(header)
+    regressions = []
+    for name, r in results.items():
+        line = f"{name:<34}{r['n']:>7}{r['p50_us']:>11.1f}{r['p95_us']:>11.1f}"
+        line += f"{r['p99_us']:>11.1f}{r['ops_per_sec']:>12.0f}"
+        base = (baseline or {}).get(name)
+        if base is not None and base["p50_us"] > 0:
+            change = r["p50_us"] / base["p50_us"] - 1
+            line += f"{change:>+12.1%}"
+            if change > threshold:
+                line += " !"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main(argv):
+    optparser = OptionParser()
+    optparser.add_option(
+        "--scale",
+        type="float",
+        default=1.0,
+        help="Multiply the sizes of the data and the numbers of operations",
+    )
+    optparser.add_option(
+        "--quick", action="store_const", dest="scale", const=0.1, help="--scale 0.1"
+    )
+    optparser.add_option("--seed", type="int", default=0)
+    optparser.add_option(
+        "--only",
+        action="append",
+        default=None,
+        help="Run the benchmarks matching a glob pattern (repeatable)",
+    )
+    optparser.add_option("--json", default=None, help="Write the report to a file")
+    optparser.add_option(
+        "--compare", default=None, help="Compare with an earlier JSON report"
+    )
+    optparser.add_option(
+        "--threshold",
+        type="float",
+        default=0.15,
+        help="Relative p50 increase reported as a regression (default: 0.15)",
+    )
+    optparser.add_option("--list", action="store_true", default=False)
+    (options, args) = optparser.parse_args(argv[1:])
+
+    selected = [
+        (name, f)
+        for (name, f) in _BENCHMARKS
+        if not options.only
+        or any(fnmatch.fnmatchcase(name, pattern) for pattern in options.only)
+    ]
+    if options.list:
+        for name, f in selected:
+            print(name)
+        return 0
+    if not selected:
+        optparser.error("no benchmark matches --only")
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            report = json.load(f)
+        baseline = report["benchmarks"]
+        if report["meta"].get("scale") != options.scale:
+            print("warning: the baseline was run with another --scale", file=sys.stderr)
+
+    results = {}
+    tmpdir = tempfile.mkdtemp()
+    try:
+        data = Data(tmpdir, options.scale, options.seed)
+        for name, f in selected:
+            print(f"running {name}", file=sys.stderr)
+            results[name] = summarize(f(data))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    regressions = print_table(results, baseline, options.threshold)
+
+    if options.json:
+        write_report(options.json, results, scale=options.scale, seed=options.seed)
+
+    if regressions:
+        print(
+            f"{len(regressions)} regression(s) over {options.threshold:.0%}:",
+            ", ".join(regressions),
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
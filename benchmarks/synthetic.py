@@ -0,0 +1,311 @@
+"""Synthetic data for the benchmarks
+
+Generates, from a seed, data in the formats the viewer reads, so that
+the benchmarks run without the LDOCE5 data:
+
+- IDM archives (files.skn and dirs.skn, as idmreader reads them)
+  holding entries made from tests.entries.EXTRACT_ENTRY
+- a document of each archive type, for the page transforms
+- CDB files
+- incremental, compact and whoosh full-text indexes
+- an LDOCE5 data directory and the indexes the viewer makes of it
+"""
+
+import os
+import os.path
+import random
+import re
+import sys
+import zlib
+from struct import pack
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ldoce5viewer import compact, fulltext, incremental
+from ldoce5viewer.ldoce5 import filemap, idmreader
+from ldoce5viewer.ldoce5.extract import get_entry_items
+from ldoce5viewer.utils.cdb import CDBMaker
+from tests.entries import BODY_ENTRY, EXTRACT_ENTRY
+
+# "back", "bake", "bell", ..., "tore"
+WORDS = tuple(
+    c + v for c in "bcdfghlmprstw" for v in ("ack", "ake", "ell", "ing", "ore")
+)
+
+_FILES_CFT = "[DAT]\n$content, offset = ULONG\n$a_dirs, directory = USHORT\n"
+_DIRS_CFT = "[DAT]\n$parent, parent = USHORT\n"
+
+
+def make_word(rand):
+    return "".join(rand.choice(WORDS) for _ in range(rand.randint(1, 3)))
+
+
+# the entries of the archives have neither, and the transforms expect none
+_COMMENTS_AND_PIS = re.compile(rb"<!--.*?-->|<\?.*?\?>", re.DOTALL)
+
+
+def make_entries(num, seed=0):
+    """Return num entries like EXTRACT_ENTRY, with distinct ids and words"""
+    rand = random.Random(seed)
+    template = _COMMENTS_AND_PIS.sub(b"", EXTRACT_ENTRY)
+    entries = []
+    for i in range(num):
+        word = make_word(rand).encode("ascii")
+        data = template.replace(b'id="a.b.c.d"', b'id="u.e.%d.n"' % i)
+        entries.append(data.replace(b"beautiful", word))
+    return entries
+
+
+_ENTRY_ASSETS = """<SE_EntryAssets>
+<EntryAsset type="ENTRY_COLLOCATIONS"><Refs><Ref topic="c1"/><Ref topic="c2"/></Refs></EntryAsset>
+<EntryAsset type="Corpus_Examples"><Refs><Ref topic="x 1"/></Refs></EntryAsset>
+<EntryAsset type="etymology"><Refs><Ref topic="e1"/></Refs></EntryAsset>
+<EntryAsset type="activator"><Refs/></EntryAsset></SE_EntryAssets>"""
+
+# archive: the arguments of its transform, for a few documents of each
+PAGES = {
+    "fs": [
+        (BODY_ENTRY.replace(b"</Entry>", _ENTRY_ASSETS.encode() + b"</Entry>"),),
+        (
+            b"<Entry><Head><HWD><BASE>caf\xc3\xa9 &amp; co</BASE></HWD><POS>noun</POS>"
+            b'<Audio resource="GB_HWD_PRON" topic="p/g.mp3"/></Head>'
+            b"<Sense><DEF>a place</DEF></Sense></Entry>",
+        ),
+    ],
+    "collocations": [
+        (
+            b"<collocations><ColloBox><HEADING>Adjectives</HEADING><Section>"
+            b"<SECHEADING>good</SECHEADING><Collocate><coll-head><COLLOC>a &lt;good"
+            b"&gt; day</COLLOC></coll-head><coll-body><span class='neutral'> </span>"
+            b"<EXAMPLE>It was a <COLLOINEXA>good</COLLOINEXA> day \xe2\x86\x92 x"
+            b"</EXAMPLE></coll-body></Collocate></Section></ColloBox></collocations>",
+        ),
+    ],
+    "examples": [
+        (
+            b"<examples><exa-head><hwd>take</hwd><pos>verb</pos></exa-head><exa-body>"
+            b"<exa> She <COLLOINEXA>took <span>x</span>it</COLLOINEXA> home. </exa>"
+            b"<exa>plain</exa></exa-body></examples>",
+        ),
+    ],
+    "word_families": [
+        (
+            b'<wf><group><pos>noun</pos><w><Ref topic="a.b.c.d">beauty</Ref>'
+            b'<opp><Ref topic="a.b.c.e">ugliness</Ref></opp></w>'
+            b"<w> beautician <i>x</i> </w></group></wf>",
+        ),
+    ],
+    "etymologies": [
+        (
+            b"<Etymology><span class='neutral'> [</span>Date: 1500-1600"
+            b"<LANG>French</LANG> \xe2\x80\xa7 x</Etymology>",
+        ),
+    ],
+    "phrases": [
+        (
+            b'<phrases><phrase><phrase-head><Ref topic="a.b.c.d" bookmark="a.b.e.f">'
+            b"take off</Ref></phrase-head><phrase-body><exa>The plane <PHR>took off"
+            b"</PHR>.</exa></phrase-body></phrase></phrases>",
+        ),
+    ],
+    "thesaurus": [
+        (
+            [
+                b"<Thesaurus><SECHEADING>words for nice</SECHEADING><Exponent>"
+                b"<exp-head><EXP>lovely</EXP></exp-head><exp-body><DEF>very "
+                b"<GLOSS>nice</GLOSS></DEF></exp-body></Exponent></Thesaurus>"
+            ],
+        ),
+    ],
+    "word_sets": [
+        (
+            [
+                b"<ws><ws-head><name>Food</name><number>12</number></ws-head><ws-body>"
+                b'<Ref topic="a.b.c.d"><hwd>apple</hwd><pos>noun</pos></Ref>'
+                b'<Ref topic="x"><hwd/><pos>verb</pos></Ref></ws-body></ws>'
+            ],
+        ),
+    ],
+    "activator": [
+        (
+            b'<Concept id="c1"><HWD>big/large</HWD><Section id="s1"><SECNR>1</SECNR>'
+            b"big in size<GLOSS>x</GLOSS></Section><SUBHWD>huge/vast</SUBHWD>"
+            b'<Section id="s2">very big</Section><References><Reference>'
+            b'<REFTYPE>see also</REFTYPE><Crossref><Ref topic="c2" selection="s9">'
+            b"small/little</Ref></Crossref></Reference></References></Concept>",
+            b"<Sec><SECDEF><SECNR> 2 </SECNR>very big</SECDEF><Exponent><EXP>huge"
+            b"</EXP><DEF>very <NonDV><REFHWD>big</REFHWD></NonDV></DEF></Exponent>"
+            b"</Sec>",
+            "s1",
+        ),
+    ],
+}
+
+# archive: the name of its function in ldoce5.transform
+TRANSFORMS = {
+    "fs": "trans_entry",
+    "collocations": "trans_collocations",
+    "examples": "trans_examples",
+    "word_families": "trans_word_families",
+    "etymologies": "trans_etymologies",
+    "phrases": "trans_phrases",
+    "thesaurus": "trans_thesaurus",
+    "word_sets": "trans_word_sets",
+    "activator": "trans_activator",
+}
+
+
+def write_idm_archive(data_root, archive_name, files, block_size=1 << 16):
+    """Write an IDM archive of (dirname, name, data) files
+
+    The files are packed, each followed by a NUL byte, into zlib blocks
+    of about block_size bytes. Return the number of blocks.
+    """
+    base = os.path.join(data_root, idmreader._ARCHIVE_DIRS[archive_name])
+    files_base = os.path.join(base, "files.skn")
+    dirs_base = os.path.join(base, "dirs.skn")
+    os.makedirs(files_base, exist_ok=True)
+    os.makedirs(dirs_base, exist_ok=True)
+
+    # directory 0 is the root
+    dirnames = [""] + sorted({dirname for (dirname, name, data) in files if dirname})
+    dir_numbers = {dirname: i for (i, dirname) in enumerate(dirnames)}
+    with open(os.path.join(dirs_base, "config.cft"), "w") as f:
+        f.write(_DIRS_CFT)
+    with open(os.path.join(dirs_base, "NAME.tda"), "wb") as f:
+        f.write(b"".join(d.encode("utf-8") + b"\0" for d in dirnames))
+    with open(os.path.join(dirs_base, "dirs.dat"), "wb") as f:
+        f.write(b"".join(pack("<H", 0) for d in dirnames))
+
+    records = []
+    catalog = []
+    offset = 0
+    block = []
+    with open(os.path.join(files_base, "CONTENT.tda"), "wb") as content:
+
+        def flush():
+            data = b"".join(block)
+            cmp = zlib.compress(data)
+            content.write(cmp)
+            catalog.append(pack("<LL", len(data), len(cmp)))
+            block.clear()
+
+        size = 0
+        for dirname, name, data in files:
+            records.append(pack("<LH", offset, dir_numbers[dirname or ""]))
+            block.append(data + b"\0")
+            offset += len(data) + 1
+            size += len(data) + 1
+            if size >= block_size:
+                flush()
+                size = 0
+        if block:
+            flush()
+
+    with open(os.path.join(files_base, "config.cft"), "w") as f:
+        f.write(_FILES_CFT)
+    with open(os.path.join(files_base, "NAME.tda"), "wb") as f:
+        f.write(b"".join(name.encode("utf-8") + b"\0" for (d, name, x) in files))
+    with open(os.path.join(files_base, "files.dat"), "wb") as f:
+        f.write(b"".join(records))
+    with open(os.path.join(files_base, "CONTENT.tda.tdz"), "wb") as f:
+        f.write(b"".join(catalog))
+    return len(catalog)
+
+
+def make_cdb(path, num, seed=0):
+    """Write a CDB of num records; return the keys"""
+    rand = random.Random(seed)
+    keys = [b"k%08d" % i for i in range(num)]
+    with open(path, "w+b") as f:
+        maker = CDBMaker(f)
+        for key in keys:
+            maker.add(key, rand.randbytes(rand.randint(8, 200)))
+        maker.finalize()
+    return keys
+
+
+def make_items(num, seed=0):
+    """Return num (itemtype, content, asfilter, label, path, prio, sortkey)"""
+    rand = random.Random(seed)
+    items = []
+    for i in range(num):
+        words = [make_word(rand) for _ in range(rand.randint(1, 4))]
+        content = " ".join(words)
+        items.append(
+            (
+                rand.choice(("hm", "hv", "hp", "p", "pl")),
+                content,
+                " ".join(rand.sample(("233", "234", "235", "334", "341", "u1"), 2)),
+                f"<h><n>{content}</n></h>",
+                f"/fs/u{i:07d}",
+                rand.randint(1, 30),
+                content,
+            )
+        )
+    return items
+
+
+def make_incremental(path, items):
+    maker = incremental.Maker(path, path + ".tmp")
+    for itemtype, content, asfilter, label, item_path, prio, sortkey in items:
+        maker.add_item(sortkey, itemtype, label, item_path, prio)
+    maker.finalize()
+
+
+def make_compact(path, items):
+    ranks = fulltext.sort_ranks((item[6], item[5]) for item in items)
+    maker = compact.Maker(path, path + ".tmp")
+    for item, rank in zip(items, ranks, strict=True):
+        maker.add_item(*item, rank)
+    maker.commit()
+    maker.close()
+
+
+def make_fulltext(index_dir, items):
+    ranks = fulltext.sort_ranks((item[6], item[5]) for item in items)
+    maker = fulltext.Maker(index_dir)
+    for item, rank in zip(items, ranks, strict=True):
+        maker.add_item(*item, rank)
+    maker.commit()
+    maker.close()
+
+
+def make_ldoce5_dir(data_root, entries):
+    """Write an LDOCE5 data directory whose 'fs' archive holds the entries
+
+    The other archives are empty, but present for is_ldoce5_dir().
+    """
+    for archive_name in idmreader.get_archive_names():
+        files = []
+        if archive_name == "fs":
+            files = [("", f"u{i:07d}.xml", data) for (i, data) in enumerate(entries)]
+        write_idm_archive(data_root, archive_name, files)
+
+
+def make_viewer_index(index_dir, data_root):
+    """Make filemap.cdb, incremental.db and compact_hp.idx as the indexer does"""
+    with open(os.path.join(index_dir, "filemap.cdb"), "w+b") as f:
+        maker = filemap.FilemapMaker(f)
+        for name, location in filemap.list_files(data_root, "fs"):
+            maker.add("fs", name, location)
+        maker.finalize()
+
+    items = []
+    with idmreader.ArchiveReader(data_root, "fs") as reader:
+        for dirs, name, location in idmreader.list_files(data_root, "fs"):
+            for item in get_entry_items(reader.read(location))[0]:
+                # headwords, phrases and activator items
+                if item[0][0] in "pha":
+                    items.append(item)
+
+    path = os.path.join(index_dir, "incremental.db")
+    maker = incremental.Maker(path, path + ".tmp")
+    for itemtype, label, item_path, content, sortkey, asfilter, prio in items:
+        maker.add_item(content, itemtype, label, item_path, prio)
+    maker.finalize()
+
+    make_compact(
+        os.path.join(index_dir, "compact_hp.idx"),
+        [(t, c, a, label, p, prio, k) for (t, label, p, c, k, a, prio) in items],
+    )
@@ -0,0 +1,290 @@
+"""Batch lookup of word lists
+
+Resolves each word of a list to its dictionary entry with the
+incremental search index, and reads and transforms the entries on a
+pool of worker processes:
+
+    ldoce5viewer-batch [options] LDOCE5_DIR INDEX_DIR [WORDLIST]
+
+WORDLIST has a word or phrase per line (stdin if omitted or '-').
+The results are streamed, in the order of the list, as JSON lines, CSV
+or an HTML document: the headword, parts of speech, definitions and the
+paths of the pronunciations (for the audio:// URLs of the viewer).
+
+The entries of an archive are stored in compressed blocks, and
+ArchiveReader keeps the last block it inflated. The entries are thus
+read in the order of their locations, and handed to the workers in
+chunks that end at block boundaries, so that each block is inflated
+once for the whole batch.
+"""
+
+import csv
+import json
+import multiprocessing
+import os.path
+import sys
+import time
+import traceback
+from html import escape
+from optparse import OptionParser
+
+import lxml.etree as et
+
+from . import incremental
+from .ldoce5.filemap import FilemapReader
+from .ldoce5.idmreader import ArchiveReader
+from .ldoce5.transform_body import body2html
+from .utils.cdb import CDBError
+from .utils.text import normalize_index_key, split_path
+
+FORMATS = ("jsonl", "csv", "html")
+
+_SEARCH_LIMIT = 50
+_CHUNK_SIZE = 64  # entries, at least
+
+_CSV_FIELDS = ("word", "found", "headword", "pos", "definitions", "gb_pron")
+_CSV_FIELDS += ("us_pron", "path")
+
+# worker process state, see _init_worker()
+_reader = None
+_with_html = False
+
+
+def _get_text(e):
+    return " ".join("".join(e.itertext()).split())
+
+
+def resolve(searcher, word):
+    """Return the path of the entry of a word, or None
+
+    The first entry whose headword or phrase matches the word wins,
+    then the first entry found with the word as a prefix.
+    """
+    key = normalize_index_key(word)
+    if not key:
+        return None
+    candidates = []
+    for label, path, plain, prio, x in searcher.search(word, _SEARCH_LIMIT):
+        (entry, fragment) = split_path(path)
+        if entry.startswith("/fs/"):
+            if normalize_index_key(plain) == key:
+                return entry
+            candidates.append(entry)
+    return candidates[0] if candidates else None
+
+
+def entry_record(data, with_html=False):
+    """Extract the fields of an entry, and its HTML if with_html"""
+    root = et.fromstring(data)
+    head = root.find("Head")
+    record = {"headword": "", "pos": [], "definitions": [], "pronunciations": {}}
+    if head is not None:
+        base = head.find("HWD/BASE")
+        if base is not None:
+            record["headword"] = _get_text(base)
+        record["pos"] = [_get_text(pos) for pos in head.iterfind("POS")]
+        for resource, archive, key in (
+            ("GB_HWD_PRON", "gb_hwd_pron", "gb"),
+            ("US_HWD_PRON", "us_hwd_pron", "us"),
+        ):
+            audio = head.find(f'Audio[@resource="{resource}"]')
+            if audio is not None and audio.get("topic"):
+                record["pronunciations"][key] = "/{0}/{1}".format(
+                    archive, audio.get("topic").split("/")[-1]
+                )
+    record["definitions"] = [_get_text(d) for d in root.iterfind(".//Sense//DEF")]
+    if with_html:
+        # body2html() rewrites the tree, so it comes last
+        record["html"] = body2html(root)
+    return record
+
+
+def _init_worker(data_dir, with_html):
+    global _reader, _with_html
+    _reader = ArchiveReader(data_dir, "fs")
+    _with_html = with_html
+
+
+def _fetch(chunk):
+    records = {}
+    for path, location in chunk:
+        try:
+            records[path] = entry_record(_reader.read(location), _with_html)
+        except Exception:
+            records[path] = {"error": traceback.format_exc().splitlines()[-1]}
+    return records
+
+
+def _chunks(entries, size):
+    """Split (path, location) sorted by location at block boundaries"""
+    chunk = []
+    for path, location in entries:
+        if len(chunk) >= size and location[0] != chunk[-1][1][0]:
+            yield chunk
+            chunk = []
+        chunk.append((path, location))
+    if chunk:
+        yield chunk
+
+
+def lookup_words(words, data_dir, index_dir, jobs=None, with_html=False, stats=None):
+    """Yield a result dict for each word, in order
+
+    stats, if given, is a dict updated with the numbers of words,
+    entries and compressed blocks.
+    """
+    words = list(words)
+    paths = []
+    locations = {}
+    with (
+        incremental.Searcher(os.path.join(index_dir, "incremental.db")) as searcher,
+        FilemapReader(os.path.join(index_dir, "filemap.cdb")) as fmr,
+    ):
+        for word in words:
+            path = resolve(searcher, word)
+            if path is not None and path not in locations:
+                try:
+                    locations[path] = fmr.lookup("fs", path[len("/fs/") :])
+                except KeyError:
+                    path = None
+            paths.append(path)
+
+    entries = sorted(locations.items(), key=lambda item: item[1])
+    if stats is not None:
+        stats["words"] = len(words)
+        stats["entries"] = len(entries)
+        stats["blocks"] = len({location[0] for (path, location) in entries})
+
+    records = {}
+    n = 0  # results yielded so far
+
+    def ready():
+        nonlocal n
+        while n < len(words) and (paths[n] is None or paths[n] in records):
+            (word, path) = (words[n], paths[n])
+            n += 1
+            if path is None:
+                yield {"word": word, "found": False}
+            else:
+                yield dict({"word": word, "found": True, "path": path}, **records[path])
+
+    if entries:
+        with multiprocessing.Pool(jobs, _init_worker, (data_dir, with_html)) as pool:
+            for chunk_records in pool.imap_unordered(
+                _fetch, _chunks(entries, _CHUNK_SIZE)
+            ):
+                records.update(chunk_records)
+                yield from ready()
+    yield from ready()
+
+
+# Output formats
+
+
+def write_jsonl(results, f):
+    for result in results:
+        f.write(json.dumps(result, ensure_ascii=False))
+        f.write("\n")
+
+
+def write_csv(results, f):
+    writer = csv.writer(f)
+    writer.writerow(_CSV_FIELDS)
+    for r in results:
+        prons = r.get("pronunciations", {})
+        writer.writerow(
+            (
+                r["word"],
+                int(r["found"]),
+                r.get("headword", ""),
+                ", ".join(r.get("pos", ())),
+                " | ".join(r.get("definitions", ())),
+                prons.get("gb", ""),
+                prons.get("us", ""),
+                r.get("path", ""),
+            )
+        )
+
+
+def write_html(results, f):
+    f.write(
+        '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+        "<title>Word list</title>\n</head>\n<body>\n"
+    )
+    for r in results:
+        f.write(f'<section class="word">\n<h2>{escape(r["word"])}</h2>\n')
+        if not r["found"]:
+            f.write("<p>Not found</p>\n")
+        elif "error" in r:
+            f.write(f"<p>Error: {escape(r['error'])}</p>\n")
+        else:
+            f.write(r.get("html", ""))
+        f.write("</section>\n")
+    f.write("</body>\n</html>\n")
+
+
+_WRITERS = {"jsonl": write_jsonl, "csv": write_csv, "html": write_html}
+
+
+def run(argv=None):
+    if argv is None:
+        argv = sys.argv
+
+    optparser = OptionParser(usage="%prog [options] LDOCE5_DIR INDEX_DIR [WORDLIST]")
+    optparser.add_option(
+        "--format",
+        type="choice",
+        choices=FORMATS,
+        default="jsonl",
+        help="Output format: jsonl (default), csv or html",
+    )
+    optparser.add_option("-o", "--output", default=None, help="Default: stdout")
+    optparser.add_option(
+        "-j",
+        "--jobs",
+        type="int",
+        default=None,
+        help="Number of worker processes (default: one per CPU)",
+    )
+    (options, args) = optparser.parse_args(argv[1:])
+    if len(args) not in (2, 3):
+        optparser.error("LDOCE5_DIR and INDEX_DIR are required")
+    (data_dir, index_dir) = args[:2]
+
+    if len(args) == 2 or args[2] == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(args[2], encoding="utf-8-sig") as f:
+            lines = f.read().splitlines()
+    words = [line.strip() for line in lines if line.strip()]
+
+    t = time.perf_counter()
+    stats = {}
+    if options.output:
+        out = open(options.output, "w", encoding="utf-8", newline="")
+    else:
+        out = sys.stdout
+    try:
+        results = lookup_words(
+            words, data_dir, index_dir, options.jobs, options.format == "html", stats
+        )
+        _WRITERS[options.format](results, out)
+    except (OSError, CDBError, incremental.IndexError) as e:
+        print(f"cannot open the index or the archive: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(
+        "{words} words, {entries} entries from {blocks} compressed blocks".format(
+            **stats
+        ),
+        f"in {time.perf_counter() - t:.1f} s",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,904 @@
+"""Compact full-text index for headwords and phrases
+
+A read-only alternative to the whoosh index of fulltext.py, made for the
+small and fixed corpus of headwords and phrases. It has the same Maker
+and Searcher interface. The index is a single memory-mapped file:
+
+    header
+    term offsets      (num_terms + 1) x uint32, into the term blob
+    posting offsets   (num_terms + 1) x uint32, into the posting blob
+    document offsets  (num_docs + 1) x uint32, into the document blob
+    term blob         sorted terms, each prefixed with its field tag
+    posting blob      ascending document numbers, delta + varint coded
+    document blob     stored fields of each document
+
+Documents are numbered by their sort rank, so that the results come out
+sorted simply by taking the matching document numbers in order. The
+bitmaps of the documents of each filter code and item type are kept in
+a separate file, FILTERS_SUFFIX appended to the index path, and the
+variant term numbers of each word in another, EXPANSIONS_SUFFIX, and
+the spelling correction index in a third, SPELLING_SUFFIX.
+"""
+
+import fnmatch
+import heapq
+import mmap
+import os
+import re
+from collections import defaultdict
+from functools import reduce
+from html import escape
+from itertools import islice
+from operator import and_, or_
+from struct import Struct
+
+from . import spelling
+from .fulltext import (
+    SearchAborted,
+    _expansion_cache,
+    _result_cache,
+    make_expansions,
+    open_filters,
+    open_variations,
+    variant_words,
+    write_filters,
+)
+from .utils import trace
+from .utils.cache import LRUCache
+from .utils.cdb import CDBError, CDBMaker, CDBReader
+from .utils.compat import range
+from .utils.text import dec_utf8, enc_utf8, normalize_index_key, normalize_token
+
+_MAGIC = 0x43494458
+_DB_VERSION = 1
+
+_struct_header = Struct(b"<10I")
+_struct_II = Struct(b"<II")
+_unpack_II = _struct_II.unpack_from
+_struct_I = Struct(b"<I")
+_pack_I = _struct_I.pack
+_struct_doc = Struct(b"<BHHHH")
+_pack_doc = _struct_doc.pack
+_unpack_doc = _struct_doc.unpack_from
+
+# Field tags of the keys in the term dictionary
+_CONTENT = b"c"
+_ASFILTER = b"f"
+_ITEMTYPE = b"t"
+_FIELD_TAGS = {"content": _CONTENT, "asfilter": _ASFILTER, "itemtype": _ITEMTYPE}
+_FILTER_FIELDS = {_ASFILTER: "asfilter", _ITEMTYPE: "itemtype"}
+
+FILTERS_SUFFIX = ".filters"
+EXPANSIONS_SUFFIX = ".expansions"
+SPELLING_SUFFIX = ".spelling"
+
+# Same tokens as whoosh's StandardAnalyzer(stoplist=("a", "an"))
+# followed by fulltext._AccentFilter
+_TOKEN = re.compile(r"\w+(?:\.?\w+)*", re.UNICODE)
+_IDLIST_TOKEN = re.compile(r"[^\r\n\t ,;]+")
+_STOPWORDS = frozenset(("a", "an"))
+
+
+# Highlighting stops at this offset, as whoosh's fragmenters do
+_HIGHLIGHT_CHARLIMIT = 2**15
+_MAX_TERM_CLASSES = 5
+
+_NOT_PARSED = object()  # a miss in the parse cache
+
+
+class IndexError(Exception):
+    pass
+
+
+class _ParseError(Exception):
+    pass
+
+
+def _tokenize(text):
+    """Yield (term, startchar, endchar) of the indexed words in text"""
+    for m in _TOKEN.finditer(text):
+        t = m.group().lower()
+        if len(t) < 2 or t in _STOPWORDS:
+            continue
+        yield (normalize_token(t), m.start(), m.end())
+
+
+def _analyze(text):
+    return [t for (t, start, end) in _tokenize(text)]
+
+
+def _encode_postings(docnums):
+    r = bytearray()
+    append = r.append
+    prev = 0
+    for docnum in docnums:
+        delta = docnum - prev
+        prev = docnum
+        while delta >= 0x80:
+            append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        append(delta)
+    return r
+
+
+def _decode_postings(data):
+    r = []
+    append = r.append
+    docnum = delta = shift = 0
+    for b in data:
+        delta |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            docnum += delta
+            append(docnum)
+            delta = shift = 0
+    return r
+
+
+# -----------------
+# Query Parser
+# -----------------
+
+
+class _Tokens:
+    """The tokens of a query string, and the position of a parse in them"""
+
+    __slots__ = ("tokens", "pos")
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+
+class _QueryParser:
+    """Parser for the subset of whoosh's query syntax used by fulltext.py
+
+    Words, "phrases", (groups), field:value, implicit AND, and the
+    operators enabled by `ops` ('AND' also accepts '&', 'NOT' also
+    accepts ' -'). The result is a tree of tuples:
+
+        ("and", [node, ...]), ("or", [node, ...]), ("not", node),
+        ("term", tag, text), ("phrase", [text, ...]), ("wild", tag, pattern)
+    """
+
+    def __init__(self, fieldname, ops, wildcard):
+        self._tag = _FIELD_TAGS[fieldname]
+        self._ops = ops
+        self._wildcard = wildcard
+        lexemes = [r'"[^"]*"?', r"[()]", r"\s+"]
+        if "NOT" in ops:
+            lexemes.insert(0, r"\s+-")
+        if "AND" in ops and fieldname == "content":
+            lexemes.append(r"&")
+            self._lex = re.compile("|".join(lexemes) + r'|[^\s()"&]+')
+        else:
+            self._lex = re.compile("|".join(lexemes) + r'|[^\s()"]+')
+
+    def parse(self, s):
+        tokens = []
+        for m in self._lex.finditer(s):
+            lexeme = m.group()
+            if lexeme.startswith('"'):
+                tokens.append(("phrase", lexeme.strip('"')))
+            elif lexeme in ("(", ")"):
+                tokens.append((lexeme, None))
+            elif lexeme == "&":
+                tokens.append(("op", "AND"))
+            elif lexeme.strip() == "-":
+                tokens.append(("op", "NOT"))
+            elif not lexeme.strip():
+                pass
+            elif lexeme in self._ops:
+                tokens.append(("op", lexeme))
+            else:
+                tokens.append(("word", lexeme))
+        # the parser is shared between threads: its state is in toks only
+        toks = _Tokens(tokens)
+        node = self._or_expr(toks)
+        if toks.pos != len(tokens):
+            raise _ParseError
+        return node
+
+    def _or_expr(self, toks):
+        nodes = [self._and_expr(toks)]
+        while toks.peek() == ("op", "OR"):
+            toks.pos += 1
+            nodes.append(self._and_expr(toks))
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def _and_expr(self, toks):
+        nodes = []
+        while True:
+            (kind, value) = toks.peek()
+            if kind is None or kind == ")" or (kind, value) == ("op", "OR"):
+                break
+            if (kind, value) == ("op", "AND"):
+                toks.pos += 1
+                continue
+            nodes.append(self._unary(toks))
+        if not nodes:
+            raise _ParseError
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def _unary(self, toks):
+        if toks.peek() == ("op", "NOT"):
+            toks.pos += 1
+            return ("not", self._unary(toks))
+        return self._primary(toks)
+
+    def _primary(self, toks):
+        (kind, value) = toks.peek()
+        toks.pos += 1
+        if kind == "(":
+            node = self._or_expr(toks)
+            if toks.peek()[0] == ")":
+                toks.pos += 1
+            return node
+        if kind == "phrase":
+            words = _analyze(value)
+            if len(words) > 1:
+                return ("phrase", words)
+            return ("term", _CONTENT, words[0]) if words else None
+        if kind == "word":
+            return self._word(value)
+        raise _ParseError
+
+    def _word(self, text):
+        tag = self._tag
+        (fieldname, sep, rest) = text.partition(":")
+        if sep and rest and fieldname in _FIELD_TAGS:
+            (tag, text) = (_FIELD_TAGS[fieldname], rest)
+
+        if tag != _CONTENT:
+            return ("term", tag, text)
+        if self._wildcard and any(c in text for c in "*?"):
+            return ("wild", tag, normalize_token(text.lower()))
+        words = _analyze(text)
+        if len(words) > 1:
+            return ("and", [("term", _CONTENT, w) for w in words])
+        return ("term", _CONTENT, words[0]) if words else None
+
+
+# -----------------
+# Maker
+# -----------------
+
+
+class Maker:
+    """Builds a compact index
+
+    The ranks given to add_item() must be the numbers 0 to N-1, as
+    returned by fulltext.sort_ranks().
+    """
+
+    def __init__(self, path, tmp_path, var_path=None):
+        self._path = path
+        self._tmp_path = tmp_path
+        self._var_path = var_path
+        self._tmpf = open(tmp_path, "w+b")
+        self._docs = {}  # rank -> (position, size) in the temporary file
+        self._postings = defaultdict(list)  # key -> [rank, ...]
+        self._filters = defaultdict(list)  # "field:text" -> [rank, ...]
+
+    def add_item(self, itemtype, content, asfilter, label, path, prio, sortkey, rank):
+        fields = [
+            enc_utf8(label),
+            enc_utf8(path),
+            enc_utf8(normalize_index_key(sortkey)),
+            enc_utf8(content),
+        ]
+        record = _pack_doc(prio, *(len(f) for f in fields)) + b"".join(fields)
+        tmpf = self._tmpf
+        self._docs[rank] = (tmpf.tell(), len(record))
+        tmpf.write(record)
+
+        codes = set(_IDLIST_TOKEN.findall(asfilter))
+        keys = {_CONTENT + enc_utf8(t) for t in _analyze(content)}
+        keys.update(_ASFILTER + enc_utf8(t) for t in codes)
+        keys.add(_ITEMTYPE + enc_utf8(itemtype))
+        postings = self._postings
+        for key in keys:
+            postings[key].append(rank)
+
+        filters = self._filters
+        filters["itemtype:" + itemtype].append(rank)
+        for code in codes:
+            filters["asfilter:" + code].append(rank)
+
+    def commit(self):
+        docs = self._docs
+        num_docs = len(docs)
+        if any(rank not in docs for rank in range(num_docs)):
+            raise IndexError("ranks are not consecutive")
+
+        terms = sorted(self._postings)
+        term_offsets = [0]
+        posting_offsets = [0]
+        postings = []
+        spelling_maker = spelling.Maker(self._path + SPELLING_SUFFIX)
+        for key in terms:
+            if key.startswith(_CONTENT):
+                spelling_maker.add_word(dec_utf8(key[1:]), len(self._postings[key]))
+            data = _encode_postings(sorted(self._postings[key]))
+            postings.append(data)
+            term_offsets.append(term_offsets[-1] + len(key))
+            posting_offsets.append(posting_offsets[-1] + len(data))
+        self._postings = None
+        doc_offsets = [0]
+        for rank in range(num_docs):
+            doc_offsets.append(doc_offsets[-1] + docs[rank][1])
+
+        num_terms = len(terms)
+        p_term_offsets = _struct_header.size
+        p_posting_offsets = p_term_offsets + 4 * (num_terms + 1)
+        p_doc_offsets = p_posting_offsets + 4 * (num_terms + 1)
+        p_terms = p_doc_offsets + 4 * (num_docs + 1)
+        p_postings = p_terms + term_offsets[-1]
+        p_docs = p_postings + posting_offsets[-1]
+
+        tmpf = self._tmpf
+        with open(self._path, "wb") as f:
+            write = f.write
+            write(
+                _struct_header.pack(
+                    _MAGIC,
+                    _DB_VERSION,
+                    num_docs,
+                    num_terms,
+                    p_term_offsets,
+                    p_posting_offsets,
+                    p_doc_offsets,
+                    p_terms,
+                    p_postings,
+                    p_docs,
+                )
+            )
+            for offsets in (term_offsets, posting_offsets, doc_offsets):
+                write(b"".join(_pack_I(x) for x in offsets))
+            write(b"".join(terms))
+            write(b"".join(postings))
+            for rank in range(num_docs):
+                (pos, size) = docs[rank]
+                tmpf.seek(pos)
+                write(tmpf.read(size))
+
+        write_filters(self._path + FILTERS_SUFFIX, num_docs, self._filters)
+        spelling_maker.commit()
+        self._write_expansions(terms)
+
+    def _write_expansions(self, terms):
+        term_ids = {
+            dec_utf8(key[1:]): i
+            for (i, key) in enumerate(terms)
+            if key.startswith(_CONTENT)
+        }
+        var_reader = open_variations(self._var_path) if self._var_path else None
+        try:
+            expansions = make_expansions(term_ids, var_reader)
+        finally:
+            if var_reader:
+                var_reader.close()
+
+        with open(self._path + EXPANSIONS_SUFFIX, "wb") as f:
+            writer = CDBMaker(f)
+            # the number of terms, to tell a table made for another index
+            writer.add(b"", _pack_I(len(terms)))
+            for word in sorted(expansions):
+                writer.add(
+                    enc_utf8(word),
+                    b"".join(_pack_I(term_ids[w]) for w in expansions[word]),
+                )
+            writer.finalize()
+
+    def close(self):
+        if self._tmpf:
+            self._tmpf.close()
+            self._tmpf = None
+            os.remove(self._tmp_path)
+
+
+# -----------------
+# Searcher
+# -----------------
+
+
+class Collector:
+    """Holds the limit of a search and lets it be aborted"""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self._aborted = False
+
+    @property
+    def aborted(self):
+        return self._aborted
+
+    def abort(self):
+        self._aborted = True
+
+
+class Searcher:
+    """Searcher of a compact index
+
+    Everything is read from the memory-mapped file on demand, which
+    makes this object cheap to open and safe to share between threads.
+    """
+
+    def __init__(self, index_path, var_path=None):
+        self._path = index_path
+        self._mm = None
+        self._filters = None
+        self._expansions = None
+        self._var_reader = None
+        self._corrector = None
+        try:
+            with open(index_path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise IndexError("broken")
+
+        mm = self._mm
+        if len(mm) < _struct_header.size:
+            raise IndexError("too small")
+        (
+            magic,
+            version,
+            self._num_docs,
+            self._num_terms,
+            self._p_term_offsets,
+            self._p_posting_offsets,
+            self._p_doc_offsets,
+            self._p_terms,
+            self._p_postings,
+            self._p_docs,
+        ) = _struct_header.unpack_from(mm)
+        if magic != _MAGIC:
+            raise IndexError("broken")
+        if version != _DB_VERSION:
+            raise IndexError("cannot use this version of index")
+        if self._num_docs == 0:
+            raise IndexError("does not contain any data")
+
+        ops = ("AND", "NOT")
+        self._parser = _QueryParser("content", ops, False)
+        self._parser_wild = _QueryParser("content", ops, True)
+        self._asf_parser = _QueryParser("asfilter", ("AND", "OR"), False)
+        # (parser, query string) -> tree
+        self._parse_cache = LRUCache(1024, name="compact.parse")
+
+        self._filters = open_filters(index_path + FILTERS_SUFFIX, self._num_docs)
+        self._expansions = self._open_expansions(index_path + EXPANSIONS_SUFFIX)
+        self._var_reader = open_variations(var_path) if var_path else None
+        try:
+            self._corrector = spelling.Corrector(index_path + SPELLING_SUFFIX)
+        except spelling.IndexError:
+            self._corrector = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+    def close(self):
+        path = self._path
+        _result_cache.invalidate(lambda key: key[0] == path)
+        _expansion_cache.invalidate(lambda key: key[0] == path)
+        if self._mm:
+            self._mm.close()
+            self._mm = None
+        if self._filters:
+            self._filters.close()
+            self._filters = None
+        if self._expansions:
+            self._expansions.close()
+            self._expansions = None
+        if self._var_reader:
+            self._var_reader.close()
+            self._var_reader = None
+        if self._corrector:
+            self._corrector.close()
+            self._corrector = None
+
+    def _open_expansions(self, path):
+        try:
+            reader = CDBReader(path)
+        except (OSError, ValueError, CDBError):
+            return None
+        if reader.get(b"") != _pack_I(self._num_terms):
+            reader.close()
+            return None
+        return reader
+
+    # Term dictionary
+
+    def _term(self, i):
+        (a, b) = _unpack_II(self._mm, self._p_term_offsets + 4 * i)
+        p = self._p_terms
+        return self._mm[p + a : p + b]
+
+    def _bisect(self, key):
+        (a, b) = (0, self._num_terms)
+        while a < b:
+            c = (a + b) // 2
+            if self._term(c) < key:
+                a = c + 1
+            else:
+                b = c
+        return a
+
+    def _postings(self, i):
+        (a, b) = _unpack_II(self._mm, self._p_posting_offsets + 4 * i)
+        p = self._p_postings
+        return _decode_postings(self._mm[p + a : p + b])
+
+    def _find(self, key):
+        """Return the index of a term, or None"""
+        i = self._bisect(key)
+        if i < self._num_terms and self._term(i) == key:
+            return i
+        return None
+
+    def _lookup(self, key):
+        """Return the posting list of a term, or None"""
+        i = self._find(key)
+        return None if i is None else self._postings(i)
+
+    def _iter_prefix(self, prefix):
+        """Yield (index, key) of the terms starting with prefix"""
+        i = self._bisect(prefix)
+        while i < self._num_terms:
+            key = self._term(i)
+            if not key.startswith(prefix):
+                break
+            yield (i, key)
+            i += 1
+
+    def _document(self, docnum):
+        mm = self._mm
+        (a, b) = _unpack_II(mm, self._p_doc_offsets + 4 * docnum)
+        p = self._p_docs + a
+        (prio, lenlabel, lenpath, lensortkey, lencontent) = _unpack_doc(mm, p)
+        p += _struct_doc.size
+        label = dec_utf8(mm[p : p + lenlabel])
+        p += lenlabel
+        path = dec_utf8(mm[p : p + lenpath])
+        p += lenpath
+        sortkey = dec_utf8(mm[p : p + lensortkey])
+        p += lensortkey
+        content = dec_utf8(mm[p : p + lencontent])
+        return (label, path, sortkey, prio, content)
+
+    # Query evaluation
+
+    def _expand(self, word):
+        """Return the indexes of the variant terms of a content word"""
+        key = (self._path, word)
+        ids = _expansion_cache.get(key)
+        if ids is None:
+            data = self._expansions.get(enc_utf8(word)) if self._expansions else None
+            if data is not None:
+                ids = [i for (i,) in _struct_I.iter_unpack(data)]
+            else:
+                ids = [
+                    self._find(_CONTENT + enc_utf8(w))
+                    for w in variant_words(word, self._var_reader)
+                ]
+                ids = sorted(i for i in ids if i is not None)
+            _expansion_cache.put(key, ids)
+        return ids
+
+    def _term_ids(self, node):
+        """Return the indexes of the terms a leaf node matches"""
+        kind = node[0]
+        if kind == "term":
+            (kind, tag, text) = node
+            if tag == _CONTENT:
+                return self._expand(text)
+            i = self._find(tag + enc_utf8(text))
+            return [] if i is None else [i]
+        if kind == "wild":
+            (kind, tag, pattern) = node
+            prefix = re.split(r"[*?]", pattern, maxsplit=1)[0]
+            match = re.compile(fnmatch.translate(pattern)).match
+            return [
+                i
+                for (i, key) in self._iter_prefix(tag + enc_utf8(prefix))
+                if match(dec_utf8(key[1:]))
+            ]
+        if kind == "phrase":
+            ids = [self._find(_CONTENT + enc_utf8(w)) for w in node[1]]
+            return [i for i in ids if i is not None]
+        return []
+
+    def _evaluate(self, node, collector):
+        """Return the set of matching documents (None for no constraint)"""
+        if collector.aborted:
+            raise SearchAborted
+        if node is None:
+            return None
+
+        kind = node[0]
+        if kind in ("term", "wild"):
+            docs = set()
+            for i in self._term_ids(node):
+                docs.update(self._postings(i))
+            return docs
+        if kind == "phrase":
+            return self._evaluate_phrase(node[1], collector)
+        if kind == "or":
+            sets = [self._evaluate(c, collector) for c in node[1]]
+            sets = [s for s in sets if s is not None]
+            return set().union(*sets) if sets else None
+        if kind == "not":
+            docs = self._evaluate(node[1], collector)
+            if docs is None:
+                return None
+            return set(range(self._num_docs)) - docs
+
+        # and
+        positives = []
+        negatives = []
+        for c in node[1]:
+            if c is not None and c[0] == "not":
+                docs = self._evaluate(c[1], collector)
+                if docs is not None:
+                    negatives.append(docs)
+            else:
+                docs = self._evaluate(c, collector)
+                if docs is not None:
+                    positives.append(docs)
+        if not positives:
+            if not negatives:
+                return None
+            positives.append(set(range(self._num_docs)))
+        positives.sort(key=len)
+        docs = positives[0].intersection(*positives[1:])
+        return docs.difference(*negatives)
+
+    def _filter_bitmap(self, node):
+        """Evaluate asfilter/itemtype terms combined with AND and OR
+
+        Return None if the node contains anything else.
+        """
+        kind = node[0]
+        if kind == "term":
+            (kind, tag, text) = node
+            if tag not in _FILTER_FIELDS:
+                return None
+            return self._filters.get(f"{_FILTER_FIELDS[tag]}:{text}")
+        if kind in ("and", "or") and node[1]:
+            bitmaps = [self._filter_bitmap(c) for c in node[1] if c is not None]
+            if not bitmaps or any(b is None for b in bitmaps):
+                return None
+            return reduce(and_ if kind == "and" else or_, bitmaps)
+        return None
+
+    def _evaluate_phrase(self, words, collector):
+        sets = []
+        for word in words:
+            postings = self._lookup(_CONTENT + enc_utf8(word))
+            if not postings:
+                return set()
+            sets.append(set(postings))
+        sets.sort(key=len)
+        n = len(words)
+        docs = set()
+        for docnum in sets[0].intersection(*sets[1:]):
+            if collector.aborted:
+                raise SearchAborted
+            tokens = _analyze(self._document(docnum)[4])
+            if any(tokens[i : i + n] == words for i in range(len(tokens) - n + 1)):
+                docs.add(docnum)
+        return docs
+
+    # Interface of fulltext.Searcher
+
+    def correct(self, misspelled, limit=5):
+        """Suggest the words within edit distance 2
+
+        Suggestions are ordered by distance, then by document frequency.
+        Without a spelling correction index, only the words sharing the
+        first letter are looked at.
+        """
+        if self._corrector is not None:
+            return [
+                word for (word, score) in self._corrector.suggest(misspelled, limit)
+            ]
+        words = _analyze(misspelled)
+        if not words:
+            return []
+        word = words[0]
+        suggestions = []
+        for i, key in self._iter_prefix(_CONTENT + enc_utf8(word[0])):
+            term = dec_utf8(key[1:])
+            if term == word:
+                continue
+            dist = spelling.edit_distance(word, term, 2)
+            if dist <= 2:
+                (a, b) = _unpack_II(self._mm, self._p_posting_offsets + 4 * i)
+                suggestions.append((dist, a - b, term))
+        suggestions.sort()
+        return [term for (dist, size, term) in suggestions[:limit]]
+
+    def make_collector(self, limit=None):
+        return Collector(limit)
+
+    def search(
+        self,
+        collector,
+        query_str1=None,
+        query_str2=None,
+        itemtypes=(),
+        highlight=False,
+    ):
+        """Run a query and return a sorted list of result tuples
+
+        With highlight, the text of each result is its stored content.
+        Pass the results to be displayed to highlight() to mark up the
+        matches.
+
+        SearchAborted is raised as soon as the collector is aborted.
+        """
+        key = (
+            self._path,
+            query_str1,
+            query_str2,
+            tuple(itemtypes),
+            collector.limit,
+            highlight,
+        )
+        results = _result_cache.get(key)
+        if results is None:
+            with trace.span("compact.query"):
+                results = self._search(
+                    collector, query_str1, query_str2, itemtypes, highlight
+                )
+            results = tuple(results)
+            _result_cache.put(key, results)
+        return list(results)
+
+    def _parse(self, parser, query_str):
+        """Parse a query string, memoizing the query tree
+
+        The trees are reused by later searches, and must not be modified.
+        """
+        key = (parser, query_str)
+        query = self._parse_cache.get(key, _NOT_PARSED)
+        if query is _NOT_PARSED:
+            query = parser.parse(query_str)
+            self._parse_cache.put(key, query)
+        return query
+
+    def _content_parser(self, query_str1):
+        if query_str1 and any(c in query_str1 for c in "*?"):
+            return self._parser_wild
+        return self._parser
+
+    def _search(self, collector, query_str1, query_str2, itemtypes, highlight):
+        # rejects '*' and '?'
+        if query_str1:
+            for kw in (s.strip() for s in query_str1.split()):
+                if not kw.replace("*", "").replace("?", "").strip():
+                    return []
+
+        wildcard = query_str1 and any(c in query_str1 for c in "*?")
+
+        andlist = []
+        filterlist = []
+        try:
+            if query_str1:
+                andlist.append(
+                    self._parse(self._content_parser(query_str1), query_str1)
+                )
+            if query_str2:
+                filterlist.append(self._parse(self._asf_parser, query_str2))
+        except _ParseError:
+            return []
+
+        if itemtypes:
+            filterlist.append(("or", [("term", _ITEMTYPE, t) for t in itemtypes]))
+
+        allow = None
+        if filterlist and self._filters is not None:
+            allow = self._filter_bitmap(("and", filterlist))
+        if allow is None:
+            andlist.extend(filterlist)
+        elif not allow:
+            return []
+
+        docs = self._evaluate(("and", andlist), collector)
+        if allow is not None:
+            if docs is None:
+                # filters only: the bitmap is already in the result order
+                docs = allow
+            else:
+                docs = [docnum for docnum in docs if docnum in allow]
+        if not docs:
+            return []
+
+        limit = collector.limit
+        if docs is allow:
+            docs = list(islice(allow, limit))
+        elif limit is None:
+            docs = sorted(docs)
+        else:
+            docs = heapq.nsmallest(limit, docs)
+
+        if wildcard:
+            pat = query_str1.replace("-", "").replace(" ", "")
+            wildmatch = re.compile(fnmatch.translate(pat))
+
+        # Construct a result list
+        results = []
+        for docnum in docs:
+            if collector.aborted:
+                raise SearchAborted
+            (label, path, sortkey, prio, content) = self._document(docnum)
+
+            if wildcard and not wildmatch.match(sortkey):
+                continue
+
+            text = content if highlight else None
+            results.append((label, path, sortkey, prio, text))
+
+        return results
+
+    def highlight(self, query_str1, results):
+        """Return the results with the matches of query_str1 marked up"""
+        if not query_str1:
+            return list(results)
+
+        try:
+            query = self._parse(self._content_parser(query_str1), query_str1)
+        except _ParseError:
+            return list(results)
+
+        words = set()
+        nodes = [query]
+        while nodes:
+            node = nodes.pop()
+            if node is None:
+                continue
+            if node[0] in ("and", "or"):
+                nodes.extend(node[1])
+            elif node[0] != "not":
+                for i in self._term_ids(node):
+                    key = self._term(i)
+                    if key.startswith(_CONTENT):
+                        words.add(dec_utf8(key[1:]))
+
+        # the markup of whoosh's Hit.highlights() with a WholeFragmenter and
+        # an HtmlFormatter: term classes by matched text, recycled after
+        # _MAX_TERM_CLASSES, and nothing if no word matches
+        termclasses = {}
+
+        def markup(text):
+            r = []
+            p = 0
+            for term, start, end in _tokenize(text):
+                if end > _HIGHLIGHT_CHARLIMIT:
+                    break
+                if term in words:
+                    match = escape(text[start:end], quote=False)
+                    n = termclasses.get(match)
+                    if n is None:
+                        n = termclasses[match] = len(termclasses) % _MAX_TERM_CLASSES
+                    r.append(escape(text[p:start], quote=False))
+                    r.append(f'<span class="s_match s_term{n}">{match}</span>')
+                    p = end
+            if not r:
+                return ""
+            r.append(escape(text[p:], quote=False))
+            return "".join(r)
+
+        return [
+            (label, path, sortkey, prio, markup(text))
+            for (label, path, sortkey, prio, text) in results
+        ]
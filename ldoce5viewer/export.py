@@ -0,0 +1,232 @@
+"""Headless page renderer
+
+Renders the pages of the dictionary to HTML outside the GUI, with
+LDOCE5.get_content() on a pool of worker processes:
+
+    ldoce5viewer-export [options] LDOCE5_DIR OUTPUT
+
+OUTPUT is a directory, or a zip archive if its name ends with '.zip'.
+A page is written as <archive>/<name>.html, e.g. the page of
+dict:///activator/c1/s1 as activator/c1/s1.html. Unless --filemap is
+given, the file-location map is built from LDOCE5_DIR into a temporary
+file first.
+"""
+
+import multiprocessing
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from itertools import islice
+from optparse import OptionParser
+
+import lxml.etree as et
+
+from .ldoce5 import (
+    LDOCE5,
+    ArchiveError,
+    FilemapError,
+    NotFoundError,
+    filemap,
+    idmreader,
+)
+
+# archives whose documents get_content() renders as pages
+ARCHIVES = (
+    "fs",
+    "collocations",
+    "examples",
+    "word_families",
+    "etymologies",
+    "phrases",
+    "thesaurus",
+    "word_sets",
+    "activator",
+)
+
+# what get_content() returns when a transform raises
+_ERROR_PREFIX = b"<h2>Error</h2>"
+
+_PROGRESS_INTERVAL = 1.0  # seconds
+
+# worker process state, see _init_worker()
+_ldoce5 = None
+_output_dir = None
+
+
+def list_pages(data_dir, archive, maker=None):
+    """Yield the paths of the pages of an archive
+
+    The locations of the documents listed are added to maker (a
+    filemap.FilemapMaker) if given.
+    """
+    if archive != "activator":
+        for name, location in filemap.list_files(data_dir, archive):
+            if maker is not None:
+                maker.add(archive, name, location)
+            yield f"/{archive}/{name}"
+        return
+
+    # a page per section of each concept
+    if maker is not None:
+        for name, location in filemap.list_files(data_dir, "activator_section"):
+            maker.add("activator_section", name, location)
+    concepts = list(filemap.list_files(data_dir, "activator_concept"))
+    with idmreader.ArchiveReader(data_dir, "activator_concept") as reader:
+        for cid, location in concepts:
+            if maker is not None:
+                maker.add("activator_concept", cid, location)
+            root = et.fromstring(reader.read(location))
+            for section in root.iterfind("Section"):
+                yield "/activator/{0}/{1}".format(cid, section.get("id"))
+
+
+def _init_worker(data_dir, filemap_path, output_dir):
+    global _ldoce5, _output_dir
+    _ldoce5 = LDOCE5(data_dir, filemap_path, keep_open=True)
+    _output_dir = output_dir
+
+
+def _render(path):
+    """Render a page in a worker process
+
+    Returns (path, result, ok), where result is the HTML, or its size
+    if the worker wrote it to the output directory itself.
+    """
+    try:
+        (data, mime_type) = _ldoce5.get_content(path)
+    except (NotFoundError, FilemapError, ArchiveError):
+        return (path, None, False)
+    ok = not data.startswith(_ERROR_PREFIX)
+    if _output_dir is None:
+        return (path, data, ok)
+
+    filename = os.path.join(_output_dir, *path.lstrip("/").split("/")) + ".html"
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "wb") as f:
+        f.write(data)
+    return (path, len(data), ok)
+
+
+def _report(done, total, t_start, final=False):
+    elapsed = max(time.perf_counter() - t_start, 1e-9)
+    sys.stderr.write(
+        f"\r{done}/{total} pages, {done / elapsed:.0f} pages/s"
+        + ("\n" if final else "")
+    )
+    sys.stderr.flush()
+
+
+def export(data_dir, output, paths, filemap_path, jobs=None):
+    """Render the pages to output (a directory or a .zip file)
+
+    Returns the paths of the pages that failed to render.
+    """
+    to_zip = output.endswith(".zip")
+    if not to_zip:
+        os.makedirs(output, exist_ok=True)
+    output_dir = None if to_zip else os.path.abspath(output)
+
+    failed = []
+    zf = zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) if to_zip else None
+    pool = multiprocessing.Pool(
+        jobs, _init_worker, (data_dir, filemap_path, output_dir)
+    )
+    try:
+        t_start = t_report = time.perf_counter()
+        results = pool.imap_unordered(_render, paths, chunksize=32)
+        for done, (path, result, ok) in enumerate(results, 1):
+            if not ok:
+                failed.append(path)
+            if zf is not None and result is not None:
+                zf.writestr(path.lstrip("/") + ".html", result)
+            if time.perf_counter() - t_report >= _PROGRESS_INTERVAL:
+                t_report = time.perf_counter()
+                _report(done, len(paths), t_start)
+        _report(len(paths), len(paths), t_start, final=True)
+    finally:
+        pool.terminate()
+        pool.join()
+        if zf is not None:
+            zf.close()
+    return failed
+
+
+def run(argv=None):
+    if argv is None:
+        argv = sys.argv
+
+    optparser = OptionParser(usage="%prog [options] LDOCE5_DIR OUTPUT")
+    optparser.add_option(
+        "--archive",
+        dest="archives",
+        type="choice",
+        choices=ARCHIVES,
+        action="append",
+        default=None,
+        help="Archive to render (repeatable; default: all)",
+    )
+    optparser.add_option(
+        "--filemap", default=None, help="File-location map built by the indexer"
+    )
+    optparser.add_option(
+        "-j",
+        "--jobs",
+        type="int",
+        default=os.cpu_count(),
+        help="Number of worker processes (default: one per CPU)",
+    )
+    optparser.add_option(
+        "--limit",
+        type="int",
+        default=None,
+        help="Render at most this many pages of each archive",
+    )
+    (options, args) = optparser.parse_args(argv[1:])
+    if len(args) != 2:
+        optparser.error("LDOCE5_DIR and OUTPUT are required")
+    (data_dir, output) = args
+    if not idmreader.is_ldoce5_dir(data_dir):
+        optparser.error(f"not an LDOCE5 data directory: {data_dir}")
+
+    tmp_dir = None
+    try:
+        t = time.perf_counter()
+        if options.filemap:
+            filemap_path = options.filemap
+            maker = None
+        else:
+            tmp_dir = tempfile.mkdtemp(prefix="ldoce5viewer-export-")
+            filemap_path = os.path.join(tmp_dir, "filemap.cdb")
+            f = open(filemap_path, "w+b")
+            maker = filemap.FilemapMaker(f)
+
+        paths = []
+        for archive in options.archives or ARCHIVES:
+            paths.extend(islice(list_pages(data_dir, archive, maker), options.limit))
+        if maker is not None:
+            maker.finalize()
+            f.close()
+        print(f"{len(paths)} pages listed in {time.perf_counter() - t:.1f} s")
+
+        t = time.perf_counter()
+        failed = export(data_dir, output, paths, filemap_path, options.jobs)
+        elapsed = time.perf_counter() - t
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for path in failed:
+        print("failed:", path, file=sys.stderr)
+    print(
+        f"{len(paths)} pages rendered in {elapsed:.1f} s"
+        f" ({len(paths) / max(elapsed, 1e-9):.0f} pages/s), {len(failed)} failed"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -1,15 +1,27 @@
 """Full-text searcher for headwords/phrases/examples/definitions"""
 
 import fnmatch
+import heapq
 import os.path
 import re
-from operator import itemgetter
+import threading
+import time
+from collections import defaultdict
+from functools import reduce
+from operator import and_, itemgetter, or_
 
 from whoosh import index as wh_index
 from whoosh.analysis import Filter, StandardAnalyzer
-from whoosh.collectors import TopCollector, UnlimitedCollector, WrappingCollector
-from whoosh.fields import ID, IDLIST, STORED, TEXT, Schema
-from whoosh.highlight import HtmlFormatter, WholeFragmenter
+from whoosh.collectors import (
+    Collector,
+    TopCollector,
+    UnlimitedCollector,
+    WrappingCollector,
+)
+from whoosh.columns import NumericColumn
+from whoosh.fields import COLUMN, ID, IDLIST, TEXT, Schema
+from whoosh.highlight import HtmlFormatter, WholeFragmenter, highlight
+from whoosh.lang.morph_en import variations
 from whoosh.qparser import (
     BoostPlugin,
     OperatorsPlugin,
@@ -19,24 +31,67 @@ from whoosh.qparser import (
 )
 from whoosh.query import And, Or, Term, Variations
 
+from . import spelling, storedfields
+from .utils import trace
+from .utils.bitmap import BitmapTableReader, BitmapTableWriter
+from .utils.cache import LRUCache, sizeof_results
 from .utils.cdb import CDBError, CDBMaker, CDBReader
 from .utils.text import dec_utf8, enc_utf8, normalize_index_key, normalize_token
 
+# Minimum interval (in seconds) between checks for a changed index
+_REFRESH_INTERVAL = 1.0
+
+# Sorted results of recent queries, shared by all the searchers.
+# Keys are (index_dir, query_str1, query_str2, itemtypes, limit, highlight).
+_result_cache = LRUCache(
+    256, maxbytes=32 * 1024 * 1024, sizeof=sizeof_results, name="search.results"
+)
+
+# Variant terms of recently expanded query words, shared by all the
+# searchers. Keys are (index path, word).
+_expansion_cache = LRUCache(8192, name="search.expansions")
+
+# Variant terms of each indexed word, in the index
+_EXPANSIONS_NAME = "expansions.cdb"
+
+# Stored fields of the documents, in the index
+_STORED_NAME = "stored.dat"
+
+# Spelling correction index of the content words, in the index
+_SPELLING_NAME = "spelling.cdb"
+
+# Bitmaps of the documents of each asfilter code and item type, in the index
+_FILTERS_NAME = "filters.cdb"
+_IDLIST_TOKEN = re.compile(r"[^\r\n\t ,;]+")
+
+
+_NOT_PARSED = object()  # a miss in the parse cache
+
 
 class IndexError(Exception):
     pass
 
 
+class SearchAborted(Exception):
+    pass
+
+
 class AbortableCollector(WrappingCollector):
-    def __init__(self, child):
+    def __init__(self, child, limit=None):
         WrappingCollector.__init__(self, child)
         self._aborted = False
+        self.limit = limit
+        self.allow = None  # a Bitmap of the documents allowed, or None
 
     def collect_matches(self):
         collect = self.collect
+        allow = self.allow
+        offset = self.offset
         for sub_docnum in self.matches():
             if self._aborted:
-                break
+                raise SearchAborted
+            if allow is not None and offset + sub_docnum not in allow:
+                continue
             collect(sub_docnum)
 
     @property
@@ -47,6 +102,41 @@ class AbortableCollector(WrappingCollector):
         self._aborted = True
 
 
+class RankCollector(Collector):
+    """Collects hits in the order of the precomputed sort rank
+
+    Only the `limit` best-ranked hits are kept, in a heap, so that
+    neither the collector nor the caller has to sort every hit.
+    """
+
+    def __init__(self, limit=None):
+        Collector.__init__(self)
+        self.limit = limit
+
+    def prepare(self, top_searcher, q, context):
+        Collector.prepare(self, top_searcher, q, context.set(weighting=None))
+        self.items = []
+
+    def set_subsearcher(self, subsearcher, offset):
+        Collector.set_subsearcher(self, subsearcher, offset)
+        self._ranks = subsearcher.reader().column_reader("rank")
+
+    def collect(self, sub_docnum):
+        global_docnum = self.offset + sub_docnum
+        self.docset.add(global_docnum)
+        item = (-self._ranks[sub_docnum], global_docnum)
+        items = self.items
+        if self.limit is None or len(items) < self.limit:
+            heapq.heappush(items, item)
+        elif items and item > items[0]:
+            heapq.heapreplace(items, item)
+
+    def results(self):
+        items = [(-negrank, docnum) for (negrank, docnum) in self.items]
+        items.sort()
+        return self._results(items, docset=self.docset)
+
+
 # -----------------
 # Word Vatiations
 # -----------------
@@ -79,6 +169,19 @@ class VariationsReader:
         r.update(dec_utf8(w) for w in s.split(b"\0"))
         return r
 
+    def words(self):
+        """Yield the words that have variations"""
+        for k, v in self._reader.iteritems():
+            yield dec_utf8(k)
+
+
+def open_variations(var_path):
+    """Open a word variation database, or return None"""
+    try:
+        return VariationsReader(var_path)
+    except (OSError, CDBError):
+        return None
+
 
 class VariationsWriter:
     def __init__(self, f):
@@ -91,43 +194,131 @@ class VariationsWriter:
         self._writer.finalize()
 
 
-def my_variations(var_reader):
+def variant_words(word, var_reader):
+    """Return the word with its inflections and morphological variations"""
+    words = set(variations(word))
     if var_reader:
+        words.update(var_reader.get_variations(word))
+    return words
+
+
+def make_expansions(terms, var_reader):
+    """Map each term and each word of var_reader to its variants in terms
+
+    The variants of a word are the terms among variant_words(), sorted.
+    """
+    terms = frozenset(terms)
+    words = set(terms)
+    if var_reader:
+        words.update(var_reader.words())
+    return {
+        word: sorted(terms.intersection(variant_words(word, var_reader)))
+        for word in words
+    }
+
+
+class ExpansionsReader:
+    def __init__(self, path):
+        self._reader = None
+        self._reader = CDBReader(path)
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+    def close(self):
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+
+    def get(self, word):
+        """Return the variant terms of a word, or None if not in the table"""
+        s = self._reader.get(enc_utf8(word))
+        if s is None:
+            return None
+        return [dec_utf8(w) for w in s.split(b"\0")] if s else []
 
-        def f(fieldname, text, boost=1.0):
-            return MyVariations(var_reader, fieldname, text, boost)
 
-        return f
-    return Term
+def write_expansions(path, expansions):
+    with open(path, "wb") as f:
+        writer = CDBMaker(f)
+        for word in sorted(expansions):
+            writer.add(
+                enc_utf8(word), b"\0".join(enc_utf8(w) for w in expansions[word])
+            )
+        writer.finalize()
+
+
+def my_variations(expand):
+    def f(fieldname, text, boost=1.0):
+        return MyVariations(expand, fieldname, text, boost)
+
+    return f
 
 
 class MyVariations(Variations):
-    def __init__(self, var_reader, fieldname, text, boost=1.0):
+    """Variations of a content word, as given by expand(word, ixreader)"""
+
+    def __init__(self, expand, fieldname, text, boost=1.0):
         super(MyVariations, self).__init__(fieldname, text, boost)
-        self.__var_reader = var_reader
-        self.__fieldname = fieldname
-        self.__text = text
-        self.__boost = boost
-        self.__cache = {}
-
-    def _words(self, ixreader):
-        cache = self.__cache
-        text = self.text
-        if text in cache:
-            return cache[text]
-        fieldname = self.fieldname
-        words = [
-            word
-            for word in self.__var_reader.get_variations(text)
-            if (fieldname, word) in ixreader
-        ]
-        cache[text] = words
-        return words
+        self.__expand = expand
+
+    def _btexts(self, ixreader):
+        if self.fieldname != "content":
+            return super(MyVariations, self)._btexts(ixreader)
+        return [enc_utf8(word) for word in self.__expand(self.text, ixreader)]
 
     def __deepcopy__(self, x):
-        return MyVariations(
-            self.__var_reader, self.__fieldname, self.__text, self.__boost
-        )
+        return MyVariations(self.__expand, self.fieldname, self.text, self.boost)
+
+
+# -----------------
+# Filter Bitmaps
+# -----------------
+
+
+def write_filters(path, num_docs, filters):
+    """Write a dict of {"field:text": [docnum, ...]} as bitmaps"""
+    with open(path, "wb") as f:
+        writer = BitmapTableWriter(f, num_docs)
+        for name in sorted(filters):
+            writer.add(name, filters[name])
+        writer.finalize()
+
+
+def open_filters(path, num_docs):
+    """Open the filter bitmaps of an index, or return None
+
+    None is also returned when the bitmaps were made for a different
+    number of documents than the index now has.
+    """
+    try:
+        filters = BitmapTableReader(path)
+    except (OSError, ValueError, KeyError, CDBError):
+        return None
+    if filters.num_docs != num_docs:
+        filters.close()
+        return None
+    return filters
+
+
+def _filter_bitmap(query, filters):
+    """Evaluate asfilter/itemtype terms combined with AND and OR
+
+    Return None if the query contains anything else.
+    """
+    if isinstance(query, Term):
+        if query.fieldname not in ("asfilter", "itemtype"):
+            return None
+        return filters.get(f"{query.fieldname}:{query.text}")
+    if isinstance(query, (And, Or)) and query.subqueries:
+        bitmaps = [_filter_bitmap(q, filters) for q in query.subqueries]
+        if any(b is None for b in bitmaps):
+            return None
+        return reduce(and_ if isinstance(query, And) else or_, bitmaps)
+    return None
 
 
 # -----------------
@@ -145,10 +336,10 @@ class _AccentFilter(Filter):
 _stopwords = frozenset(("a", "an"))
 _analyzer = StandardAnalyzer(stoplist=_stopwords) | _AccentFilter()
 _schema = Schema(
-    content=TEXT(stored=True, spelling=True, analyzer=_analyzer),
-    data=STORED,  # tuple (label, path, prio, sortkey)
+    content=TEXT(analyzer=_analyzer),
     itemtype=ID,
     asfilter=IDLIST,
+    rank=COLUMN(NumericColumn("I")),  # position in the (sortkey, prio) order
 )
 _schema["content"].scorable = False
 
@@ -158,8 +349,20 @@ _schema["content"].scorable = False
 # -----------------
 
 
+def sort_ranks(keys):
+    """Return the ranks of (sortkey, prio) pairs in the result order
+
+    The ranks are to be passed to Maker.add_item() in the same order.
+    """
+    keys = [(normalize_index_key(sortkey), prio) for (sortkey, prio) in keys]
+    ranks = [0] * len(keys)
+    for rank, i in enumerate(sorted(range(len(keys)), key=keys.__getitem__)):
+        ranks[i] = rank
+    return ranks
+
+
 class Maker:
-    def __init__(self, index_dir):
+    def __init__(self, index_dir, var_path=None):
         if os.path.exists(index_dir) and os.path.isfile(index_dir):
             os.unlink(index_dir)
 
@@ -167,26 +370,67 @@ class Maker:
             os.makedirs(index_dir)
 
         index = wh_index.create_in(index_dir, _schema)
+        self._index_dir = index_dir
+        self._var_path = var_path
         self._index = index
         self._writer = index.writer()
         self._committed = False
+        self._num_docs = 0
+        self._filters = defaultdict(list)  # "field:text" -> [docnum, ...]
+        stored_path = os.path.join(index_dir, _STORED_NAME)
+        self._stored = storedfields.Maker(stored_path, stored_path + ".tmp")
+
+    def add_item(self, itemtype, content, asfilter, label, path, prio, sortkey, rank):
+        # a single writer makes a single segment, numbered in order of addition
+        docnum = self._num_docs
+        self._num_docs += 1
+        filters = self._filters
+        filters["itemtype:" + itemtype].append(docnum)
+        for code in _IDLIST_TOKEN.findall(asfilter):
+            filters["asfilter:" + code].append(docnum)
+
+        self._stored.add(label, path, prio, sortkey, content)
 
-    def add_item(self, itemtype, content, asfilter, label, path, prio, sortkey):
         self._writer.add_document(
             itemtype=itemtype,
             content=content,
             asfilter=asfilter,
-            data=(label, path, prio, normalize_index_key(sortkey)),
+            rank=rank,
         )
 
     def commit(self):
         self._committed = True
         self._writer.commit()
+        self._stored.commit()
+        write_filters(
+            os.path.join(self._index_dir, _FILTERS_NAME), self._num_docs, self._filters
+        )
+
+        spelling_maker = spelling.Maker(os.path.join(self._index_dir, _SPELLING_NAME))
+        reader = self._index.reader()
+        try:
+            terms = []
+            for t in reader.lexicon("content"):
+                term = dec_utf8(t)
+                terms.append(term)
+                spelling_maker.add_word(term, reader.doc_frequency("content", t))
+        finally:
+            reader.close()
+        spelling_maker.commit()
+        var_reader = open_variations(self._var_path) if self._var_path else None
+        try:
+            expansions = make_expansions(terms, var_reader)
+        finally:
+            if var_reader:
+                var_reader.close()
+        write_expansions(os.path.join(self._index_dir, _EXPANSIONS_NAME), expansions)
 
     def close(self):
         if not self._committed:
             self._writer.cancel()
 
+        self._stored.close()
+        self._stored = None
         self._index.close()
         self._index = None
         self._writer = None
@@ -197,15 +441,118 @@ class Maker:
 # -----------------
 
 
+class _Live:
+    """A whoosh searcher and the tables of its index, used by one thread"""
+
+    def __init__(self, owner, searcher):
+        self._index_dir = owner._index_dir
+        self._ranked = owner._ranked
+        self._stored_in_index = owner._stored_in_index
+        self.searcher = searcher
+        self.filters = None
+        self.expansions = None
+        self.corrector = None
+        self.stored = None
+        self.checked = time.monotonic()
+        self._open_tables()
+
+    def refresh(self):
+        self.searcher = self.searcher.refresh()
+        self._close_tables()
+        self._open_tables()
+
+    def close(self):
+        self._close_tables()
+        if self.searcher is not None:
+            self.searcher.close()
+            self.searcher = None
+
+    def _open_tables(self):
+        """Open the filter bitmaps and the expansion table of the index"""
+        searcher = self.searcher
+        # the docnums of the bitmaps are valid for a single segment only
+        if self._ranked and searcher.is_atomic():
+            self.filters = open_filters(
+                os.path.join(self._index_dir, _FILTERS_NAME), searcher.doc_count_all()
+            )
+        if not self._stored_in_index:
+            self.stored = storedfields.Reader(
+                os.path.join(self._index_dir, _STORED_NAME)
+            )
+            if self.stored.num_docs != searcher.doc_count_all():
+                raise IndexError("stored fields do not match the index")
+        try:
+            self.expansions = ExpansionsReader(
+                os.path.join(self._index_dir, _EXPANSIONS_NAME)
+            )
+        except (OSError, ValueError, CDBError):
+            self.expansions = None
+        try:
+            self.corrector = spelling.Corrector(
+                os.path.join(self._index_dir, _SPELLING_NAME)
+            )
+        except spelling.IndexError:
+            self.corrector = None
+
+    def _close_tables(self):
+        if self.filters is not None:
+            self.filters.close()
+            self.filters = None
+        if self.expansions is not None:
+            self.expansions.close()
+            self.expansions = None
+        if self.corrector is not None:
+            self.corrector.close()
+            self.corrector = None
+        if self.stored is not None:
+            self.stored.close()
+            self.stored = None
+
+
 class Searcher:
+    """Full-text searcher
+
+    Each thread keeps a whoosh searcher open and reuses it across
+    queries, so that segment readers and term caches survive between
+    queries; it is refreshed when the index on disk changes. Whoosh
+    searchers are not thread-safe, but as no searcher is shared, this
+    object can be shared between threads, and their queries run
+    concurrently.
+
+    Hits are collected in the order of the sort rank stored at index
+    time. Results are cached in a process-wide LRU cache, which is
+    invalidated for the index when it is refreshed or closed.
+
+    The stored fields of the documents are read from a storedfields
+    file; only indexes made by older versions keep them in whoosh.
+
+    Filters (asfilter codes and item types) are evaluated on the bitmaps
+    made at index time, if any, instead of the inverted index. Likewise,
+    query words are expanded to their variants with the table made at
+    index time, and with VariationsReader and morph_en otherwise.
+    """
+
     def __init__(self, index_dir, var_path):
+        self._index_dir = index_dir
         self._index = None
+        self._local = threading.local()
+        self._lives = []  # the _Live of each thread
+        self._lock = threading.Lock()  # guards _index and _lives
         try:
             self._index = wh_index.open_dir(index_dir)
         except wh_index.IndexError:
             raise IndexError
 
-        self._var_reader = self._make_var_reader(var_path)
+        # indexes made by older versions have no sort rank, and keep the
+        # stored fields in whoosh
+        self._ranked = "rank" in self._index.schema
+        self._stored_in_index = "data" in self._index.schema
+        if not self._stored_in_index and not os.path.exists(
+            os.path.join(index_dir, _STORED_NAME)
+        ):
+            raise IndexError
+
+        self._var_reader = open_variations(var_path)
 
         op = OperatorsPlugin(
             And=r"\bAND\b|&",
@@ -214,9 +561,7 @@ class Searcher:
             AndMaybe=None,
             Require=None,
         )
-        parser = QueryParser(
-            "content", _schema, termclass=my_variations(self._var_reader)
-        )
+        parser = QueryParser("content", _schema, termclass=my_variations(self._expand))
         parser.remove_plugin_class(RangePlugin)
         parser.remove_plugin_class(BoostPlugin)
         parser.remove_plugin_class(WildcardPlugin)
@@ -224,7 +569,7 @@ class Searcher:
         self._parser = parser
 
         parser_wild = QueryParser(
-            "content", _schema, termclass=my_variations(self._var_reader)
+            "content", _schema, termclass=my_variations(self._expand)
         )
         parser_wild.remove_plugin_class(RangePlugin)
         parser_wild.remove_plugin_class(BoostPlugin)
@@ -237,6 +582,8 @@ class Searcher:
         asf_parser = QueryParser("asfilter", _schema)
         asf_parser.replace_plugin(op_filter)
         self._asf_parser = asf_parser
+        # (parser, query string) -> tree
+        self._parse_cache = LRUCache(1024, name="fulltext.parse")
 
     def __del__(self):
         try:
@@ -245,31 +592,132 @@ class Searcher:
             pass
 
     def close(self):
-        if self._index:
-            self._index.close()
-            self._index = None
-        if self._var_reader:
-            self._var_reader.close()
-
-    def _make_var_reader(self, var_path):
-        try:
-            return VariationsReader(var_path)
-        except (OSError, CDBError):
-            return None
+        with self._lock:
+            self._invalidate_cache()
+            for live in self._lives:
+                live.close()
+            del self._lives[:]
+            if self._index:
+                self._index.close()
+                self._index = None
+            if self._var_reader:
+                self._var_reader.close()
+
+    def _invalidate_cache(self):
+        index_dir = self._index_dir
+        _result_cache.invalidate(lambda key: key[0] == index_dir)
+        _expansion_cache.invalidate(lambda key: key[0] == index_dir)
+
+    def _live(self):
+        """Return the long-lived whoosh searcher and tables of this thread
+
+        No lock is held while they are used.
+        """
+        live = getattr(self._local, "live", None)
+        if live is None or live.searcher is None:
+            with self._lock:
+                if self._index is None:
+                    raise IndexError("searcher closed")
+                live = _Live(self, self._index.searcher())
+                self._lives.append(live)
+            self._local.live = live
+        else:
+            now = time.monotonic()
+            if now - live.checked >= _REFRESH_INTERVAL:
+                live.checked = now
+                if not live.searcher.up_to_date():
+                    live.refresh()
+                    self._invalidate_cache()
+        return live
+
+    def _expand(self, word, ixreader):
+        """Return the variant terms of a query word in the content field"""
+        key = (self._index_dir, word)
+        words = _expansion_cache.get(key)
+        if words is None:
+            expansions = self._live().expansions
+            if expansions is not None:
+                words = expansions.get(word)
+            if words is None:
+                words = sorted(
+                    w
+                    for w in variant_words(word, self._var_reader)
+                    if ("content", w) in ixreader
+                )
+            _expansion_cache.put(key, words)
+        return words
 
     def correct(self, misspelled, limit=5):
-        with self._index.searcher() as searcher:
-            corrector = searcher.corrector("content")
-            return corrector.suggest(misspelled, limit)
+        live = self._live()
+        if live.corrector is not None:
+            return [word for (word, score) in live.corrector.suggest(misspelled, limit)]
+        # indexes made by older versions have a spelling graph instead
+        corrector = live.searcher.corrector("content")
+        return corrector.suggest(misspelled, limit)
 
     def make_collector(self, limit=None):
+        if self._ranked:
+            return AbortableCollector(RankCollector(limit), limit)
         if limit is None:
             return AbortableCollector(UnlimitedCollector())
-        return AbortableCollector(TopCollector(limit))
+        return AbortableCollector(TopCollector(limit), limit)
+
+    def _parse(self, parser, query_str):
+        """Parse a query string, memoizing the query tree
+
+        The trees are reused by later searches, and must not be modified.
+        """
+        key = (parser, query_str)
+        query = self._parse_cache.get(key, _NOT_PARSED)
+        if query is _NOT_PARSED:
+            query = parser.parse(query_str)
+            self._parse_cache.put(key, query)
+        return query
+
+    def _content_parser(self, query_str1):
+        if query_str1 and any(c in query_str1 for c in "*?"):
+            return self._parser_wild
+        return self._parser
 
     def search(
-        self, collector, query_str1=None, query_str2=None, itemtypes=(), highlight=False
+        self,
+        collector,
+        query_str1=None,
+        query_str2=None,
+        itemtypes=(),
+        highlight=False,
     ):
+        """Run a query and return a sorted list of result tuples
+
+        With highlight, the text of each result is its stored content.
+        Pass the results to be displayed to highlight() to mark up the
+        matches, since highlighting re-tokenizes the text.
+
+        SearchAborted is raised as soon as the collector is aborted.
+        """
+        key = (
+            self._index_dir,
+            query_str1,
+            query_str2,
+            tuple(itemtypes),
+            collector.limit,
+            highlight,
+        )
+        live = self._live()
+        results = _result_cache.get(key)
+        if results is None:
+            with trace.span("fulltext.query"):
+                results = self._search(
+                    live, collector, query_str1, query_str2, itemtypes, highlight
+                )
+            results = tuple(results)
+            _result_cache.put(key, results)
+        return list(results)
+
+    def _search(self, live, collector, query_str1, query_str2, itemtypes, highlight):
+        if collector.limit == 0:
+            return []
+
         # rejects '*' and '?'
         if query_str1:
             for kw in (s.strip() for s in query_str1.split()):
@@ -278,63 +726,114 @@ class Searcher:
 
         wildcard = query_str1 and any(c in query_str1 for c in "*?")
 
-        parser = self._parser_wild if wildcard else self._parser
+        parser = self._content_parser(query_str1)
         asf_parser = self._asf_parser
 
-        with self._index.searcher() as searcher:
-            andlist = []
-            try:
-                if query_str1:
-                    andlist.append(parser.parse(query_str1))
-                if query_str2:
-                    andlist.append(asf_parser.parse(query_str2))
-            except:
-                return []
-
-            if itemtypes:
-                if len(itemtypes) > 1:
-                    andlist.append(Or([Term("itemtype", t) for t in itemtypes]))
-                else:
-                    andlist.append(Term("itemtype", itemtypes[0]))
-
-            query = And(andlist)
-
-            searcher.search_with_collector(query, collector)
-            hits = collector.results()
-
-            if highlight:
-                hits.fragmenter = WholeFragmenter()
-                hits.formatter = HtmlFormatter(
-                    tagname="span", classname="s_match", termclass="s_term"
-                )
-
-            if wildcard and query_str1:
-                pat = query_str1.replace("-", "").replace(" ", "")
-                wildmatch = re.compile(fnmatch.translate(pat))
-
-            # Construct a result list
-            results = []
-            for hit in hits:
-                if collector.aborted:
-                    return []
-                (label, path, prio, sortkey) = hit["data"]
-
+        andlist = []
+        filterlist = []
+        try:
+            if query_str1:
+                andlist.append(self._parse(parser, query_str1))
+            if query_str2:
+                filterlist.append(self._parse(asf_parser, query_str2))
+        except:
+            return []
+
+        if itemtypes:
+            if len(itemtypes) > 1:
+                filterlist.append(Or([Term("itemtype", t) for t in itemtypes]))
+            else:
+                filterlist.append(Term("itemtype", itemtypes[0]))
+
+        allow = None
+        if filterlist and live.filters is not None:
+            allow = _filter_bitmap(And(filterlist), live.filters)
+        if allow is None:
+            andlist.extend(filterlist)
+        elif not allow:
+            return []
+
+        searcher = live.searcher
+        if collector.aborted:
+            raise SearchAborted
+        if andlist:
+            collector.allow = allow
+            searcher.search_with_collector(And(andlist), collector)
+            docnums = [docnum for (_, docnum) in collector.results().top_n]
+        elif allow is not None:
+            docnums = self._filter_docnums(searcher, collector, allow)
+        else:
+            return []
+
+        if wildcard and query_str1:
+            pat = query_str1.replace("-", "").replace(" ", "")
+            wildmatch = re.compile(fnmatch.translate(pat))
+
+        # Construct a result list
+        results = []
+        stored = live.stored
+        stored_fields = searcher.stored_fields
+        for docnum in docnums:
+            if collector.aborted:
+                raise SearchAborted
+            if stored is not None:
+                if wildcard and query_str1:
+                    if not wildmatch.match(stored.sortkey(docnum)):
+                        continue
+                (label, path, prio, sortkey) = stored.data(docnum)
+                text = stored.content(docnum) if highlight else None
+            else:
+                fields = stored_fields(docnum)
+                (label, path, prio, sortkey) = fields["data"]
                 if wildcard and query_str1:
                     if not wildmatch.match(sortkey):
                         continue
+                text = fields["content"] if highlight else None
 
-                if highlight:
-                    if query_str1:
-                        text = hit.highlights("content")
-                    else:
-                        text = hit["content"]
-                else:
-                    text = None
-
-                results.append((label, path, sortkey, prio, text))
+            results.append((label, path, sortkey, prio, text))
 
+        if not self._ranked:
             sortkey_prio_getter = itemgetter(2, 3)
             results.sort(key=sortkey_prio_getter)
 
-            # Return
-            return results
+        # Return
+        return results
+
+    def _filter_docnums(self, searcher, collector, docnums):
+        """Return the best-ranked documents of a bitmap, in rank order"""
+        ranks = searcher.reader().column_reader("rank")
+        if collector.limit is None:
+            return sorted(docnums, key=ranks.__getitem__)
+        return heapq.nsmallest(collector.limit, docnums, key=ranks.__getitem__)
+
+    def highlight(self, query_str1, results):
+        """Return the results with the matches of query_str1 marked up"""
+        if not query_str1:
+            return list(results)
+
+        try:
+            query = self._parse(self._content_parser(query_str1), query_str1)
+        except:
+            return list(results)
+
+        words = frozenset(
+            _schema["content"].from_bytes(text)
+            for (fieldname, text) in query.existing_terms(
+                self._live().searcher.reader(), fieldname="content", expand=True
+            )
+        )
+
+        fragmenter = WholeFragmenter()
+        formatter = HtmlFormatter(
+            tagname="span", classname="s_match", termclass="s_term"
+        )
+        return [
+            (
+                label,
+                path,
+                sortkey,
+                prio,
+                highlight(text, words, _analyzer, fragmenter, formatter),
+            )
+            for (label, path, sortkey, prio, text) in results
+        ]
@@ -1,15 +1,40 @@
-"""Incremental searcher for headwords and phrases"""
+"""Incremental searcher for headwords and phrases
+
+Version 2 of the index keeps the labels and paths of the items in a
+string table, so that the parts shared by many items (the headword
+label of an entry, the entry path) are stored once and referenced by
+number:
+
+    header           magic, version, num, first, num_strings,
+                     string offsets position, string pool position
+    item records     plain, typecode and path fragment inline,
+                     label head, label tail and path entry by number
+    string offsets   (num_strings + 1) x uint32, into the string pool
+    string pool      distinct strings, each stored once
+    sorted index     num x uint32, positions of the records (at first)
+
+Version 1 indexes, which have the labels and paths inline, can still
+be read.
+"""
 
 import mmap
 import os
 from operator import itemgetter
 from struct import Struct
 
+from .utils import trace
 from .utils.compat import range
-from .utils.text import dec_utf8, enc_utf8, normalize_index_key
+from .utils.text import (
+    dec_utf8,
+    enc_utf8,
+    normalize_index_key,
+    split_label,
+    split_path,
+)
 
 _MAGIC = 0x28061691
-_DB_VERSION = 1
+_DB_VERSION = 2
+_DB_VERSION_INLINE = 1
 
 
 _struct_I = Struct(b"<I")
@@ -21,6 +46,16 @@ _pack_HBHHB = _struct_HBHHB.pack
 _unpack_HBHHB = _struct_HBHHB.unpack
 del _struct_HBHHB
 _unpack_H = Struct(b"<H").unpack
+_struct_III = Struct(b"<III")
+_unpack_III = _struct_III.unpack
+del _struct_III
+# lenplain, lentypecode, label head, label tail, path entry, lenfragment, prio
+_struct_record = Struct(b"<HBIIIHB")
+_pack_record = _struct_record.pack
+_unpack_record = _struct_record.unpack
+_RECORD_SIZE = _struct_record.size
+del _struct_record
+_unpack_II = Struct(b"<II").unpack_from
 
 
 class IndexError(Exception):
@@ -43,7 +78,8 @@ class Searcher:
             raise IndexError("too small")
         if _unpack_I(read(4))[0] != _MAGIC:
             raise IndexError("broken")
-        if _unpack_I(read(4))[0] != _DB_VERSION:
+        (self._version,) = _unpack_I(read(4))
+        if self._version not in (_DB_VERSION, _DB_VERSION_INLINE):
             raise IndexError("cannot use this version of index")
 
         (self._num,) = _unpack_I(read(4))
@@ -53,6 +89,18 @@ class Searcher:
         if file_size != self._first + self._num * 4:
             raise IndexError("broken")
 
+        self._strings = {}  # string number -> decoded string
+        if self._version == _DB_VERSION:
+            if file_size < 7 * 4:
+                raise IndexError("too small")
+            (
+                self._num_strings,
+                self._p_string_offsets,
+                self._p_strings,
+            ) = _unpack_III(read(12))
+            if self._p_strings > self._first:
+                raise IndexError("broken")
+
     # Using these magic methods (__enter__, __exit__) allows you to implement objects which can be used easily with the
     # with statement.
     def __enter__(self):
@@ -74,6 +122,49 @@ class Searcher:
             self._mm.close()
             self._mm = None
 
+    def _string(self, n):
+        s = self._strings.get(n)
+        if s is None:
+            (a, b) = _unpack_II(self._mm, self._p_string_offsets + 4 * n)
+            p = self._p_strings
+            s = self._strings[n] = dec_utf8(self._mm[p + a : p + b])
+        return s
+
+    def _read_items(self, start, count):
+        (seek, read) = (self._mm.seek, self._mm.read)
+        first = self._first
+        mm = self._mm
+        ret = [None] * count
+        p = first + 4 * start
+        seek(_unpack_I(mm[p : p + 4])[0])
+        if self._version == _DB_VERSION_INLINE:
+            for i in range(count):
+                (lenplain, lentypecode, lenlabel, lenpath, prio) = _unpack_HBHHB(
+                    read(8)
+                )
+                data = read(lenplain + lentypecode + lenlabel + lenpath)
+                plain = dec_utf8(data[:lenplain])
+                x1 = lenplain + lentypecode
+                x2 = x1 + lenlabel
+                # typecode = data[lenplain:x1]
+                label = dec_utf8(data[x1:x2])
+                path = dec_utf8(data[-lenpath:])
+                ret[i] = (label, path, plain, prio, None)
+            return ret
+
+        string = self._string
+        for i in range(count):
+            (lenplain, lentypecode, head, tail, entry, lenfragment, prio) = (
+                _unpack_record(read(_RECORD_SIZE))
+            )
+            data = read(lenplain + lentypecode + lenfragment)
+            plain = dec_utf8(data[:lenplain])
+            fragment = dec_utf8(data[lenplain + lentypecode :])
+            label = string(head) + string(tail)
+            ret[i] = (label, string(entry) + fragment, plain, prio, None)
+        return ret
+
+    @trace.traced("incremental.search")
     def search(self, key, limit):
         """
         key: word to search
@@ -85,6 +176,7 @@ class Searcher:
         mm = self._mm
         num = self._num
         first = self._first
+        skip = 8 if self._version == _DB_VERSION_INLINE else _RECORD_SIZE
 
         def bisect_start(key):
             (a, b) = (0, num)
@@ -93,7 +185,7 @@ class Searcher:
                 p = first + 4 * c
                 (p,) = _unpack_I(mm[p : p + 4])
                 (lenp,) = _unpack_H(mm[p : p + 2])
-                p += 8
+                p += skip
                 plain = dec_utf8(mm[p : p + lenp])
                 if key > plain:
                     a = c + 1
@@ -108,7 +200,7 @@ class Searcher:
                 p = first + 4 * c
                 (p,) = _unpack_I(mm[p : p + 4])
                 (lenp,) = _unpack_H(mm[p : p + 2])
-                p += 8
+                p += skip
                 plain = dec_utf8(mm[p : p + lenp])
                 if key < plain and not plain.startswith(key):
                     b = c
@@ -122,22 +214,7 @@ class Searcher:
         if start == num:
             return []
 
-        (seek, read) = (mm.seek, mm.read)
-        ret = [None] * min(limit, end - start)
-        p = first + 4 * start
-        seek(_unpack_I(mm[p : p + 4])[0])
-        for i in range(len(ret)):
-            (lenplain, lentypecode, lenlabel, lenpath, prio) = _unpack_HBHHB(read(8))
-            data = read(lenplain + lentypecode + lenlabel + lenpath)
-            plain = dec_utf8(data[:lenplain])
-            x1 = lenplain + lentypecode
-            x2 = x1 + lenlabel
-            # typecode = data[lenplain:x1]
-            label = dec_utf8(data[x1:x2])
-            path = dec_utf8(data[-lenpath:])
-            ret[i] = (label, path, plain, prio, None)
-
-        return ret
+        return self._read_items(start, min(limit, end - start))
 
 
 class Maker:
@@ -146,22 +223,37 @@ class Maker:
         self._path = path
         self._tmp_path = tmp_path
         self._tmpf = open(tmp_path, "wb")
+        self._strings = {}  # string -> number
+
+    def _intern(self, s):
+        strings = self._strings
+        n = strings.get(s)
+        if n is None:
+            n = strings[s] = len(strings)
+        return n
 
     def add_item(self, plain, typecode, label, path, prio):
+        intern = self._intern
         plain_n = normalize_index_key(plain)
         plain_e = enc_utf8(plain_n)
         typecode_e = enc_utf8(typecode)
-        label_e = enc_utf8(label)
-        path_e = path.encode("ascii")
+        (head, tail) = split_label(label)
+        (entry, fragment) = split_path(path)
+        fragment_e = fragment.encode("ascii")
         data = b"".join(
             (
-                _pack_HBHHB(
-                    len(plain_e), len(typecode_e), len(label_e), len(path_e), prio
+                _pack_record(
+                    len(plain_e),
+                    len(typecode_e),
+                    intern(head),
+                    intern(tail),
+                    intern(entry),
+                    len(fragment_e),
+                    prio,
                 ),
                 plain_e,
                 typecode_e,
-                label_e,
-                path_e,
+                fragment_e,
             )
         )
         tmpf = self._tmpf
@@ -206,27 +298,44 @@ class Maker:
         if len(mm) != first + num * 4:
             raise IndexError("index is broken")
 
+        strings = [enc_utf8(s) for s in self._strings]  # in order of numbering
+        del self._strings
+        string_offsets = [0]
+        for s in strings:
+            string_offsets.append(string_offsets[-1] + len(s))
+
+        header_size = 7 * 4
+        p_string_offsets = header_size + first
+        p_strings = p_string_offsets + 4 * (len(strings) + 1)
+        new_first = p_strings + string_offsets[-1]
+
         dstf = open(self._path, "wb")
 
         write = dstf.write
         write(_pack_I(_MAGIC))
         write(_pack_I(_DB_VERSION))
         write(_pack_I(num))
-        write(_pack_I(first + 4 * 4))
+        write(_pack_I(new_first))
+        write(_pack_I(len(strings)))
+        write(_pack_I(p_string_offsets))
+        write(_pack_I(p_strings))
 
         new_xlist = []
         p = first
-        newx = 4 * 4
+        newx = header_size
         for i in range(num):
             new_xlist.append(newx)
             x = _unpack_I(mm[p : p + 4])[0]
-            sizes = mm[x : (x + 8)]
-            (lenplain, lentypecode, lenlabel, lenpath, prio) = _unpack_HBHHB(sizes)
-            datasize = lenplain + lentypecode + lenlabel + lenpath
-            data = mm[x : (x + 8 + datasize)]
+            sizes = mm[x : (x + _RECORD_SIZE)]
+            (lenplain, lentypecode, _, _, _, lenfragment, prio) = _unpack_record(sizes)
+            datasize = lenplain + lentypecode + lenfragment
+            data = mm[x : (x + _RECORD_SIZE + datasize)]
             write(data)
             p += 4
-            newx += 8 + datasize
+            newx += _RECORD_SIZE + datasize
+
+        write(b"".join(_pack_I(x) for x in string_offsets))
+        write(b"".join(strings))
 
         for x in new_xlist:
             write(_pack_I(x))
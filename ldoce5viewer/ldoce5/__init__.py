@@ -2,6 +2,7 @@ import os.path
 import traceback
 import zlib
 
+from ..utils import trace
 from ..utils.cdb import CDBError, CDBReader
 from . import transform
 from .filemap import FilemapReader
@@ -32,9 +33,50 @@ def load_from_cdb_archive(data_dir, archive_name, name):
 
 
 class LDOCE5:
-    def __init__(self, data_dir, filemap_path):
+    """Content of the dictionary
+
+    By default, the file-location map and the archives are opened for
+    each get_content() call. With keep_open, they are opened once and
+    kept open until close(); the object must then be used by a single
+    thread at a time.
+    """
+
+    def __init__(self, data_dir, filemap_path, keep_open=False):
         self._data_dir = data_dir
         self._filemap_path = filemap_path
+        self._readers = {} if keep_open else None  # archive name -> reader
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+    def close(self):
+        if self._readers:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+
+    def _lookup(self, archive_name, name):
+        if self._readers is None:
+            with FilemapReader(self._filemap_path) as fmr:
+                return fmr.lookup(archive_name, name)
+        fmr = self._readers.get(None)
+        if fmr is None:
+            fmr = self._readers[None] = FilemapReader(self._filemap_path)
+        return fmr.lookup(archive_name, name)
+
+    def _read(self, archive_name, location):
+        if self._readers is None:
+            with ArchiveReader(self._data_dir, archive_name) as reader:
+                return reader.read(location)
+        reader = self._readers.get(archive_name)
+        if reader is None:
+            reader = self._readers[archive_name] = ArchiveReader(
+                self._data_dir, archive_name
+            )
+        return reader.read(location)
 
     def get_content(self, path):
         try:
@@ -50,21 +92,21 @@ class LDOCE5:
             #    pass
 
             try:
-                with FilemapReader(self._filemap_path) as fmr:
-                    location = fmr.lookup(archive_name, name)
+                with trace.span("filemap.lookup"):
+                    location = self._lookup(archive_name, name)
             except (OSError, CDBError):
                 raise FilemapError
             except KeyError:
                 raise NotFoundError("content not found in filemap")
             try:
-                with ArchiveReader(self._data_dir, archive_name) as reader:
-                    return reader.read(location)
+                return self._read(archive_name, location)
             except OSError:
                 raise ArchiveError
 
         def transform_exc(tf, *data):
             try:
-                return tf(*data)
+                with trace.span("transform." + archive):
+                    return tf(*data)
             except:
                 exc = traceback.format_exc()
                 if isinstance(exc, bytes):
@@ -31,6 +31,13 @@ typecode:
 
 
 def _get_text(elem):
+    if not len(elem):
+        # a leaf, which most elements are
+        text = elem.text
+        if text is None or elem.tag in _EXCLUDE_TAGS:
+            return ""
+        return text.strip()
+
     s = []
 
     def rec(e):
@@ -147,6 +154,10 @@ def _get_incorrect_inflections(
 
 
 def get_entry_items(entry_data):
+    """Return (items, variations) of an entry
+
+    items is a generator of the searchable items of the entry.
+    """
     root = et.fromstring(entry_data)
     root_id = shorten_id(root.get("id"))
     head = root.find("Head")
@@ -155,7 +166,8 @@ def get_entry_items(entry_data):
     if hyphenation is not None:
         num_syllable = _get_text(hyphenation).count("‧") + 1
     is_freq = head.find("FREQ") is not None
-    hwdplain = _get_text(head.find("HWD/BASE"))
+    hwd = head.find("HWD")
+    hwdplain = _get_text(hwd.find("BASE"))
 
     gram_main_elems = head.findall(".//GRAM")
 
@@ -214,8 +226,7 @@ def get_entry_items(entry_data):
         return " ".join(z)
 
     def make_hwd_label():
-        hwd = head.find("HWD")
-        baselabel = escape(_get_text(hwd.find("BASE")))
+        baselabel = escape(hwdplain)
 
         homnum = head.find("HOMNUM")
         if homnum is not None:
@@ -236,11 +247,11 @@ def get_entry_items(entry_data):
 
     hwdlabel = make_hwd_label()
 
+    hwd_asfilter = _get_filter(hwd)
+
     def get_hwd():
         path = "/fs/" + root_id
-        hwd = head.find("HWD")
-        hwdplain = _get_text(hwd.find("BASE"))
-        asfilter = _get_filter(hwd)
+        asfilter = hwd_asfilter
 
         if is_uncountable:
             asfilter += " u1"
@@ -257,9 +268,7 @@ def get_entry_items(entry_data):
 
     def get_hwd_variants():
         path = "/fs/" + root_id
-        hwd = head.find("HWD")
-        hwdplain = _get_text(hwd.find("BASE"))
-        asfilter = _get_filter(hwd)
+        asfilter = hwd_asfilter
 
         for inflx in hwd.iterfind("INFLX"):
             inflxplain = _get_text(inflx)
@@ -435,47 +444,38 @@ def get_entry_items(entry_data):
             v_label = f"<l><o>{escape(v_plain)}</o> ({hwdlabel})</l>"
             yield ("pl", v_label, path, v_plain, v_plain, "", 11)
 
-    def gen(f, elems):
-        for e in elems:
-            for r in f(e):
-                yield r
-
-    items = []
     headword = get_hwd()
-    items.append(headword)
     hwd_label = headword[1]
     hwd_plain = headword[3]
+    variants = list(get_hwd_variants())
+    variations = _make_variations(hwd_plain, {v[3] for v in variants})
+
+    # The items of the body are yielded grouped by the kind of element,
+    # in this order; the elements are collected in a single walk.
+    handlers = (
+        ("Sense", get_sense),
+        ("RunOn", get_runon),
+        ("PhrVbEntry", get_phrvb),
+        ("EXAMPLE", get_example),
+        ("LEXUNIT", get_lexunit),
+        ("PROPFORMPREP", get_simple),
+        ("PROPFORM", get_simple),
+        ("Collocate", get_collocate),
+        ("Exponent", get_exponent),
+        ("COLLO", get_simple),
+        ("COLLOC", get_colloc),
+    )
+
+    def items():
+        yield headword
+        yield from variants
+
+        elems = {tag: [] for (tag, f) in handlers}
+        for e in root.iter(*elems):
+            if e is not root:
+                elems[e.tag].append(e)
+        for tag, f in handlers:
+            for e in elems[tag]:
+                yield from f(e)
 
-    inflections = set()
-    for v in get_hwd_variants():
-        items.append(v)
-        var_plain = v[3]
-        inflections.add(var_plain)
-
-    variations = _make_variations(hwd_plain, inflections)
-
-    iterfind = root.iterfind
-    for r in gen(get_sense, iterfind(".//Sense")):
-        items.append(r)
-    for r in gen(get_runon, iterfind(".//RunOn")):
-        items.append(r)
-    for r in gen(get_phrvb, iterfind(".//PhrVbEntry")):
-        items.append(r)
-    for r in gen(get_example, iterfind(".//EXAMPLE")):
-        items.append(r)
-    for r in gen(get_lexunit, iterfind(".//LEXUNIT")):
-        items.append(r)
-    for r in gen(get_simple, iterfind(".//PROPFORMPREP")):
-        items.append(r)
-    for r in gen(get_simple, iterfind(".//PROPFORM")):
-        items.append(r)
-    for r in gen(get_collocate, iterfind(".//Collocate")):
-        items.append(r)
-    for r in gen(get_exponent, iterfind(".//Exponent")):
-        items.append(r)
-    for r in gen(get_simple, iterfind(".//COLLO")):
-        items.append(r)
-    for r in gen(get_colloc, iterfind(".//COLLOC")):
-        items.append(r)
-
-    return (items, variations)
+    return (items(), variations)
@@ -18,6 +18,8 @@ except ImportError:
 
 import itertools
 
+from ..utils import trace
+
 zip = getattr(itertools, "izip", zip)
 
 _IDM_TYPE_SIZES = {"UBYTE": 1, "USHORT": 2, "U24": 3, "ULONG": 4}
@@ -228,12 +230,16 @@ class ArchiveReader:
         self._cache_offset = -1
         self._cache_size = -1
 
+    @trace.traced("archive.read")
     def read(self, location):
         (cmpoffset, cmpsize, origoffset, origsize) = location
         f = self._f
         f.seek(cmpoffset)
-        if (self._cache_offset != cmpoffset) or (self._cache_size != cmpsize):
-            self._cache = decompress(f.read(cmpsize))
+        hit = self._cache_offset == cmpoffset and self._cache_size == cmpsize
+        trace.cache_access("archive.blocks", hit)
+        if not hit:
+            with trace.span("archive.inflate"):
+                self._cache = decompress(f.read(cmpsize))
             self._cache_offset = cmpoffset
             self._cache_size = cmpsize
         return self._cache[origoffset : (origoffset + origsize)]
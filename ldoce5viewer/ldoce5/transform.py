@@ -45,31 +45,16 @@ def _build_header(resnames, title=None, meta={}):
         v = meta[k]
         r.append(f'<meta name="{escape(k)}" content="{escape(v)}" />')
 
+    # one stylesheet and one script per page type, see qtgui.access
+    bundle = "+".join(resnames)
     r.append(
-        '<script type="application/javascript" '
-        'src="static:///scripts/jquery.js"></script>\n'
+        f'<link href="static:///bundle/{bundle}.css" '
+        'rel="stylesheet" type="text/css">\n'
     )
     r.append(
         '<script type="application/javascript" '
-        'src="static:///scripts/colorbox/jquery.colorbox.js"></script>\n'
-    )
-    r.append(
-        '<link href="static:///scripts/colorbox/colorbox.css" '
-        'rel="stylesheet" type="text/css">\n'
+        f'src="static:///bundle/{bundle}.js"></script>\n'
     )
-    for name in resnames:
-        r.append(
-            f'<link href="static:///styles/{name}.css" '
-            'rel="stylesheet" type="text/css">\n'
-        )
-        r.append(
-            f'<link href="static:///styles/{name}.css" '
-            'rel="stylesheet" type="text/css">\n'
-        )
-        r.append(
-            '<script type="application/javascript" '
-            f'src="static:///scripts/{name}.js" ></script>\n'
-        )
 
     if title:
         r.append(f"<title>{title}</title>\n")
@@ -1,17 +1,21 @@
 """Entry transformer
 
 This module generates HTML documents from LDOCE's XML entry documents.
+
+body2html() writes the HTML directly while walking the entry, as the
+element tree it replaced (tests/body2html_tree.py) was serialized
+by lxml's pretty printer.
 """
 
 import platform
 import re
 
 try:
-    from urllib.parse import urlencode
+    from urllib.parse import quote, urlencode
 except:
-    from urllib import urlencode
+    from urllib import quote, urlencode
 
-from lxml.etree import Element, tounicode
+from lxml.etree import Element
 
 from ..utils.compat import basestring
 from .utils import shorten_id
@@ -47,12 +51,17 @@ def _E(tag, attrib={}, children=()):
     return elem
 
 
+_match_head = re.compile(r"(\s*)(.*)").match
+_match_tail = re.compile(r"(.*)(\s*)").match
+
+
+def _is_plainspan(e):
+    return e.tag == "span" and e.get("class", "neutral") == "neutral"
+
+
 def _preprocess_span(elem):
     """make markups sane"""
 
-    def is_plainspan(e):
-        return e.tag == "span" and e.get("class", "neutral") == "neutral"
-
     for c in elem:
         _preprocess_span(c)
 
@@ -70,10 +79,10 @@ def _preprocess_span(elem):
     if elem.tag != "Crossref":
         if len(elem) >= 1:
             span = elem[0]
-            if elem.text is None and is_plainspan(span):
+            if elem.text is None and _is_plainspan(span):
                 elem.remove(span)
                 if span.text is not None:
-                    m = re.match(r"(\s*)(.*)", span.text)
+                    m = _match_head(span.text)
                     group = m.group
                     if group(2).strip() in _SPAN_BUBBLEUP_HEAD:
                         elem.text = span.tail
@@ -90,10 +99,10 @@ def _preprocess_span(elem):
 
         if len(elem) >= 1:
             span = elem[-1]
-            if span.tail is None and is_plainspan(span):
+            if span.tail is None and _is_plainspan(span):
                 elem.remove(span)
                 if span.text is not None:
-                    m = re.match(r"(.*)(\s*)", span.text)
+                    m = _match_tail(span.text)
                     group = m.group
                     if group(1).strip() in _SPAN_BUBBLEUP_TAIL:
                         pass
@@ -107,92 +116,6 @@ def _preprocess_span(elem):
                     elem.addnext(span)
 
 
-def _as_span(elem, root):
-    """transform an element as <span>"""
-
-    attrib = {"class": elem.tag.lower()}
-    _id = elem.get("id")
-    if _id is not None:
-        attrib["id"] = shorten_id(_id)
-
-    children = [elem.text]
-    for c in elem:
-        children.extend(_dispatch(c, root))
-        children.append(c.tail)
-
-    yield _E("span", attrib, children)
-
-
-def _as_div(elem, root):
-    """transform an element as <div>"""
-
-    attrib = {"class": elem.tag.lower()}
-    _id = elem.get("id")
-    if _id:
-        attrib["id"] = shorten_id(_id)
-
-    children = [elem.text]
-    for c in elem:
-        children.extend(_dispatch(c, root))
-        children.append(c.tail)
-
-    yield _E("div", attrib, children)
-
-
-def _trans_sense(elem, root):
-    attrib = {"class": elem.tag.lower()}
-    if elem.find('span[@class="sensenum"]') is not None:
-        attrib["class"] += " sensewithnum"
-    if elem.get("id", None) is not None:
-        attrib["id"] = shorten_id(elem.get("id"))
-
-    children = [elem.text]
-    for c in elem:
-        children.extend(_dispatch(c, root))
-        children.append(c.tail)
-
-    yield _E("div", attrib, children)
-
-
-def _trans_ref(elem, root):
-    topic = elem.get("topic")
-    if len(topic.split(".")) == 4:
-        id23 = shorten_id(topic)
-        href = "/fs/" + id23
-        if elem.get("bookmark", None) is not None:
-            href += "#" + shorten_id(elem.get("bookmark"))
-    else:
-        href = "./" + elem.get("topic")
-
-    text = elem.text
-
-    suffix = elem.find("SUFFIX")
-    if suffix is not None:
-        text += suffix.text
-
-    children = [text]
-    for c in elem:
-        children.extend(_dispatch(c, root))
-        children.append(c.tail)
-
-    yield _E("a", {"href": href, "class": "ref"}, children)
-
-
-def _trans_nondv(elem, root):
-    refhwd = elem.find("REFHWD")
-    href = "#"
-    text = ""
-    if refhwd is not None:
-        text = refhwd.text
-        href = "lookup:///?" + urlencode({"q": text.strip().encode("utf-8")})
-
-    suffix = elem.find("SUFFIX")
-    if suffix is not None:
-        text += suffix.text
-
-    yield _E("a", {"href": href, "class": "nondv"}, [text])
-
-
 def _trans_assets(root):
     colloc = []
     thesaurus = []
@@ -289,128 +212,291 @@ def _trans_assets(root):
     return _E("div", {"class": "assets"}, r)
 
 
-def _trans_span(elem, root):
+# The escaping of lxml's HTML serializer, with the replacements that
+# body2html_tree() applied to its output folded in
+_TEXT_ESCAPE = {
+    ord("&"): "&amp;",
+    ord("<"): "&lt;",
+    ord(">"): "&gt;",
+    0x0D: "&#13;",
+    0x2027: "\u00b7",
+    ord("→"): "<span>→</span>",
+    ord("►"): "<span>►</span>",
+    ord("↔"): "<span>↔</span>",
+}
+_ATTR_ESCAPE = {
+    ord("&"): "&amp;",
+    ord("<"): "&lt;",
+    ord(">"): "&gt;",
+    ord('"'): "&quot;",
+    0x0D: "&#13;",
+    0x2027: "\u00b7",
+}
+_ATTR_ESCAPE_SQ = dict(_ATTR_ESCAPE)
+del _ATTR_ESCAPE_SQ[ord('"')]
+_URI_UNSAFE = re.compile("[\t\n \x7f-\U0010ffff]+")
+_URI_ATTRS = frozenset(("href", "src"))
+
+
+def _text(s):
+    return s.translate(_TEXT_ESCAPE)
+
+
+def _uri_quote(m):
+    return quote(m.group(), safe="")
+
+
+def _attr(name, value):
+    """Return ' name="value"', escaped"""
+    if name in _URI_ATTRS:
+        value = _URI_UNSAFE.sub(_uri_quote, value.lstrip(" \t\n\r"))
+    if '"' in value and "'" not in value:
+        return f" {name}='{value.translate(_ATTR_ESCAPE_SQ)}'"
+    return f' {name}="{value.translate(_ATTR_ESCAPE)}"'
+
+
+def _start_tag(tag, attrib):
+    return "<" + tag + "".join(_attr(k, v) for k, v in attrib.items()) + ">"
+
+
+# what an element writes among its siblings: nothing, a text node, an
+# inline element or a <div>
+(_NOTHING, _TEXT, _INLINE, _BLOCK) = range(4)
+
+
+def _kind(elem, root):
+    tag = elem.tag
+    if tag == "span":
+        attr_class = elem.get("class")
+        if not attr_class:
+            return _NOTHING if elem.text is None else _TEXT
+        if attr_class == "heading":
+            return _BLOCK
+        return _NOTHING if attr_class == "exabullet" else _INLINE
+    if tag == "HWD" and root.find("Head/HYPHENATION") is not None:
+        return _NOTHING
+    return _KINDS.get(tag, _INLINE)
+
+
+def _write_children(elem, root, w, text, block=False):
+    """Write text and the children of elem
+
+    Puts newlines where lxml's pretty printer does: after a <div>
+    followed by an element and, in a <div> (block) of more than one
+    node, after the start tag if an element comes first and before the
+    end tag if one comes last. Texts are nodes even when empty.
+    """
+    kinds = [_kind(c, root) for c in elem]
+    if not block and _BLOCK not in kinds:
+        if text:
+            w(_text(text))
+        for c in elem:
+            _WRITE_MAP.get(c.tag, _write_as_span)(c, root, w)
+            if c.tail:
+                w(_text(c.tail))
+        return
+
+    nodes = [] if text is None else [_TEXT]
+    nexts = []
+    for c, kind in zip(elem, kinds, strict=True):
+        if kind:
+            nodes.append(kind)
+        nexts.append(len(nodes))
+        if c.tail is not None:
+            nodes.append(_TEXT)
+    wrap = block and len(nodes) > 1
+
+    if wrap and nodes[0] != _TEXT:
+        w("\n")
+    if text:
+        w(_text(text))
+    for c, kind, i in zip(elem, kinds, nexts, strict=True):
+        _WRITE_MAP.get(c.tag, _write_as_span)(c, root, w)
+        if c.tail:
+            w(_text(c.tail))
+        elif kind == _BLOCK and i < len(nodes) and nodes[i] != _TEXT:
+            w("\n")
+    if wrap and nodes[-1] != _TEXT:
+        w("\n")
+
+
+def _write_as_span(elem, root, w):
+    _id = elem.get("id")
+    if _id is not None:
+        w(f'<span class="{elem.tag.lower()}"{_attr("id", shorten_id(_id))}>')
+    else:
+        w(f'<span class="{elem.tag.lower()}">')
+    _write_children(elem, root, w, elem.text)
+    w("</span>")
+
+
+def _write_as_div(elem, root, w):
+    _id = elem.get("id")
+    if _id:
+        w(f'<div class="{elem.tag.lower()}"{_attr("id", shorten_id(_id))}>')
+    else:
+        w(f'<div class="{elem.tag.lower()}">')
+    _write_children(elem, root, w, elem.text, True)
+    w("</div>")
+
+
+def _write_sense(elem, root, w):
+    attrib = {"class": elem.tag.lower()}
+    if elem.find('span[@class="sensenum"]') is not None:
+        attrib["class"] += " sensewithnum"
+    if elem.get("id", None) is not None:
+        attrib["id"] = shorten_id(elem.get("id"))
+    w(_start_tag("div", attrib))
+    _write_children(elem, root, w, elem.text, True)
+    w("</div>")
+
+
+def _write_ref(elem, root, w):
+    topic = elem.get("topic")
+    if len(topic.split(".")) == 4:
+        id23 = shorten_id(topic)
+        href = "/fs/" + id23
+        if elem.get("bookmark", None) is not None:
+            href += "#" + shorten_id(elem.get("bookmark"))
+    else:
+        href = "./" + elem.get("topic")
+
+    text = elem.text
+
+    suffix = elem.find("SUFFIX")
+    if suffix is not None:
+        text += suffix.text
+
+    w(f'<a{_attr("href", href)} class="ref">')
+    _write_children(elem, root, w, text)
+    w("</a>")
+
+
+def _write_nondv(elem, root, w):
+    refhwd = elem.find("REFHWD")
+    href = "#"
+    text = ""
+    if refhwd is not None:
+        text = refhwd.text
+        href = "lookup:///?" + urlencode({"q": text.strip().encode("utf-8")})
+
+    suffix = elem.find("SUFFIX")
+    if suffix is not None:
+        text += suffix.text
+
+    w(f'<a{_attr("href", href)} class="nondv">{_text(text)}</a>')
+
+
+def _write_span(elem, root, w):
     attrib = elem.attrib
     text = elem.text
     attr_class = attrib.get("class")
     if attr_class:
-        if attr_class == "exabullet":
-            return
-        elif attr_class == "sensenum":
-            yield _E("span", attrib, (text, " "))
+        if attr_class == "sensenum":
+            w(f"{_start_tag('span', attrib)}{_text(text or '')} </span>")
         elif attr_class == "heading":
-            yield _E("div", attrib, (text,))
-        else:
-            yield _E("span", attrib, (text,))
+            w(f"{_start_tag('div', attrib)}{_text(text or '')}</div>")
+        elif attr_class != "exabullet":
+            w(f"{_start_tag('span', attrib)}{_text(text or '')}</span>")
     elif text is not None:
-        yield text
-    else:
-        return
+        w(_text(text))
 
 
-def _trans_br(elem, root):
-    yield _E("br")
+def _write_br(elem, root, w):
+    w("<br>")
 
 
-def _trans_audio(elem, root):
+def _write_audio(elem, root, w):
     topic = elem.get("topic")
     res = elem.get("resource").lower()
     path = "audio:///{0}/{1}".format(res, topic.split("/")[-1])
-    attrib = {"href": path, "class": "audio"}
     if res == "exa_pron" or res == "sfx":
-        attrib["title"] = "Play"
+        title = "Play"
         img = "static:///images/speaker_eg.png"
     elif res == "gb_hwd_pron":
-        attrib["title"] = "British"
+        title = "British"
         img = "static:///images/speaker_br.png"
     elif res == "us_hwd_pron":
-        attrib["title"] = "American"
+        title = "American"
         img = "static:///images/speaker_am.png"
     else:
-        attrib["title"] = "Not Supported"
+        title = "Not Supported"
         img = "static:///images/speaker_eg.png"
 
-    children = (_E("img", {"src": img}),)
-    yield _E("a", attrib, children)
+    w(f'<a{_attr("href", path)} class="audio" title="{title}"><img src="{img}"></a>')
 
 
-def _trans_illustration(elem, root):
+def _write_illustration(elem, root, w):
     topic = elem.get("thumb")
     filename = topic.split("/")[-1]
     path_thumb = "/picture/thumbnail/" + filename
     path_full = "/picture/fullsize/" + filename
-    attrib = {"src": path_thumb, "style": "float: right"}
-    children = (_E("img", attrib),)
-    yield _E("a", {"class": "illust", "href": path_full}, children)
+    w(
+        f'<a class="illust"{_attr("href", path_full)}>'
+        f'<img{_attr("src", path_thumb)} style="float: right"></a>'
+    )
 
 
-def _trans_skip(elem, root):
-    return ()
+def _write_skip(elem, root, w):
+    pass
 
 
-def _trans_hwd(elem, root):
+def _write_hwd(elem, root, w):
     if root.find("Head/HYPHENATION") is None:
-        hwd = elem
-        if hwd is not None:
-            yield _E("span", {"class": "hwd"}, [hwd.text])
-    return
-
-
-_TRANS_MAP = {
-    "ACTIV": _trans_skip,
-    "Audio": _trans_audio,
-    "br": _trans_br,
-    "ColloBox": _as_div,
-    "Collocate": _as_div,
-    "ColloExa": _as_div,
-    "Crossref": _as_div,
-    "Head": _as_div,
-    "Deriv": _as_div,
-    "Entry": _as_div,
-    "EXAMPLE": _as_div,
-    "EXPL": _as_span,
-    "Exponent": _as_div,
-    "F2NBox": _as_div,
-    "GramBox": _as_div,
-    "GramExa": _as_div,
-    "Hint": _as_div,
-    "HWD": _trans_hwd,
-    "ILLUSTRATION": _trans_illustration,
-    "INFLX": _trans_skip,
-    "PhrVbEntry": _as_div,
-    "NonDV": _trans_nondv,
-    "Ref": _trans_ref,
-    "RunOn": _as_div,
-    "SECHEADING": _as_div,
-    "Section": _as_div,
-    "SE_EntryAssets": _trans_skip,
-    "Sense": _trans_sense,
-    "span": _trans_span,
-    "SpokenSect": _as_div,
-    "Subsense": _trans_sense,
-    "Tail": _as_div,
-    "ThesBox": _as_div,
+        w(f'<span class="hwd">{_text(elem.text or "")}</span>')
+
+
+_WRITE_MAP = {
+    "ACTIV": _write_skip,
+    "Audio": _write_audio,
+    "br": _write_br,
+    "ColloBox": _write_as_div,
+    "Collocate": _write_as_div,
+    "ColloExa": _write_as_div,
+    "Crossref": _write_as_div,
+    "Head": _write_as_div,
+    "Deriv": _write_as_div,
+    "Entry": _write_as_div,
+    "EXAMPLE": _write_as_div,
+    "EXPL": _write_as_span,
+    "Exponent": _write_as_div,
+    "F2NBox": _write_as_div,
+    "GramBox": _write_as_div,
+    "GramExa": _write_as_div,
+    "Hint": _write_as_div,
+    "HWD": _write_hwd,
+    "ILLUSTRATION": _write_illustration,
+    "INFLX": _write_skip,
+    "PhrVbEntry": _write_as_div,
+    "NonDV": _write_nondv,
+    "Ref": _write_ref,
+    "RunOn": _write_as_div,
+    "SECHEADING": _write_as_div,
+    "Section": _write_as_div,
+    "SE_EntryAssets": _write_skip,
+    "Sense": _write_sense,
+    "span": _write_span,
+    "SpokenSect": _write_as_div,
+    "Subsense": _write_sense,
+    "Tail": _write_as_div,
+    "ThesBox": _write_as_div,
 }
-
-
-def _dispatch(elem, root):
-    """invoke a proper transformation function for a given element"""
-    f = _TRANS_MAP.get(elem.tag, _as_span)
-    return f(elem, root)
+_WRITER_KINDS = {_write_as_div: _BLOCK, _write_sense: _BLOCK, _write_skip: _NOTHING}
+_KINDS = {tag: _WRITER_KINDS.get(f, _INLINE) for tag, f in _WRITE_MAP.items()}
 
 
 def body2html(root):
     _preprocess_span(root)
-    r = []
 
-    # pass the root element to the dispatcher
-    for el in _dispatch(root, root):
-        if not isinstance(el, basestring):
-            r.append(tounicode(el, pretty_print=True, method="html"))
+    # a bare text span on its own is not an element, and makes no output
+    if root.tag == "span" and not root.get("class") and root.text is not None:
+        return ""
 
-    # replace some characters
-    body = "".join(r).translate({0x2027: 0xB7})
-    body = re.sub(r"([→►↔])", r"<span>\1</span>", body)
+    r = []
+    _WRITE_MAP.get(root.tag, _write_as_span)(root, root, r.append)
+    if r:
+        r.append("\n")
+    body = "".join(r)
     if platform.release() == "XP" and platform.system() == "Windows":
         body = re.sub(
             r"([\u02cc\u02c8\u2194])", r'<span class="winxpsym">\1</span>', body
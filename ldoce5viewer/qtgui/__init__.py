@@ -10,6 +10,7 @@ from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QLineEdit
 
 from .. import __author__
+from ..utils import trace
 from .access import register_url_schemes
 from .config import get_config
 from .utils.error import MyStreamHandler, StdErrWrapper
@@ -56,7 +57,17 @@ def run(argv):
     # Parse arguments
     optparser = OptionParser()
     optparser.set_defaults(debug=False)
-    optparser.add_option("--debug", action="store_true", help="Enable debug mode")
+    optparser.add_option(
+        "--debug",
+        action="store_true",
+        help="Enable debug mode, with tracing (Help > Performance)",
+    )
+    optparser.add_option(
+        "--page-shell",
+        action="store_true",
+        default=False,
+        help="Swap in only the body of pages when navigating between entries",
+    )
     (options, args) = optparser.parse_args(argv)
 
     # stderr wrapper
@@ -77,6 +88,8 @@ def run(argv):
 
     # Load the configuration file
     config.debug = options.debug
+    trace.enable(options.debug)
+    config.page_shell = options.page_shell
     config.load()
 
     # Set the application's information
@@ -2,18 +2,31 @@
 
 import logging
 import os.path
+import posixpath
+import re
 import sys
 import traceback
 
 from PySide6.QtCore import Q_ARG, QBuffer, QIODevice, QMetaObject, Qt, QTimer
 from PySide6.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest
-from PySide6.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler
+from PySide6.QtWebEngineCore import (
+    QWebEngineUrlRequestJob,
+    QWebEngineUrlScheme,
+    QWebEngineUrlSchemeHandler,
+)
 
 from .. import __name__ as basepkgname
 from .. import __version__
 from ..ldoce5 import LDOCE5, ArchiveError, FilemapError, NotFoundError
+from ..utils import trace
 from ..utils.text import enc_utf8
-from .advanced import search_and_render
+from .advanced import (
+    MODE_DICT,
+    parse_search_url,
+    render_empty_page,
+    search_and_render,
+    search_and_render_job,
+)
 from .config import get_config
 from .utils import fontfallback
 
@@ -21,11 +34,42 @@ from .utils import fontfallback
 logger = logging.getLogger(__name__)
 
 STATIC_REL_PATH = "static"
+BUNDLE_REL_PATH = "bundle"
+
+# Bundles change only when the fonts do, see clear_static_cache()
+_BUNDLE_HEADERS = {b"Cache-Control": b"max-age=86400"}
+
+_CSS_URL = re.compile(r"""(@import\s+)?url\(\s*(['"]?)([^'")]+)\2\s*\)(?(1)\s*;)""")
+
+_static_cache = {}  # filename -> bytes
+_bundles = {}
 
 
 def _load_static_data(filename):
-    """Load a static file from the 'static' directory"""
+    """Load a static file from the 'static' directory
+
+    Each file is read and processed once and then served from memory,
+    until clear_static_cache().
+    """
+    data = _static_cache.get(filename)
+    trace.cache_access("static.files", data is not None)
+    if data is None:
+        data = _static_cache[filename] = _read_static_data(filename)
+    return data
+
+
+def clear_static_cache():
+    """Forget the static files and bundles loaded so far
 
+    Stylesheets are cached with the font fallback applied, so this is to
+    be called when the font database changes.
+    """
+    _static_cache.clear()
+    _bundles.clear()
+    fontfallback.clear_cache()
+
+
+def _read_static_data(filename):
     is_frozen = (
         hasattr(sys, "frozen")  # new py2exe
         or getattr(sys, "_MEIPASS", None) is not None
@@ -65,6 +109,65 @@ def _load_static_data(filename):
     return data
 
 
+def _bundle_css(filename, seen):
+    """Return a stylesheet with its @imports inlined and its URLs made absolute"""
+    if filename in seen:
+        return ""
+    seen.add(filename)
+    dirname = posixpath.dirname(filename)
+
+    def replace_func(m):
+        target = m.group(3)
+        if ":" in target:
+            return m.group()
+        target = posixpath.normpath(posixpath.join(dirname, target))
+        if m.group(1):
+            return _bundle_css(target, seen)
+        return f'url("static:///{target}")'
+
+    return _CSS_URL.sub(replace_func, _load_static_data(filename).decode("utf-8"))
+
+
+def _build_bundle(name, ext):
+    resnames = name.split("+")
+    if ext == ".css":
+        seen = set()
+        files = ["scripts/colorbox/colorbox.css"]
+        files.extend(f"styles/{resname}.css" for resname in resnames)
+        return "\n".join(_bundle_css(f, seen) for f in files).encode("utf-8")
+    if ext == ".js":
+        files = [
+            "scripts/jquery.js",
+            "scripts/colorbox/jquery.colorbox.js",
+            "scripts/shell.js",
+        ]
+        files.extend(f"scripts/{resname}.js" for resname in resnames)
+        return b";\n".join(_load_static_data(f) for f in files)
+    raise OSError(f"unknown bundle: {name}{ext}")
+
+
+def _load_bundle(filename):
+    """Return the combined stylesheet or script of a page type
+
+    'entry.css' is colorbox.css and styles/entry.css (with the stylesheets
+    they import) and 'entry.js' is jQuery, colorbox, shell.js and
+    scripts/entry.js, so that a page loads two static files. Bundles are
+    built once, with the font fallback applied, and kept in memory.
+    """
+    data = _bundles.get(filename)
+    trace.cache_access("static.bundles", data is not None)
+    if data is None:
+        data = _bundles[filename] = _build_bundle(*posixpath.splitext(filename))
+    return data
+
+
+def _load_static(path):
+    """Load a static file or a bundle; path is relative to static:///"""
+    if path.startswith(BUNDLE_REL_PATH + "/"):
+        return _load_bundle(path[len(BUNDLE_REL_PATH) + 1 :])
+    return _load_static_data(path)
+
+
 class MyNetworkAccessManager(QNetworkAccessManager):
     """Customized NetworkAccessManager"""
 
@@ -121,7 +224,7 @@ class MyNetworkReply(QNetworkReply):
 
         if url.scheme() == "static":
             try:
-                self._data = _load_static_data(url.path().lstrip("/"))
+                self._data = _load_static(url.path().lstrip("/"))
             except OSError:
                 self._data = "<h2>Static File Not Found</h2>"
                 mime = "text/html"
@@ -229,18 +332,38 @@ class MyNetworkReply(QNetworkReply):
 class WebEngineUrlSchemeHandler(QWebEngineUrlSchemeHandler):
     """WebEngine URL scheme handler for dict://, static://, and search:// schemes"""
 
-    def __init__(self, parent, searcher_hp=None, searcher_de=None):
+    def __init__(self, parent, searcher_hp=None, searcher_de=None, scheduler=None):
         super(WebEngineUrlSchemeHandler, self).__init__(parent)
         self._searcher_hp = searcher_hp
         self._searcher_de = searcher_de
+        self._scheduler = None
         # Keep references to buffers to prevent them from being garbage collected
         self._active_buffers = {}
+        # search:// requests waiting for the scheduler (ticket -> job)
+        self._search_jobs = {}
+        self.set_scheduler(scheduler)
 
     def update_searchers(self, searcher_hp, searcher_de):
         """Update the searcher references"""
         self._searcher_hp = searcher_hp
         self._searcher_de = searcher_de
 
+    def set_scheduler(self, scheduler):
+        """Render search:// pages on the given async_.SearchScheduler"""
+        if self._scheduler is scheduler:
+            return
+        if self._scheduler is not None:
+            self._scheduler.finished.disconnect(self._onSearchFinished)
+            self._scheduler.failed.disconnect(self._onSearchFailed)
+            self._scheduler.cancelled.disconnect(self._onSearchCancelled)
+            self._scheduler.cancel("page")
+            self._scheduler.cancel("fragment")
+        self._scheduler = scheduler
+        if scheduler is not None:
+            scheduler.finished.connect(self._onSearchFinished)
+            scheduler.failed.connect(self._onSearchFailed)
+            scheduler.cancelled.connect(self._onSearchCancelled)
+
     def requestStarted(self, job):
         """Handle URL scheme requests"""
         url = job.requestUrl()
@@ -251,14 +374,15 @@ class WebEngineUrlSchemeHandler(QWebEngineUrlSchemeHandler):
         )
 
         try:
-            if scheme == "static":
-                self._handle_static_request(job, url)
-            elif scheme == "dict":
-                self._handle_dict_request(job, url)
-            elif scheme == "search":
-                self._handle_search_request(job, url)
-            else:
-                self._handle_error(job, f"Unknown scheme: {scheme}")
+            with trace.span("scheme." + scheme):
+                if scheme == "static":
+                    self._handle_static_request(job, url)
+                elif scheme == "dict":
+                    self._handle_dict_request(job, url)
+                elif scheme == "search":
+                    self._handle_search_request(job, url)
+                else:
+                    self._handle_error(job, f"Unknown scheme: {scheme}")
         except Exception as e:
             logger.exception("Exception in URL scheme handler: %s", str(e))
             self._handle_error(job, f"Error handling request: {str(e)}")
@@ -268,7 +392,7 @@ class WebEngineUrlSchemeHandler(QWebEngineUrlSchemeHandler):
         try:
             path = url.path().lstrip("/")
             logger.debug("Loading static file: %s", path)
-            data = _load_static_data(path)
+            data = _load_static(path)
 
             # Determine MIME type
             mime_type = "text/html"
@@ -286,7 +410,10 @@ class WebEngineUrlSchemeHandler(QWebEngineUrlSchemeHandler):
             logger.debug(
                 "Static file loaded, size: %d bytes, mime: %s", len(data), mime_type
             )
-            self._send_response(job, data, mime_type)
+            if path.startswith(BUNDLE_REL_PATH + "/"):
+                self._send_response(job, data, mime_type, _BUNDLE_HEADERS)
+            else:
+                self._send_response(job, data, mime_type)
         except Exception as e:
             logger.error("Static file error: %s", str(e))
             self._handle_error(job, f"Static file not found: {str(e)}")
@@ -326,6 +453,9 @@ class WebEngineUrlSchemeHandler(QWebEngineUrlSchemeHandler):
         """Handle search:// requests"""
         try:
             if self._searcher_hp and self._searcher_de:
+                if self._scheduler is not None:
+                    self._schedule_search(job, url)
+                    return
                 data = enc_utf8(
                     search_and_render(url, self._searcher_hp, self._searcher_de)
                 )
@@ -338,7 +468,57 @@ class WebEngineUrlSchemeHandler(QWebEngineUrlSchemeHandler):
         except Exception as e:
             self._handle_error(job, f"Search error: {str(e)}")
 
-    def _send_response(self, job, data, mime_type):
+    def _schedule_search(self, job, url):
+        """Render a search page on the worker thread of its index
+
+        A newer search page supersedes the one being rendered. The
+        fragments that search.js appends to a page as it is scrolled have
+        a channel of their own, so that a page and its next fragment do
+        not supersede each other.
+        """
+        params = parse_search_url(url)
+        mode = params[0]
+        fragment = params[4]
+        if mode not in MODE_DICT:
+            data = render_empty_page(*params)
+            self._send_response(job, data, "text/html")
+            return
+
+        name = MODE_DICT[mode]["searcher"]
+        channel = "fragment" if fragment else "page"
+        ticket = self._scheduler.submit(name, channel, search_and_render_job, *params)
+        if ticket is None:
+            self._handle_error(
+                job, "The full-text search index has not been created yet or broken."
+            )
+            return
+        self._search_jobs[ticket] = job
+
+        def forget_job(*args):
+            self._search_jobs.pop(ticket, None)
+
+        job.destroyed.connect(forget_job)
+
+    def _onSearchFinished(self, ticket, data):
+        job = self._search_jobs.pop(ticket, None)
+        if job is not None:
+            self._send_response(job, enc_utf8(data), "text/html")
+
+    def _onSearchFailed(self, ticket, message):
+        job = self._search_jobs.pop(ticket, None)
+        if job is not None:
+            self._handle_error(job, "Search error: " + message.splitlines()[-1])
+
+    def _onSearchCancelled(self, ticket):
+        job = self._search_jobs.pop(ticket, None)
+        if job is not None:
+            try:
+                job.fail(QWebEngineUrlRequestJob.RequestAborted)
+            except RuntimeError:
+                # the request has already been destroyed
+                pass
+
+    def _send_response(self, job, data, mime_type, headers=None):
         """Send successful response"""
         try:
             if isinstance(data, str):
@@ -363,6 +543,14 @@ class WebEngineUrlSchemeHandler(QWebEngineUrlSchemeHandler):
             if hasattr(job, "destroyed"):
                 job.destroyed.connect(cleanup_buffer)
 
+            headers = dict(headers or {})
+            if job.requestUrl().scheme() == "search":
+                # search.js fetches further result pages
+                headers[b"Access-Control-Allow-Origin"] = b"*"
+            if headers and hasattr(job, "setAdditionalResponseHeaders"):
+                # Qt 6.6+
+                job.setAdditionalResponseHeaders(headers)
+
             logger.debug(
                 "Sending response, data size: %d bytes, mime: %s", len(data), mime_type
             )
@@ -385,9 +573,12 @@ def register_url_schemes():
 
     for scheme_name in schemes:
         scheme = QWebEngineUrlScheme(scheme_name.encode("utf-8"))
-        scheme.setFlags(
+        flags = (
             QWebEngineUrlScheme.LocalAccessAllowed  # Allow local file access
             | QWebEngineUrlScheme.LocalScheme  # Mark as local scheme
             | QWebEngineUrlScheme.ContentSecurityPolicyIgnored  # Bypass CSP
         )
+        if scheme_name == "search":
+            flags |= QWebEngineUrlScheme.CorsEnabled  # XHR from search.js
+        scheme.setFlags(flags)
         QWebEngineUrlScheme.registerScheme(scheme)
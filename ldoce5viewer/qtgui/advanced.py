@@ -1,5 +1,6 @@
 """Advanced Search"""
 
+import itertools
 from operator import itemgetter
 
 from PySide6.QtCore import Qt, QUrl, QUrlQuery
@@ -10,6 +11,7 @@ from PySide6.QtWidgets import (
 )
 
 from ..ldoce5 import advtree
+from ..utils.cache import LRUCache, sizeof_results
 from ..utils.compat import range
 from ..utils.text import MATCH_CLOSE_TAG, MATCH_OPEN_TAG
 from .config import get_config
@@ -183,6 +185,22 @@ ADV_HEADER = """<!DOCTYPE html>
 <body>"""
 
 
+def _search_href(mode, phrase, filters, offset=0, cursor=None):
+    href = QUrl("search:///")
+    urlquery = QUrlQuery()
+    if phrase:
+        urlquery.addQueryItem("phrase", phrase)
+    if filters:
+        urlquery.addQueryItem("filters", filters)
+    urlquery.addQueryItem("mode", mode)
+    if offset:
+        urlquery.addQueryItem("offset", str(offset))
+    if cursor:
+        urlquery.addQueryItem("cursor", cursor)
+    href.setQuery(urlquery)
+    return href.toString(QUrl.FullyEncoded)
+
+
 def _render_header(title, mode, phrase, filters):
     r = []
     r.append(ADV_HEADER)
@@ -193,18 +211,10 @@ def _render_header(title, mode, phrase, filters):
     modes.sort(key=itemgetter(0))
 
     for name, spec in modes:
-        href = QUrl("search:///")
-        urlquery = QUrlQuery()
-        if phrase:
-            urlquery.addQueryItem("phrase", phrase)
-        if filters:
-            urlquery.addQueryItem("filters", filters)
-        urlquery.addQueryItem("mode", name)
-        href.setQuery(urlquery)
         if name != mode:
             r.append(
                 '<li><a href="{href}">{title}</a></li>\n'.format(
-                    href=href.toEncoded(), title=spec["title"]
+                    href=_search_href(name, phrase, filters), title=spec["title"]
                 )
             )
         else:
@@ -226,79 +236,194 @@ def _replace_tags(s):
     return MATCH_CLOSE_TAG.sub("</span>", s)
 
 
-def _render_defexa(items, mode):
+def _render_more(more_href):
+    """Render the link to the next page, which search.js follows on scroll"""
+    if not more_href:
+        return ""
+    return f'<li class="more"><a href="{more_href}">More results</a></li>\n'
+
+
+def _render_defexa_items(items, more_href=None):
+    r = []
+    for item in items:
+        (label, path, sortkey, prio, text) = item
+        r.append(
+            "<li>"
+            f'<a href="dict://{path}">'
+            f'<span class="entry">{_replace_tags(label)}</span>'
+            f' <span class="text">{text}</span>'
+            "</a>"
+            "</li>\n"
+        )
+    r.append(_render_more(more_href))
+    return "".join(r)
+
+
+def _render_defexa(items, mode, more_href=None):
     r = []
 
     if not items:
         r.append('<p class="no">No Items Found</p>\n')
     else:
         r.append(f'<ul class="result r_{mode}">\n')
-        for item in items:
-            (label, path, sortkey, prio, text) = item
-            r.append(
-                "<li>"
-                f'<a href="dict://{path}">'
-                f'<span class="entry">{_replace_tags(label)}</span>'
-                f' <span class="text">{text}</span>'
-                "</a>"
-                "</li>\n"
-            )
+        r.append(_render_defexa_items(items, more_href))
         r.append("</ul>\n")
 
     return "".join(r)
 
 
-def _render_hwdphr(items, mode):
+def _render_hwdphr_items(items, more_href=None):
+    r = []
+    for item in items:
+        (label, path, sortkey, prio, text) = item
+        r.append(f'<li><a href="dict://{path}">{_replace_tags(label)}</a></li>\n')
+    r.append(_render_more(more_href))
+    return "".join(r)
+
+
+def _render_hwdphr(items, mode, more_href=None):
     r = []
     if not items:
         r.append('<p class="no">No Items Found</p>\n')
     else:
         r.append('<ul class="excmd">\n')
         if mode in ("headwords", "phrasalverbs"):
+            # a class on <body> also applies to the pages loaded later
             r.append(
-                """<li><a href="#" onclick="$('.label_p').hide();"""
-                """$('.label_s').hide(); $(this).hide();">"""
+                """<li><a href="#" onclick="$('body').addClass('noextra');"""
+                """$(this).hide();">"""
                 """Hide extra information</a></li>"""
             )
         r.append("</ul>\n")
 
         r.append(f'<ul class="result r_{mode}">\n')
-        for item in items:
-            (label, path, sortkey, prio, text) = item
-            r.append(
-                "<li>" f'<a href="dict://{path}">{_replace_tags(label)}</a>' "</li>\n"
-            )
+        r.append(_render_hwdphr_items(items, more_href))
         r.append("</ul>\n")
 
     return "".join(r)
 
 
-def search_and_render(url, fulltext_hp, fulltext_de):
+def parse_search_url(url):
+    """Return (mode, phrase, filters, offset, fragment, cursor) of a search:// URL
+
+    offset is the index of the first result to be shown. If fragment is
+    true, only the result items are rendered (see search.js). cursor
+    refers to the results of the first page, which are held in memory.
+    """
     query = QUrlQuery(url)
-    mode = query.queryItemValue("mode")
-    phrase = query.queryItemValue("phrase")
-    filters = query.queryItemValue("filters")
+    try:
+        offset = max(0, int(query.queryItemValue("offset") or 0))
+    except ValueError:
+        offset = 0
+    return (
+        query.queryItemValue("mode"),
+        query.queryItemValue("phrase"),
+        query.queryItemValue("filters"),
+        offset,
+        bool(query.queryItemValue("fragment")),
+        query.queryItemValue("cursor") or None,
+    )
+
+
+# Results of the pages being scrolled: cursor -> (mode, phrase, filters, res)
+_cursors = LRUCache(
+    16,
+    maxbytes=64 * 1024 * 1024,
+    sizeof=lambda v: sizeof_results(v[3]),
+    name="search.cursors",
+)
+_cursor_ids = itertools.count(1)
+
+
+def _open_cursor(mode, phrase, filters, res):
+    cursor = str(next(_cursor_ids))
+    _cursors.put(cursor, (mode, phrase, filters, res))
+    return cursor
+
+
+def _fetch_cursor(cursor, mode, phrase, filters):
+    """Return the results held by a cursor, or None if it has expired"""
+    entry = _cursors.get(cursor) if cursor else None
+    if entry is None or entry[:3] != (mode, phrase, filters):
+        return None
+    return entry[3]
+
+
+def _render_page(mode, phrase, filters, offset, fragment, cursor, searcher, res):
+    if mode not in MODE_DICT:
+        r = []
+        r.append(_render_header("Advanced Search", mode, phrase, filters))
+        r.append(_render_footer())
+        return "".join(r)
+
+    spec = MODE_DICT[mode]
+    more_href = None
+    if res is not None:
+        pagesize = spec["pagesize"]
+        if offset + pagesize < len(res):
+            if cursor is None:
+                cursor = _open_cursor(mode, phrase, filters, res)
+            more_href = _search_href(mode, phrase, filters, offset + pagesize, cursor)
+        res = res[offset : offset + pagesize]
+        if spec["highlight"]:
+            # only the rows of this page are highlighted
+            res = searcher.highlight(phrase, res)
+
+    if fragment:
+        return spec["item_renderer"](res or (), more_href)
 
     r = []
+    r.append(_render_header(spec["title"], mode, phrase, filters))
+    r.append(spec["renderer"](res, mode, more_href))
+    r.append(_render_footer())
+    return "".join(r)
+
+
+def _search_args(spec, phrase, filters):
+    return dict(
+        query_str1=phrase,
+        query_str2=filters,
+        itemtypes=spec["itemtypes"],
+        highlight=spec["highlight"],
+    )
+
+
+def search_and_render(url, fulltext_hp, fulltext_de):
+    (mode, phrase, filters, offset, fragment, cursor) = parse_search_url(url)
+
+    res = None
+    searcher = None
     if mode in MODE_DICT:
         spec = MODE_DICT[mode]
         searcher = fulltext_hp if (spec["searcher"] == "hp") else fulltext_de
-        collector = searcher.make_collector(spec["limit"])
-        res = searcher.search(
-            collector,
-            query_str1=phrase,
-            query_str2=filters,
-            itemtypes=spec["itemtypes"],
-            highlight=spec["highlight"],
-        )
-        r.append(_render_header(spec["title"], mode, phrase, filters))
-        r.append(spec["renderer"](res, mode))
-        r.append(_render_footer())
-    else:
-        r.append(_render_header("Advanced Search", mode, phrase, filters))
-        r.append(_render_footer())
+        res = _fetch_cursor(cursor, mode, phrase, filters)
+        if res is None:
+            cursor = None
+            collector = searcher.make_collector(spec["limit"])
+            res = searcher.search(collector, **_search_args(spec, phrase, filters))
 
-    return "".join(r)
+    return _render_page(mode, phrase, filters, offset, fragment, cursor, searcher, res)
+
+
+def search_and_render_job(
+    job, searcher, mode, phrase, filters, offset, fragment, cursor
+):
+    """search_and_render() as a job of async_.SearchScheduler
+
+    The job must be submitted to the searcher named by the mode.
+    """
+    spec = MODE_DICT[mode]
+    res = _fetch_cursor(cursor, mode, phrase, filters)
+    if res is None:
+        cursor = None
+        collector = job.make_collector(searcher, spec["limit"])
+        res = searcher.search(collector, **_search_args(spec, phrase, filters))
+    return _render_page(mode, phrase, filters, offset, fragment, cursor, searcher, res)
+
+
+def render_empty_page(mode, phrase, filters, offset, fragment, cursor):
+    """Render a search page which does not need any search"""
+    return _render_page(mode, phrase, filters, offset, fragment, cursor, None, None)
 
 
 MODE_DICT = {
@@ -310,6 +435,8 @@ MODE_DICT = {
         limit=None,
         highlight=False,
         renderer=_render_hwdphr,
+        item_renderer=_render_hwdphr_items,
+        pagesize=300,
         prio=1,
     ),
     "phrasalverbs": dict(
@@ -320,6 +447,8 @@ MODE_DICT = {
         limit=None,
         highlight=False,
         renderer=_render_hwdphr,
+        item_renderer=_render_hwdphr_items,
+        pagesize=300,
         prio=2,
     ),
     "phrases": dict(
@@ -330,6 +459,8 @@ MODE_DICT = {
         limit=3000,
         highlight=False,
         renderer=_render_hwdphr,
+        item_renderer=_render_hwdphr_items,
+        pagesize=300,
         prio=3,
     ),
     "collocations": dict(
@@ -340,6 +471,8 @@ MODE_DICT = {
         limit=3000,
         highlight=False,
         renderer=_render_hwdphr,
+        item_renderer=_render_hwdphr_items,
+        pagesize=300,
         prio=4,
     ),
     "examples": dict(
@@ -350,6 +483,8 @@ MODE_DICT = {
         limit=3000,
         highlight=True,
         renderer=_render_defexa,
+        item_renderer=_render_defexa_items,
+        pagesize=100,
         prio=5,
     ),
     "definitions": dict(
@@ -360,6 +495,8 @@ MODE_DICT = {
         limit=3000,
         highlight=True,
         renderer=_render_defexa,
+        item_renderer=_render_defexa_items,
+        pagesize=100,
         prio=6,
     ),
 }
@@ -1,17 +1,68 @@
-"""Asynchlonous full-text search facility for phrase search"""
+"""Asynchlonous full-text search facility
 
+Full-text searches run on a small pool of worker threads, one per index.
+
+Jobs are submitted to a named channel ('incremental', 'page', ...).
+A job supersedes the pending and the running job of the same channel,
+so that only the latest query of each channel is ever completed.
+"""
+
+import itertools
 import logging
+import traceback
 
 from PySide6.QtCore import QMutex, QObject, QThread, QWaitCondition, Signal
 
+from ..fulltext import SearchAborted
+from ..utils import trace
+
 _logger = logging.getLogger(__name__)
 
 
-class _FTSearchThread(QThread):
+class SearchJob:
+    """A unit of work executed by a search worker
+
+    func is called as func(job, searcher, *args) on the worker thread.
+    It should create its collectors with job.make_collector() so that
+    they are aborted along with the job.
+    """
+
+    def __init__(self, ticket, channel, func, args):
+        self.ticket = ticket
+        self.channel = channel
+        self._func = func
+        self._args = args
+        self._aborted = False
+        self._collectors = []
+
+    @property
+    def aborted(self):
+        return self._aborted
+
+    def abort(self):
+        self._aborted = True
+        for collector in self._collectors:
+            collector.abort()
+
+    def make_collector(self, searcher, limit):
+        collector = searcher.make_collector(limit)
+        self._collectors.append(collector)
+        if self._aborted:
+            collector.abort()
+        return collector
+
+    def run(self, searcher):
+        if self._aborted:
+            raise SearchAborted
+        return self._func(self, searcher, *self._args)
+
+
+class _SearchWorker(QThread):
     """This thread performs full text search in the background"""
 
-    searchFinished = Signal()
-    searchError = Signal()
+    jobFinished = Signal(object, object)
+    jobFailed = Signal(object, str)
+    jobCancelled = Signal(object)
 
     def __init__(self, searcher, parent):
         QThread.__init__(self, parent)
@@ -19,102 +70,162 @@ class _FTSearchThread(QThread):
         self._quit = False
         self._mutex = QMutex()
         self._pending = QWaitCondition()
-        self._collector = None
-        self._query = None
-        self._result = None
+        self._jobs = {}  # channel -> SearchJob
+        self._running = None
+
+    @property
+    def searcher(self):
+        return self._searcher
 
     def run(self):
-        while not self._quit:
+        while True:
             self._mutex.lock()
-            if not self._query:
+            while not self._jobs and not self._quit:
                 self._pending.wait(self._mutex)
-            query = self._query
-            self._query = None
+            if self._quit:
+                self._mutex.unlock()
+                break
+            channel = next(iter(self._jobs))
+            job = self._jobs.pop(channel)
+            self._running = job
             self._mutex.unlock()
 
-            # search
-            if query:
-                (query_str1, query_str2, itemtypes, limit, highlight, merge) = query
+            try:
+                with trace.span("search.job." + job.channel):
+                    result = job.run(self._searcher)
+            except SearchAborted:
+                trace.count("search.jobs.aborted")
+                self.jobCancelled.emit(job.ticket)
+            except Exception:
+                trace.count("search.jobs.failed")
+                _logger.exception("full-text search failed")
+                self.jobFailed.emit(job.ticket, traceback.format_exc())
+            else:
+                if job.aborted:
+                    trace.count("search.jobs.aborted")
+                    self.jobCancelled.emit(job.ticket)
+                else:
+                    trace.count("search.jobs.finished")
+                    self.jobFinished.emit(job.ticket, result)
 
-                self._mutex.lock()
-                collector = self._searcher.make_collector(limit)
-                self._collector = collector
-                self._mutex.unlock()
+            self._mutex.lock()
+            self._running = None
+            self._mutex.unlock()
 
-                try:
-                    result = self._searcher.search(
-                        collector, query_str1, query_str2, itemtypes, highlight
-                    )
-                except:
-                    self._mutex.lock()
-                    self._result = None
-                    self._mutex.unlock()
-                    self.searchError.emit()
-                else:
-                    if collector.aborted:
-                        pass
-                    else:
-                        self._mutex.lock()
-                        self._result = (merge, result)
-                        self._mutex.unlock()
-                        self.searchFinished.emit()
-
-                self._mutex.lock()
-                self._collector = None
-                self._mutex.unlock()
+    def submit(self, job):
+        self._mutex.lock()
+        superseded = self._jobs.pop(job.channel, None)
+        self._jobs[job.channel] = job
+        running = self._running
+        if running is not None and running.channel == job.channel:
+            running.abort()
+        self._mutex.unlock()
+        self._pending.wakeAll()
+        if superseded is not None:
+            self.jobCancelled.emit(superseded.ticket)
 
-    def cancel(self):
+    def cancel(self, channel):
         self._mutex.lock()
-        self._query = None
-        if self._collector:
-            self._collector.abort()
+        cancelled = self._jobs.pop(channel, None)
+        running = self._running
+        if running is not None and running.channel == channel:
+            running.abort()
         self._mutex.unlock()
+        if cancelled is not None:
+            self.jobCancelled.emit(cancelled.ticket)
 
     def quit(self):
         self._mutex.lock()
-        if self._collector:
-            self._collector.abort()
-        self._query = None
+        cancelled = list(self._jobs.values())
+        self._jobs.clear()
+        if self._running is not None:
+            self._running.abort()
         self._quit = True
         self._mutex.unlock()
         self._pending.wakeAll()
+        for job in cancelled:
+            self.jobCancelled.emit(job.ticket)
 
-    def update_query(
-        self,
-        query_str1=None,
-        query_str2=None,
-        itemtypes=(),
-        limit=1000,
-        highlight=False,
-        merge=False,
-    ):
-        self._mutex.lock()
-        if self._collector:
-            self._collector.abort()
-        self._query = (query_str1, query_str2, itemtypes, limit, highlight, merge)
-        self._mutex.unlock()
-        self._pending.wakeAll()
 
-    def take_result(self):
-        self._mutex.lock()
-        r = self._result
-        self._result = None
-        self._mutex.unlock()
-        return r
+class SearchScheduler(QObject):
+    """Schedules full-text search jobs on one worker thread per index"""
+
+    finished = Signal(object, object)
+    failed = Signal(object, str)
+    cancelled = Signal(object)
+
+    def __init__(self, parent):
+        QObject.__init__(self, parent)
+        self._workers = {}
+        self._tickets = itertools.count(1)
+
+    def set_searcher(self, name, searcher):
+        """Register the searcher of an index (None to unregister it)"""
+        worker = self._workers.get(name, None)
+        if worker is not None:
+            if worker.searcher is searcher:
+                return
+            self._stop_worker(self._workers.pop(name))
+
+        if searcher is not None:
+            worker = _SearchWorker(searcher, self)
+            worker.jobFinished.connect(self.finished)
+            worker.jobFailed.connect(self.failed)
+            worker.jobCancelled.connect(self.cancelled)
+            worker.start()
+            self._workers[name] = worker
+
+    def has_searcher(self, name):
+        return name in self._workers
+
+    def submit(self, name, channel, func, *args):
+        """Submit a job to the worker of an index and return its ticket
+
+        Returns None if the index is not available.
+        """
+        worker = self._workers.get(name, None)
+        if worker is None:
+            return None
+        ticket = next(self._tickets)
+        worker.submit(SearchJob(ticket, channel, func, args))
+        return ticket
+
+    def cancel(self, channel):
+        for worker in self._workers.values():
+            worker.cancel(channel)
+
+    def shutdown(self):
+        for worker in self._workers.values():
+            self._stop_worker(worker)
+        self._workers.clear()
+
+    def _stop_worker(self, worker):
+        worker.quit()
+        worker.wait()
+
+
+def _search_job(job, searcher, query_str1, query_str2, itemtypes, limit, highlight):
+    collector = job.make_collector(searcher, limit)
+    return searcher.search(collector, query_str1, query_str2, itemtypes, highlight)
 
 
 class AsyncFTSearcher(QObject):
+    """Searches an index in the background for the item list"""
+
     finished = Signal()
     error = Signal()
 
-    def __init__(self, parent, searcher):
+    def __init__(self, parent, scheduler, name="hp", channel="incremental"):
         QObject.__init__(self, parent)
 
         self._result = None
-        self._thread = _FTSearchThread(searcher, self)
-        self._thread.searchFinished.connect(self._onFinished)
-        self._thread.searchError.connect(self._onError)
-        self._thread.start()
+        self._ticket = None
+        self._merge = False
+        self._name = name
+        self._channel = channel
+        self._scheduler = scheduler
+        scheduler.finished.connect(self._onFinished)
+        scheduler.failed.connect(self._onError)
 
     def update_query(
         self,
@@ -125,24 +236,36 @@ class AsyncFTSearcher(QObject):
         highlight=False,
         merge=False,
     ):
-        self._thread.update_query(
-            query_str1, query_str2, itemtypes, limit, highlight, merge
+        self._merge = merge
+        self._ticket = self._scheduler.submit(
+            self._name,
+            self._channel,
+            _search_job,
+            query_str1,
+            query_str2,
+            itemtypes,
+            limit,
+            highlight,
         )
 
     def shutdown(self):
-        self._thread.quit()
-        self._thread.wait()
-        self._thread = None
+        self.cancel()
+        self._scheduler.finished.disconnect(self._onFinished)
+        self._scheduler.failed.disconnect(self._onError)
 
     def cancel(self):
-        self._thread.cancel()
+        self._ticket = None
+        self._scheduler.cancel(self._channel)
 
-    def _onError(self):
-        self.error.emit()
+    def _onError(self, ticket, message):
+        if ticket == self._ticket:
+            self._ticket = None
+            self.error.emit()
 
-    def _onFinished(self):
-        if self._thread:
-            self._result = self._thread.take_result()
+    def _onFinished(self, ticket, result):
+        if ticket == self._ticket:
+            self._ticket = None
+            self._result = (self._merge, result)
             self.finished.emit()
 
     def take_result(self):
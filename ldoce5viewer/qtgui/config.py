@@ -26,6 +26,7 @@ def get_config():
 class __Config:
     def __init__(self, debug=False):
         self.debug = debug
+        self.page_shell = False
         self._dict = dict()
         self._prepare_dir()
         self._remove_tmps()
@@ -129,6 +130,10 @@ class __Config:
     def fulltext_hwdphr_path(self):
         return os.path.join(self._data_dir, "fulltext_hp")
 
+    @property
+    def compact_hwdphr_path(self):
+        return os.path.join(self._data_dir, "compact_hp.idx")
+
     @property
     def fulltext_defexa_path(self):
         return os.path.join(self._data_dir, "fulltext_de")
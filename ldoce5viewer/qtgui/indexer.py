@@ -17,10 +17,11 @@ from PySide6.QtCore import *
 from PySide6.QtGui import *
 from PySide6.QtWidgets import *
 
-from .. import __version__, fulltext, incremental
+from .. import __version__, compact, fulltext, incremental
 from ..ldoce5 import filemap, idmreader
 from ..ldoce5.extract import get_entry_items
 from ..utils.compat import range
+from ..utils.text import split_label, split_path
 from .config import get_config
 from .ui.indexer import Ui_Dialog
 
@@ -360,11 +361,39 @@ class IndexingThread(QThread):
 
             self._message("Done.")
 
+        def make_ranks(scan_temp, accept):
+            # the first pass over the items: the order of the results;
+            # the second pass must add the items accept() selects here
+            keys = []
+            for (
+                itemtype,
+                label,
+                path,
+                content,
+                sortkey,
+                asfilter,
+                prio,
+            ) in scan_temp.iter_items():
+                if self._abort:
+                    raise AbortIndexing()
+                if accept(itemtype[0]):
+                    keys.append((sortkey, prio))
+            return fulltext.sort_ranks(keys)
+
         def make_full_hp(scan_temp):
             self._message(
                 "Building the full text search index " "for headwords and phrases..."
             )
-            fulltext_hwdphr_maker = fulltext.Maker(get_config().fulltext_hwdphr_path)
+            fulltext_hwdphr_maker = compact.Maker(
+                get_config().compact_hwdphr_path,
+                get_config().compact_hwdphr_path + get_config().tmp_suffix,
+                get_config().variations_path,
+            )
+
+            def accept(ty):
+                return ty in ("p", "h", "a")
+
+            ranks = iter(make_ranks(scan_temp, accept))
 
             i = 0
             for (
@@ -378,20 +407,28 @@ class IndexingThread(QThread):
             ) in scan_temp.iter_items():
                 if self._abort:
                     raise AbortIndexing()
-                ty = itemtype[0]
-                if ty == "p" or ty == "h" or ty == "a":
+                if accept(itemtype[0]):
                     i += 1
                     if i % 10000 == 0:
                         self._message(f"{i} items added")
                     fulltext_hwdphr_maker.add_item(
-                        itemtype, content, asfilter, label, path, prio, sortkey
+                        itemtype,
+                        content,
+                        asfilter,
+                        label,
+                        path,
+                        prio,
+                        sortkey,
+                        next(ranks),
                     )
 
             self._message(f"{i} items were added.")
             self._message("Finalizing...")
             self._message("Please wait a while...")
-            fulltext_hwdphr_maker.commit()
-            fulltext_hwdphr_maker.close()
+            try:
+                fulltext_hwdphr_maker.commit()
+            finally:
+                fulltext_hwdphr_maker.close()
 
             self._message("Done.")
 
@@ -399,7 +436,14 @@ class IndexingThread(QThread):
             self._message(
                 "Building the full text search index " "for examples and definitions..."
             )
-            fulltext_defexa_maker = fulltext.Maker(get_config().fulltext_defexa_path)
+            fulltext_defexa_maker = fulltext.Maker(
+                get_config().fulltext_defexa_path, get_config().variations_path
+            )
+
+            def accept(ty):
+                return ty in ("d", "e")
+
+            ranks = iter(make_ranks(scan_temp, accept))
 
             i = 0
             for (
@@ -413,13 +457,19 @@ class IndexingThread(QThread):
             ) in scan_temp.iter_items():
                 if self._abort:
                     raise AbortIndexing()
-                ty = itemtype[0]
-                if ty == "d" or ty == "e":
+                if accept(itemtype[0]):
                     i += 1
                     if i % 10000 == 0:
                         self._message(f"{i} items added")
                     fulltext_defexa_maker.add_item(
-                        itemtype, content, asfilter, label, path, prio, sortkey
+                        itemtype,
+                        content,
+                        asfilter,
+                        label,
+                        path,
+                        prio,
+                        sortkey,
+                        next(ranks),
                     )
 
             self._message(f"{i} items were added.")
@@ -473,6 +523,10 @@ class IndexingThread(QThread):
         rm(config.variations_path)
         rm(config.fulltext_defexa_path)
         rm(config.fulltext_hwdphr_path)
+        rm(config.compact_hwdphr_path)
+        rm(config.compact_hwdphr_path + compact.FILTERS_SUFFIX)
+        rm(config.compact_hwdphr_path + compact.EXPANSIONS_SUFFIX)
+        rm(config.compact_hwdphr_path + compact.SPELLING_SUFFIX)
 
     def run(self):
         err = False
@@ -503,13 +557,44 @@ class IndexingThread(QThread):
 
 
 class ScanTempFile:
+    """Temporary store of the scanned items
+
+    The strings repeated across items (item types, label tails, entry
+    paths, sort keys) are kept in memory once and written by number.
+    """
+
     def __init__(self, path):
         self._path = path
         self._n = 0
         self._f = open(path, "w+b")
+        self._numbers = {}  # string -> number
+        self._strings = []
+
+    def _intern(self, s):
+        n = self._numbers.get(s)
+        if n is None:
+            n = self._numbers[s] = len(self._strings)
+            self._strings.append(s)
+        return n
 
     def append(self, item):
-        data = pickle.dumps(item)
+        (itemtype, label, path, content, sortkey, asfilter, prio) = item
+        intern = self._intern
+        (head, tail) = split_label(label)
+        (entry, fragment) = split_path(path)
+        data = pickle.dumps(
+            (
+                intern(itemtype),
+                intern(head),
+                intern(tail),
+                intern(entry),
+                fragment,
+                content,
+                intern(sortkey),
+                intern(asfilter),
+                prio,
+            )
+        )
         f = self._f
         f.write(_pack_I(len(data)))
         f.write(data)
@@ -518,10 +603,22 @@ class ScanTempFile:
     def iter_items(self):
         f = self._f
         f.seek(0)
+        strings = self._strings
         for _ in range(self._n):
             (lendata,) = _unpack_I(f.read(4))
             data = f.read(lendata)
-            yield pickle.loads(data)
+            (itemtype, head, tail, entry, fragment, content, sortkey, asfilter, prio) = (
+                pickle.loads(data)
+            )
+            yield (
+                strings[itemtype],
+                strings[head] + strings[tail],
+                strings[entry] + fragment,
+                content,
+                strings[sortkey],
+                strings[asfilter],
+                prio,
+            )
 
     def remove(self):
         self._f.close()
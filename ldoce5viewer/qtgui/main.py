@@ -1,5 +1,6 @@
 """Main window"""
 
+import json
 import logging
 import os
 import re
@@ -31,15 +32,23 @@ from PySide6.QtPrintSupport import *
 from PySide6.QtWebEngineWidgets import *
 from PySide6.QtWidgets import *
 
-from .. import fulltext, incremental
+from .. import compact, fulltext, incremental
+from ..ldoce5 import LDOCE5, ArchiveError, FilemapError, NotFoundError
 from ..ldoce5.idmreader import is_ldoce5_dir
+from ..utils import trace
 from ..utils.compat import range
 from ..utils.text import MATCH_CLOSE_TAG, MATCH_OPEN_TAG, ellipsis, normalize_index_key
-from .access import MyNetworkAccessManager, WebEngineUrlSchemeHandler, _load_static_data
+from .access import (
+    MyNetworkAccessManager,
+    WebEngineUrlSchemeHandler,
+    _load_static_data,
+    clear_static_cache,
+)
 from .advanced import AdvancedSearchDialog
-from .async_ import AsyncFTSearcher
+from .async_ import AsyncFTSearcher, SearchScheduler
 from .config import get_config
 from .indexer import IndexerDialog
+from .performance import PerformanceDialog
 from .ui.custom import LineEdit, ToolButton
 from .ui.main import Ui_MainWindow
 from .utils.soundplayer import create_soundplayer
@@ -61,8 +70,11 @@ _LAZY_INCREMENTAL = "incremental"
 _LAZY_FTS_HWDPHR = "fts_hwdphr"
 _LAZY_FTS_DEFEXA = "fts_defexa"
 _LAZY_FTS_HWDPHR_ASYNC = "fts_hwdphr_async"
+_LAZY_FTS_SCHEDULER = "fts_scheduler"
+_LAZY_LDOCE5 = "ldoce5"
 _LAZY_SOUNDPLAYER = "soundplayer"
 _LAZY_ADVSEARCH_WINDOW = "advsearch_window"
+_LAZY_PERFORMANCE_WINDOW = "performance_window"
 _LAZY_PRINTER = "printer"
 
 _IS_OSX = sys.platform.startswith("darwin")
@@ -94,6 +106,7 @@ class MainWindow(QMainWindow):
         self._selection_pending = False
         self._loading_pending = False
         self._auto_fts_phrase = None
+        self._shell_url = None  # page whose body was swapped into the view
 
         # Lazy-loaded objects
         self._lazy = {}
@@ -118,6 +131,7 @@ class MainWindow(QMainWindow):
 
         # Connect to application's aboutToQuit signal for proper cleanup
         QApplication.instance().aboutToQuit.connect(self._onAboutToQuit)
+        QApplication.instance().fontDatabaseChanged.connect(self._onFontDatabaseChanged)
 
         # Timers
         def _makeSingleShotTimer(slot):
@@ -142,12 +156,7 @@ class MainWindow(QMainWindow):
         )
 
         # Stylesheet for the item list pane
-        try:
-            self._ui.listWidgetIndex.setStyleSheet(
-                _load_static_data("styles/list.css").decode("utf-8", "ignore")
-            )
-        except OSError:
-            pass
+        self._setListStyleSheet()
 
         # Check index
         QTimer.singleShot(0, self._check_index)
@@ -166,6 +175,20 @@ class MainWindow(QMainWindow):
                 [applicationShouldHandleReopen_hasVisibleWindows_],
             )
 
+    def _setListStyleSheet(self):
+        try:
+            self._ui.listWidgetIndex.setStyleSheet(
+                _load_static_data("styles/list.css").decode("utf-8", "ignore")
+            )
+        except OSError:
+            pass
+
+    def _onFontDatabaseChanged(self):
+        # the font fallback of the cached stylesheets may have changed
+        clear_static_cache()
+        self._ui.webView.page().profile().clearHttpCache()
+        self._setListStyleSheet()
+
     def _onAboutToQuit(self):
         """Handle application quit - ensure all resources are properly cleaned up"""
         logger.debug("Application about to quit - cleaning up resources")
@@ -189,6 +212,13 @@ class MainWindow(QMainWindow):
             except:
                 pass
 
+        if _LAZY_FTS_SCHEDULER in self._lazy:
+            try:
+                self._lazy[_LAZY_FTS_SCHEDULER].shutdown()
+                logger.debug("Search workers shut down during app quit")
+            except:
+                pass
+
         logger.debug("Resource cleanup completed")
 
     def _cleanup_all_resources(self):
@@ -330,6 +360,7 @@ class MainWindow(QMainWindow):
     # Index
     # ---------
 
+    @trace.traced("ui.update_index")
     def _updateIndex(self):
         """Update the item list"""
 
@@ -397,7 +428,7 @@ class MainWindow(QMainWindow):
                     lw.setCurrentRow(row)
                     break
 
-        url = self._ui.webView.url().toString()
+        url = self._pageUrl().toString()
         sel_row = -1
         for row, path in enumerate(map(path_getter, self._found_items)):
             if "dict:" + path == url:
@@ -472,8 +503,60 @@ class MainWindow(QMainWindow):
         if 0 <= row < len(self._found_items):
             path = self._found_items[row][1]
             url = QUrl("dict://" + path)
-            if url != self._ui.webView.url():
-                self._ui.webView.load(url)
+            if url != self._pageUrl():
+                self._loadPage(url)
+
+    def _pageUrl(self):
+        """Return the URL of the page shown
+
+        It differs from webView.url() after a body swap.
+        """
+        return self._shell_url or self._ui.webView.url()
+
+    def _loadPage(self, url):
+        """Load a local page
+
+        With the page shell (--page-shell), the body of a dict:// page is
+        swapped into the page shown, which keeps its stylesheet and
+        scripts, if both pages use the same bundles. Each swap pushes an
+        entry to the navigation history; where it cannot, the page is
+        loaded instead.
+        """
+        wv = self._ui.webView
+        config = get_config()
+        if not (
+            config.page_shell and url.scheme() == "dict" and wv.url().scheme() == "dict"
+        ):
+            wv.load(url)
+            return
+
+        try:
+            (data, mime_type) = self._ldoce5.get_content(url.path())
+        except (NotFoundError, FilemapError, ArchiveError):
+            # let the scheme handler show the error page
+            wv.load(url)
+            return
+        if not (mime_type or "").startswith("text/html"):
+            wv.load(url)
+            return
+
+        def swapped(title):
+            if title is None:
+                # other bundles, or the page is not ready
+                wv.load(url)
+            elif self._shell_url == url:
+                self._autoPronPlayback()
+                self._onLoadFinished(True, title)
+
+        self._shell_url = url
+        wv.page().runJavaScript(
+            "ldoce5viewer.swap({0}, {1}, {2})".format(
+                json.dumps(data.decode("utf-8")),
+                json.dumps(url.toString()),
+                json.dumps(url.fragment()),
+            ),
+            swapped,
+        )
 
     def _onItemSelectionChanged(self):
         selitems = self._ui.listWidgetIndex.selectedItems()
@@ -484,6 +567,7 @@ class MainWindow(QMainWindow):
     # Search
     # ---------
 
+    @trace.traced("ui.instant_search")
     def _instantSearch(self, pending=False, delay=True):
         query = self._ui.lineEditSearch.text()
         self._selection_pending = pending
@@ -668,7 +752,7 @@ class MainWindow(QMainWindow):
                 self._ui.lineEditSearch.setText(q)
                 self._instantSearch(pending=True, delay=False)
         elif scheme in _LOCAL_SCHEMES:
-            self._ui.webView.load(url)
+            self._loadPage(url)
         else:
             # not a local scheme
             webbrowser.open(str(url.toEncoded()))
@@ -719,7 +803,10 @@ class MainWindow(QMainWindow):
 
         self.con.commit()
 
-    def _onLoadFinished(self, succeeded):
+    def _onLoadStarted(self):
+        self._shell_url = None
+
+    def _onLoadFinished(self, succeeded, title=None):
         if succeeded:
             word = self._ui.lineEditSearch.text().strip()
             not_empty = bool(word)
@@ -727,7 +814,7 @@ class MainWindow(QMainWindow):
                 self._save_to_sqlite(word)
             self._ui.actionSearchExamples.setEnabled(not_empty)
             self._ui.actionSearchDefinitions.setEnabled(not_empty)
-            self._updateTitle(self._ui.webView.title())
+            self._updateTitle(self._ui.webView.title() if title is None else title)
 
     def _onUrlChanged(self, url):
         # WebEngine doesn't store/restore navigation history items' metaData like WebKit
@@ -1046,6 +1133,10 @@ class MainWindow(QMainWindow):
     def _onAbout(self):
         self._ui.webView.load(QUrl("static:///documents/about.html"))
 
+    def _onPerformance(self):
+        self._performance_window.show()
+        self._performance_window.raise_()
+
     # ----------
     # Indexer
     # ----------
@@ -1252,6 +1343,7 @@ class MainWindow(QMainWindow):
         ui.listWidgetIndex.itemSelectionChanged.connect(self._onItemSelectionChanged)
         # WebEngine uses different signal names
         wv.loadStarted.connect(partial(self.setFindbarVisible, visible=False))
+        wv.loadStarted.connect(self._onLoadStarted)
         wv.wheelWithCtrl.connect(self._onWebViewWheelWithCtrl)
         wv.urlChanged.connect(self._onUrlChanged)
         wv.loadFinished.connect(self._onLoadFinished)
@@ -1283,6 +1375,14 @@ class MainWindow(QMainWindow):
             ui.actionCloseInspector, partial(self.setInspectorVisible, visible=False)
         )
 
+        # Developer tools
+        if get_config().debug:
+            ui.actionPerformance = QAction("&Performance...", self)
+            ui.actionPerformance.setShortcut(QKeySequence("Ctrl+Shift+P"))
+            ui.menuHelp.addSeparator()
+            ui.menuHelp.addAction(ui.actionPerformance)
+            act_conn(ui.actionPerformance, self._onPerformance)
+
         ui.actionGroupAutoPron = QActionGroup(self)
         ui.actionGroupAutoPron.addAction(ui.actionPronOff)
         ui.actionGroupAutoPron.addAction(ui.actionPronGB)
@@ -1410,6 +1510,13 @@ class MainWindow(QMainWindow):
         # Update URL scheme handler with new searchers
         self._url_scheme_handler.update_searchers(fulltext_hp, fulltext_de)
 
+        # Search workers
+        if fulltext_hp or fulltext_de:
+            scheduler = self._fts_scheduler
+            scheduler.set_searcher("hp", fulltext_hp)
+            scheduler.set_searcher("de", fulltext_de)
+            self._url_scheme_handler.set_scheduler(scheduler)
+
         # Keep the network access manager for compatibility
         self._networkAccessManager = nwaccess
 
@@ -1420,6 +1527,11 @@ class MainWindow(QMainWindow):
         if obj:
             obj.shutdown()
 
+        self._url_scheme_handler.set_scheduler(None)
+        obj = self._lazy.pop(_LAZY_FTS_SCHEDULER, None)
+        if obj:
+            obj.shutdown()
+
         obj = self._lazy.pop(_LAZY_FTS_HWDPHR, None)
         if obj:
             obj.close()
@@ -1432,17 +1544,27 @@ class MainWindow(QMainWindow):
         if obj:
             obj.close()
 
+        obj = self._lazy.pop(_LAZY_LDOCE5, None)
+        if obj:
+            obj.close()
+
     @property
     def _fts_hwdphr(self):
         obj = self._lazy.get(_LAZY_FTS_HWDPHR, None)
         if obj is None:
             config = get_config()
             try:
-                obj = self._lazy[_LAZY_FTS_HWDPHR] = fulltext.Searcher(
-                    config.fulltext_hwdphr_path, config.variations_path
+                obj = self._lazy[_LAZY_FTS_HWDPHR] = compact.Searcher(
+                    config.compact_hwdphr_path, config.variations_path
                 )
-            except (OSError, fulltext.IndexError):
-                pass
+            except (OSError, compact.IndexError):
+                # the whoosh index made by an older version
+                try:
+                    obj = self._lazy[_LAZY_FTS_HWDPHR] = fulltext.Searcher(
+                        config.fulltext_hwdphr_path, config.variations_path
+                    )
+                except (OSError, fulltext.IndexError):
+                    pass
             self._updateNetworkAccessManager(
                 self._lazy.get(_LAZY_FTS_HWDPHR, None),
                 self._lazy.get(_LAZY_FTS_DEFEXA, None),
@@ -1468,6 +1590,14 @@ class MainWindow(QMainWindow):
 
         return obj
 
+    @property
+    def _fts_scheduler(self):
+        obj = self._lazy.get(_LAZY_FTS_SCHEDULER, None)
+        if obj is None:
+            obj = self._lazy[_LAZY_FTS_SCHEDULER] = SearchScheduler(self)
+
+        return obj
+
     @property
     def _fts_hwdphr_async(self):
         obj = self._lazy.get(_LAZY_FTS_HWDPHR_ASYNC, None)
@@ -1475,7 +1605,7 @@ class MainWindow(QMainWindow):
             searcher = self._fts_hwdphr
             if searcher:
                 obj = self._lazy[_LAZY_FTS_HWDPHR_ASYNC] = AsyncFTSearcher(
-                    self, searcher
+                    self, self._fts_scheduler
                 )
                 obj.finished.connect(self._onAsyncFTSearchFinished)
                 obj.error.connect(self._onAsyncFTSearchError)
@@ -1495,6 +1625,18 @@ class MainWindow(QMainWindow):
 
         return obj
 
+    @property
+    def _ldoce5(self):
+        """The reader of the page shell, kept open"""
+        obj = self._lazy.get(_LAZY_LDOCE5, None)
+        if obj is None:
+            config = get_config()
+            obj = self._lazy[_LAZY_LDOCE5] = LDOCE5(
+                config.get("dataDir", ""), config.filemap_path, keep_open=True
+            )
+
+        return obj
+
     @property
     def _soundplayer(self):
         obj = self._lazy.get(_LAZY_SOUNDPLAYER, None)
@@ -1513,6 +1655,14 @@ class MainWindow(QMainWindow):
 
         return obj
 
+    @property
+    def _performance_window(self):
+        obj = self._lazy.get(_LAZY_PERFORMANCE_WINDOW, None)
+        if obj is None:
+            obj = self._lazy[_LAZY_PERFORMANCE_WINDOW] = PerformanceDialog(self)
+
+        return obj
+
     @property
     def _printer(self):
         obj = self._lazy.get(_LAZY_PRINTER, None)
@@ -0,0 +1,144 @@
+"""Developer dialog showing the spans, caches and counters traced"""
+
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtWidgets import (
+    QDialog,
+    QDialogButtonBox,
+    QFileDialog,
+    QLabel,
+    QMessageBox,
+    QTabWidget,
+    QTreeWidget,
+    QTreeWidgetItem,
+    QVBoxLayout,
+)
+
+from ..utils import trace
+
+_REFRESH_INTERVAL = 1000  # ms
+
+_SPAN_COLUMNS = ("Span", "Count", "Total ms", "Mean ms", "p50 ms", "p95 ms", "Max ms")
+_CACHE_COLUMNS = ("Cache", "Hits", "Misses", "Hit rate")
+_COUNTER_COLUMNS = ("Counter", "Count")
+
+
+def _make_tree(parent, columns):
+    tree = QTreeWidget(parent)
+    tree.setRootIsDecorated(False)
+    tree.setAlternatingRowColors(True)
+    tree.setHeaderLabels(columns)
+    return tree
+
+
+def _fill(tree, rows):
+    tree.clear()
+    for row in rows:
+        item = QTreeWidgetItem(tree, row)
+        for column in range(1, len(row)):
+            item.setTextAlignment(column, Qt.AlignRight | Qt.AlignVCenter)
+    for column in range(tree.columnCount()):
+        tree.resizeColumnToContents(column)
+
+
+class PerformanceDialog(QDialog):
+    """Shows what trace has recorded, refreshed while visible
+
+    Available with --debug, which enables the tracing.
+    """
+
+    def __init__(self, parent):
+        super(PerformanceDialog, self).__init__(parent)
+        self.setWindowTitle("Performance")
+        self.resize(720, 480)
+
+        self._label = QLabel(self)
+        tabs = QTabWidget(self)
+        self._spans = _make_tree(tabs, _SPAN_COLUMNS)
+        self._caches = _make_tree(tabs, _CACHE_COLUMNS)
+        self._counters = _make_tree(tabs, _COUNTER_COLUMNS)
+        tabs.addTab(self._spans, "Spans")
+        tabs.addTab(self._caches, "Caches")
+        tabs.addTab(self._counters, "Counters")
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Close, self)
+        buttons.addButton("Reset", QDialogButtonBox.ResetRole).clicked.connect(
+            self._onReset
+        )
+        buttons.addButton("Save JSON...", QDialogButtonBox.ActionRole).clicked.connect(
+            self._onSave
+        )
+        buttons.rejected.connect(self.reject)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self._label)
+        layout.addWidget(tabs)
+        layout.addWidget(buttons)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(_REFRESH_INTERVAL)
+        self._timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self._timer.start()
+        super(PerformanceDialog, self).showEvent(event)
+
+    def hideEvent(self, event):
+        self._timer.stop()
+        super(PerformanceDialog, self).hideEvent(event)
+
+    def refresh(self):
+        snapshot = trace.snapshot()
+        if snapshot["enabled"]:
+            self._label.setText(
+                "Recorded over the last {0:.0f} s".format(snapshot["elapsed"])
+            )
+        else:
+            self._label.setText("Tracing is disabled; run with --debug to enable it")
+
+        # the stages taking the most time first
+        spans = sorted(snapshot["spans"].items(), key=lambda x: -x[1]["total_ms"])
+        _fill(
+            self._spans,
+            [
+                [name, str(s["count"])]
+                + [
+                    f"{s[key]:.2f}"
+                    for key in ("total_ms", "mean_ms", "p50_ms", "p95_ms", "max_ms")
+                ]
+                for (name, s) in spans
+            ],
+        )
+        _fill(
+            self._caches,
+            [
+                [
+                    name,
+                    str(c["hits"]),
+                    str(c["misses"]),
+                    "" if c["hit_rate"] is None else f"{c['hit_rate']:.1%}",
+                ]
+                for (name, c) in sorted(snapshot["caches"].items())
+            ],
+        )
+        _fill(
+            self._counters,
+            [[name, str(n)] for (name, n) in sorted(snapshot["counters"].items())],
+        )
+
+    def _onReset(self):
+        trace.reset()
+        self.refresh()
+
+    def _onSave(self):
+        filename = QFileDialog.getSaveFileName(
+            self, "Save JSON", "ldoce5viewer-trace.json", "JSON Files (*.json)"
+        )
+        if type(filename) is tuple:
+            filename = filename[0]
+
+        if filename != "":
+            try:
+                trace.dump(filename)
+            except OSError as e:
+                QMessageBox.warning(self, "Save JSON", str(e))
@@ -9,10 +9,27 @@ from PySide6.QtGui import QFont
 
 _DEFAULT_FONT_NAMES = frozenset((b"sans-serif", b"serif", b"monospace"))
 
+_available = {}  # font family -> whether it is installed
+
+
+def _is_available(name):
+    r = _available.get(name)
+    if r is None:
+        r = _available[name] = name in _DEFAULT_FONT_NAMES or QFont(name).exactMatch()
+    return r
+
+
+def clear_cache():
+    """Forget the font families resolved so far
+
+    To be called when the font database changes.
+    """
+    _available.clear()
+
 
 def _fallback(fontnames):
     for name in fontnames:
-        if name in _DEFAULT_FONT_NAMES or QFont(name).exactMatch():
+        if _is_available(name):
             return name
     return "serif"
 
@@ -0,0 +1,339 @@
+"""Local HTTP/JSON lookup server
+
+Serves lookups to editors and scripts without the GUI:
+
+    ldoce5viewer-server [options] LDOCE5_DIR INDEX_DIR
+
+INDEX_DIR is the directory where the viewer keeps its indexes
+(incremental.db, compact_hp.idx or fulltext_hp, fulltext_de,
+variations.cdb and filemap.cdb). Requests (GET or HEAD):
+
+    /incremental?q=KEY[&limit=N]
+        incremental search: JSON list of {label, path, plain}
+    /search?q=QUERY[&filters=F][&index=hp|de][&itemtypes=hm,hp][&limit=N]
+        full-text search: JSON list of {label, path, sortkey, prio}
+    /correct?q=WORD[&limit=N]
+        spelling correction: JSON list of words
+    /dict/ARCHIVE/NAME
+        the content of dict:///ARCHIVE/NAME (HTML, image or audio)
+    /trace
+        with --debug, the spans, caches and counters traced in the
+        server process (searches; not the rendering workers)
+
+Errors are JSON objects {"error": message}. The indexes and the
+archives are opened once. Incremental searches are answered on the
+event loop, as they take only a few lookups in a memory-mapped file
+(the incremental searcher seeks in it, so no other thread uses it).
+Full-text searches and corrections run on a thread pool: the compact
+searcher is thread-safe, and the whoosh one opens a searcher per
+thread. Pages are rendered on a process pool, whose workers each keep
+the archives open.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import os.path
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from optparse import OptionParser
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from . import compact, fulltext, incremental
+from .ldoce5 import LDOCE5, ArchiveError, FilemapError, NotFoundError
+from .utils import trace
+
+logger = logging.getLogger(__name__)
+
+_JSON = "application/json; charset=utf-8"
+_MAX_HEAD = 1 << 16  # bytes of a request line and its headers
+_INCREMENTAL_LIMIT = 500
+_SEARCH_LIMIT = 100
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+# worker process state, see _init_worker()
+_ldoce5 = None
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def _init_worker(data_dir, filemap_path):
+    global _ldoce5
+    _ldoce5 = LDOCE5(data_dir, filemap_path, keep_open=True)
+
+
+def _get_content(path):
+    return _ldoce5.get_content(path)
+
+
+def _search(searcher, query_str1, query_str2, itemtypes, limit):
+    collector = searcher.make_collector(limit)
+    results = searcher.search(
+        collector, query_str1=query_str1, query_str2=query_str2, itemtypes=itemtypes
+    )
+    return [
+        {"label": label, "path": path, "sortkey": sortkey, "prio": prio}
+        for (label, path, sortkey, prio, text) in results
+    ]
+
+
+def _int_param(params, name, default, maximum):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise HTTPError(400, f"invalid {name}")
+    return max(1, min(value, maximum))
+
+
+def _unavailable(name):
+    return HTTPError(503, f"The {name} index has not been created yet or broken.")
+
+
+class LookupServer:
+    """Answers the requests with long-lived searchers and worker pools"""
+
+    def __init__(self, data_dir, index_dir, jobs=None):
+        var_path = os.path.join(index_dir, "variations.cdb")
+        self._incremental = None
+        self._fts_hwdphr = None
+        self._fts_defexa = None
+
+        try:
+            self._incremental = incremental.Searcher(
+                os.path.join(index_dir, "incremental.db")
+            )
+        except (OSError, incremental.IndexError):
+            pass
+        try:
+            self._fts_hwdphr = compact.Searcher(
+                os.path.join(index_dir, "compact_hp.idx"), var_path
+            )
+        except (OSError, compact.IndexError):
+            # the whoosh index made by an older version
+            try:
+                self._fts_hwdphr = fulltext.Searcher(
+                    os.path.join(index_dir, "fulltext_hp"), var_path
+                )
+            except (OSError, fulltext.IndexError):
+                pass
+        try:
+            self._fts_defexa = fulltext.Searcher(
+                os.path.join(index_dir, "fulltext_de"), var_path
+            )
+        except (OSError, fulltext.IndexError):
+            pass
+
+        self._search_pool = ThreadPoolExecutor(jobs)
+        self._render_pool = ProcessPoolExecutor(
+            jobs,
+            initializer=_init_worker,
+            initargs=(data_dir, os.path.join(index_dir, "filemap.cdb")),
+        )
+
+    def close(self):
+        self._render_pool.shutdown(cancel_futures=True)
+        self._search_pool.shutdown(cancel_futures=True)
+        for searcher in (self._incremental, self._fts_hwdphr, self._fts_defexa):
+            if searcher is not None:
+                searcher.close()
+        self._incremental = self._fts_hwdphr = self._fts_defexa = None
+
+    # Requests
+
+    def _incremental_search(self, params):
+        if self._incremental is None:
+            raise _unavailable("incremental search")
+        limit = _int_param(params, "limit", _INCREMENTAL_LIMIT, _INCREMENTAL_LIMIT)
+        return [
+            {"label": label, "path": path, "plain": plain}
+            for (label, path, plain, prio, x) in self._incremental.search(
+                params.get("q", ""), limit
+            )
+        ]
+
+    async def _full_text_search(self, params):
+        index = params.get("index", "hp")
+        if index not in ("hp", "de"):
+            raise HTTPError(400, "index must be hp or de")
+        searcher = self._fts_hwdphr if index == "hp" else self._fts_defexa
+        if searcher is None:
+            raise _unavailable("full-text search")
+        itemtypes = tuple(t for t in params.get("itemtypes", "").split(",") if t)
+        limit = _int_param(params, "limit", _SEARCH_LIMIT, 10000)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._search_pool,
+            _search,
+            searcher,
+            params.get("q") or None,
+            params.get("filters") or None,
+            itemtypes,
+            limit,
+        )
+
+    async def _correct(self, params):
+        if self._fts_hwdphr is None:
+            raise _unavailable("full-text search")
+        limit = _int_param(params, "limit", 5, 100)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._search_pool, self._fts_hwdphr.correct, params.get("q", ""), limit
+        )
+
+    async def _content(self, path):
+        try:
+            (data, mime_type) = await asyncio.get_running_loop().run_in_executor(
+                self._render_pool, _get_content, path
+            )
+        except NotFoundError:
+            raise HTTPError(404, "Content Not Found")
+        except FilemapError:
+            raise HTTPError(503, "File-Location Map Not Available")
+        except ArchiveError:
+            raise HTTPError(503, "Dictionary Data Not Available")
+        if data is None:
+            raise HTTPError(404, "Content Not Found")
+        return (data, mime_type or "application/octet-stream")
+
+    async def respond(self, method, target):
+        """Return (status, content type, body) for a request"""
+        try:
+            if method not in ("GET", "HEAD"):
+                raise HTTPError(405, "only GET and HEAD are supported")
+            url = urlsplit(target)
+            path = unquote(url.path)
+            params = dict(parse_qsl(url.query))
+
+            if path.startswith("/dict/"):
+                (data, mime_type) = await self._content(path[len("/dict") :])
+                return (200, mime_type, data)
+
+            if path == "/incremental":
+                result = self._incremental_search(params)
+            elif path == "/search":
+                result = await self._full_text_search(params)
+            elif path == "/correct":
+                result = await self._correct(params)
+            elif path == "/trace" and trace.enabled:
+                result = trace.snapshot()
+            else:
+                raise HTTPError(404, "Not Found")
+            return (200, _JSON, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+
+        except HTTPError as e:
+            (status, message) = (e.status, str(e))
+        except Exception as e:
+            logger.exception("Error handling %s", target)
+            (status, message) = (500, f"{type(e).__name__}: {e}")
+        return (status, _JSON, json.dumps({"error": message}).encode("utf-8"))
+
+    # HTTP/1.1 with keep-alive
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    (method, target, version) = lines[0].split(" ", 2)
+                except ValueError:
+                    writer.write(_head(400, _JSON, 0, False))
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    (name, sep, value) = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" or (
+                    version == "HTTP/1.1" and connection != "close"
+                )
+                # requests have no use for a body, but one must be skipped
+                length = headers.get("content-length", "0")
+                if not length.isdigit():
+                    writer.write(_head(400, _JSON, 0, False))
+                    break
+                if int(length):
+                    await reader.readexactly(int(length))
+
+                (status, content_type, body) = await self.respond(method, target)
+                writer.write(_head(status, content_type, len(body), keep_alive))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host, port):
+        server = await asyncio.start_server(
+            self._serve, host, port, limit=_MAX_HEAD, backlog=1024
+        )
+        for sock in server.sockets:
+            (addr, port) = sock.getsockname()[:2]
+            print(f"Serving on http://{addr}:{port}/", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def _head(status, content_type, length, keep_alive):
+    return (
+        f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {length}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    ).encode("latin-1")
+
+
+def run(argv=None):
+    if argv is None:
+        argv = sys.argv
+
+    optparser = OptionParser(usage="%prog [options] LDOCE5_DIR INDEX_DIR")
+    optparser.add_option("--host", default="127.0.0.1")
+    optparser.add_option("--port", type="int", default=8750)
+    optparser.add_option(
+        "-j",
+        "--jobs",
+        type="int",
+        default=os.cpu_count(),
+        help="Number of search threads and render processes (default: one per CPU)",
+    )
+    optparser.add_option("--debug", action="store_true", default=False)
+    (options, args) = optparser.parse_args(argv[1:])
+    if len(args) != 2:
+        optparser.error("LDOCE5_DIR and INDEX_DIR are required")
+    (data_dir, index_dir) = args
+
+    logging.basicConfig(level=logging.DEBUG if options.debug else logging.ERROR)
+    trace.enable(options.debug)
+    server = LookupServer(data_dir, index_dir, options.jobs)
+    try:
+        asyncio.run(server.serve_forever(options.host, options.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
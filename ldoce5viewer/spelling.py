@@ -0,0 +1,149 @@
+"""Spelling correction with a deletion neighbourhood index
+
+The index is a CDB file holding the words of a full-text index with
+their document frequencies, and, for each string made by deleting at
+most two characters from (the first few characters of) a word, the
+numbers of the words that produce it. Deleting up to two characters
+from a misspelled word and looking the results up finds the candidate
+words within an edit distance of two (two substitutions need two
+deletions on both sides), which are then checked by their edit
+distance.
+"""
+
+from struct import Struct
+
+from .utils.cdb import CDBError, CDBMaker, CDBReader
+from .utils.compat import range
+from .utils.text import dec_utf8, enc_utf8, normalize_token
+
+# Only the first characters of words are used for the neighbourhood
+_PREFIX_LENGTH = 7
+
+# The largest edit distance of the suggestions
+_MAX_DISTANCE = 2
+
+_struct_I = Struct(b"<I")
+_pack_I = _struct_I.pack
+_unpack_I = _struct_I.unpack_from
+
+# Key prefixes
+_COUNT = b""
+_WORD = b"w"
+_DELETE = b"d"
+
+
+class IndexError(Exception):
+    pass
+
+
+def _deletes(word, n):
+    """Return the strings made by deleting at most n characters of word"""
+    r = {word}
+    edge = {word}
+    for _ in range(n):
+        edge = {w[:i] + w[i + 1 :] for w in edge for i in range(len(w))}
+        r.update(edge)
+    return r
+
+
+def edit_distance(a, b, maxdist):
+    """Levenshtein distance of a and b, or maxdist + 1 if it exceeds maxdist"""
+    if abs(len(a) - len(b)) > maxdist:
+        return maxdist + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > maxdist:
+            return maxdist + 1
+        prev = cur
+    return prev[-1]
+
+
+class Maker:
+    def __init__(self, path):
+        self._path = path
+        self._words = {}  # word -> frequency
+
+    def add_word(self, word, frequency):
+        self._words[word] = self._words.get(word, 0) + frequency
+
+    def commit(self):
+        words = sorted(self._words)
+        neighbours = {}
+        for i, word in enumerate(words):
+            for d in _deletes(word[:_PREFIX_LENGTH], _MAX_DISTANCE):
+                neighbours.setdefault(d, []).append(i)
+
+        with open(self._path, "wb") as f:
+            writer = CDBMaker(f)
+            writer.add(_COUNT, _pack_I(len(words)))
+            for i, word in enumerate(words):
+                writer.add(
+                    _WORD + _pack_I(i), _pack_I(self._words[word]) + enc_utf8(word)
+                )
+            for d in sorted(neighbours):
+                writer.add(
+                    _DELETE + enc_utf8(d), b"".join(_pack_I(i) for i in neighbours[d])
+                )
+            writer.finalize()
+
+
+class Corrector:
+    """Suggests the indexed words close to a misspelled word"""
+
+    def __init__(self, path):
+        self._reader = None
+        try:
+            self._reader = CDBReader(path)
+            self._reader[_COUNT]
+        except (OSError, ValueError, KeyError, CDBError):
+            raise IndexError
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+    def close(self):
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+
+    def _word(self, i):
+        data = self._reader[_WORD + _pack_I(i)]
+        return (dec_utf8(data[4:]), _unpack_I(data)[0])
+
+    def suggest(self, misspelled, limit=5, maxdist=_MAX_DISTANCE):
+        """Return up to limit (word, score) pairs, best first
+
+        The suggestions are ordered by edit distance, then by the number
+        of documents containing the word. Higher scores are better: the
+        integral part is maxdist minus the distance, and the fractional
+        part grows with the frequency. The misspelled word itself is not
+        suggested. maxdist is at most _MAX_DISTANCE.
+        """
+        misspelled = normalize_token(misspelled.strip().lower())
+        if not misspelled:
+            return []
+        reader = self._reader
+        candidates = set()
+        maxdist = min(maxdist, _MAX_DISTANCE)
+        for d in _deletes(misspelled[:_PREFIX_LENGTH], maxdist):
+            data = reader.get(_DELETE + enc_utf8(d))
+            if data:
+                candidates.update(i for (i,) in _struct_I.iter_unpack(data))
+
+        suggestions = []
+        for i in candidates:
+            (word, freq) = self._word(i)
+            if word == misspelled:
+                continue
+            dist = edit_distance(misspelled, word, maxdist)
+            if dist <= maxdist:
+                score = maxdist - dist + freq / (freq + 1.0)
+                suggestions.append((-score, word))
+        suggestions.sort()
+        return [(word, -negscore) for (negscore, word) in suggestions[:limit]]
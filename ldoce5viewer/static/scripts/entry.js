@@ -1,4 +1,4 @@
-$(function(){
+ldoce5viewer.ready(function(){
     $("a.illust").colorbox({
         transition: 'none',
         opacity: 0.75,
@@ -0,0 +1,31 @@
+$(function(){
+    // Load the next page of results when the "more" link comes into view
+    var loading = false;
+
+    function loadMore() {
+        // a link whose fetch failed is left to be followed by hand
+        var more = $("li.more a").not(".failed");
+        if (loading || !more.length) {
+            return;
+        }
+        if ($(window).scrollTop() + $(window).height() <
+                more.offset().top - $(window).height()) {
+            return;
+        }
+        loading = true;
+        $.get(more.attr("href") + "&fragment=1", null, null, "html")
+            .done(function(data){
+                more.parent().replaceWith(data);
+            })
+            .fail(function(){
+                more.addClass("failed");
+            })
+            .always(function(){
+                loading = false;
+            })
+            .done(loadMore);
+    }
+
+    $(window).on("scroll resize", loadMore);
+    loadMore();
+})
@@ -0,0 +1,67 @@
+// Persistent page shell
+//
+// ldoce5viewer.swap() replaces the body of the page with the one of
+// another page that uses the same bundles, so that the stylesheet and
+// the scripts are not loaded and evaluated again. Page scripts register
+// their initialization with ldoce5viewer.ready() to have it run again
+// on the new body.
+//
+// Each swap pushes a history entry for the new page. Going back or
+// forward to an entry of another page than the one shown loads it.
+var ldoce5viewer = (function(){
+    var handlers = [];
+    var shown = pageOf(location.href);
+
+    function pageOf(href){
+        return href.split("#")[0];
+    }
+
+    function bundleOf(doc){
+        var link = doc.querySelector('link[href^="static:///bundle/"]');
+        return link ? link.getAttribute("href") : null;
+    }
+
+    function ready(fn){
+        handlers.push(fn);
+        $(fn);
+    }
+
+    // Returns the title of the new page, or null if it uses other bundles
+    // or cannot be recorded in the history
+    function swap(html, href, fragment){
+        var doc = new DOMParser().parseFromString(html, "text/html");
+        var bundle = bundleOf(doc);
+        if (bundle === null || bundle !== bundleOf(document)) {
+            return null;
+        }
+        try {
+            history.pushState(null, "", href);
+        } catch (e) {
+            return null;
+        }
+        shown = pageOf(href);
+
+        $.colorbox.remove();
+        $("head meta[name]").remove();
+        $("head").prepend($(doc.head).children("meta[name]"));
+        document.title = doc.title;
+        document.body.replaceWith(document.adoptNode(doc.body));
+        $.each(handlers, function(i, fn){ fn(); });
+
+        var target = fragment ? document.getElementById(fragment) : null;
+        if (target) {
+            target.scrollIntoView();
+        } else {
+            window.scrollTo(0, 0);
+        }
+        return document.title;
+    }
+
+    window.addEventListener("popstate", function(){
+        if (pageOf(location.href) !== shown) {
+            location.reload();
+        }
+    });
+
+    return {ready: ready, swap: swap};
+})();
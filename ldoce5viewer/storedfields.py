@@ -0,0 +1,206 @@
+"""Stored fields of the documents of a full-text index
+
+The (label, path, prio, sortkey, content) of each document is kept in a
+memory-mapped file beside the whoosh index, rather than pickled in it:
+
+    header
+    document records  num_docs x fixed-width record of string numbers
+    string offsets    (num_strings + 1) x uint32, into the string pool
+    content offsets   (num_docs + 1) x uint32, into the content blob
+    string pool       distinct strings, each stored once
+    content blob      contents, in document order
+
+Labels and paths are split by utils.text.split_label() and
+split_path(), as in the incremental index, so that the label tails and
+entries shared by the items of an entry are stored once. Each field is
+decoded only when it is asked for.
+
+Version 1 files, which split labels only at " &mdash; " and stored the
+tail without it, can still be read.
+"""
+
+import mmap
+import os
+from struct import Struct
+
+from .utils.text import (
+    dec_utf8,
+    enc_utf8,
+    normalize_index_key,
+    split_label,
+    split_path,
+)
+
+_MAGIC = 0x53544644
+_DB_VERSION = 2
+_DB_VERSION_MDASH = 1
+
+_struct_header = Struct(b"<8I")
+# label head, label tail, path entry, path fragment, sortkey, prio
+_struct_record = Struct(b"<5IH")
+_pack_record = _struct_record.pack
+_unpack_record = _struct_record.unpack_from
+_struct_I = Struct(b"<I")
+_pack_I = _struct_I.pack
+_struct_II = Struct(b"<II")
+_unpack_II = _struct_II.unpack_from
+
+# version 1 splits labels at _LABEL_SEP, and _NO_TAIL stands for no tail
+_LABEL_SEP = " &mdash; "
+_NO_TAIL = 0xFFFFFFFF
+
+
+class IndexError(Exception):
+    pass
+
+
+class Maker:
+    """Writes the stored fields of documents added in document order"""
+
+    def __init__(self, path, tmp_path):
+        self._path = path
+        self._tmp_path = tmp_path
+        self._tmpf = open(tmp_path, "w+b")  # content blob
+        self._strings = {}  # string -> number
+        self._records = []
+        self._content_offsets = [0]
+
+    def _intern(self, s):
+        strings = self._strings
+        n = strings.get(s)
+        if n is None:
+            n = strings[s] = len(strings)
+        return n
+
+    def add(self, label, path, prio, sortkey, content):
+        intern = self._intern
+        (head, tail) = split_label(label)
+        (entry, fragment) = split_path(path)
+        self._records.append(
+            _pack_record(
+                intern(head),
+                intern(tail),
+                intern(entry),
+                intern(fragment),
+                intern(normalize_index_key(sortkey)),
+                prio,
+            )
+        )
+        data = enc_utf8(content)
+        self._tmpf.write(data)
+        self._content_offsets.append(self._content_offsets[-1] + len(data))
+
+    def commit(self):
+        strings = [enc_utf8(s) for s in self._strings]  # in order of numbering
+        string_offsets = [0]
+        for s in strings:
+            string_offsets.append(string_offsets[-1] + len(s))
+
+        num_docs = len(self._records)
+        num_strings = len(strings)
+        p_records = _struct_header.size
+        p_string_offsets = p_records + _struct_record.size * num_docs
+        p_content_offsets = p_string_offsets + 4 * (num_strings + 1)
+        p_strings = p_content_offsets + 4 * (num_docs + 1)
+        p_contents = p_strings + string_offsets[-1]
+
+        tmpf = self._tmpf
+        tmpf.seek(0)
+        with open(self._path, "wb") as f:
+            write = f.write
+            write(
+                _struct_header.pack(
+                    _MAGIC,
+                    _DB_VERSION,
+                    num_docs,
+                    num_strings,
+                    p_string_offsets,
+                    p_content_offsets,
+                    p_strings,
+                    p_contents,
+                )
+            )
+            write(b"".join(self._records))
+            write(b"".join(_pack_I(x) for x in string_offsets))
+            write(b"".join(_pack_I(x) for x in self._content_offsets))
+            write(b"".join(strings))
+            while True:
+                data = tmpf.read(1 << 20)
+                if not data:
+                    break
+                write(data)
+
+    def close(self):
+        if self._tmpf:
+            self._tmpf.close()
+            self._tmpf = None
+            os.remove(self._tmp_path)
+
+
+class Reader:
+    def __init__(self, path):
+        self._mm = None
+        try:
+            with open(path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise IndexError("broken")
+
+        mm = self._mm
+        if len(mm) < _struct_header.size:
+            raise IndexError("too small")
+        (
+            magic,
+            version,
+            self.num_docs,
+            self._num_strings,
+            self._p_string_offsets,
+            self._p_content_offsets,
+            self._p_strings,
+            self._p_contents,
+        ) = _struct_header.unpack_from(mm)
+        if magic != _MAGIC:
+            raise IndexError("broken")
+        if version not in (_DB_VERSION, _DB_VERSION_MDASH):
+            raise IndexError("cannot use this version of index")
+        self._version = version
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+    def close(self):
+        if self._mm:
+            self._mm.close()
+            self._mm = None
+
+    def _string(self, n):
+        (a, b) = _unpack_II(self._mm, self._p_string_offsets + 4 * n)
+        p = self._p_strings
+        return dec_utf8(self._mm[p + a : p + b])
+
+    def _record(self, docnum):
+        return _unpack_record(
+            self._mm, _struct_header.size + _struct_record.size * docnum
+        )
+
+    def sortkey(self, docnum):
+        return self._string(self._record(docnum)[4])
+
+    def data(self, docnum):
+        """Return (label, path, prio, sortkey) of a document"""
+        (head, tail, entry, fragment, sortkey, prio) = self._record(docnum)
+        string = self._string
+        label = string(head)
+        if self._version == _DB_VERSION:
+            label += string(tail)
+        elif tail != _NO_TAIL:
+            label += _LABEL_SEP + string(tail)
+        return (label, string(entry) + string(fragment), prio, string(sortkey))
+
+    def content(self, docnum):
+        (a, b) = _unpack_II(self._mm, self._p_content_offsets + 4 * docnum)
+        p = self._p_contents
+        return dec_utf8(self._mm[p + a : p + b])
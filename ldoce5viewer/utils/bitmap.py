@@ -0,0 +1,170 @@
+"""Compressed bitmaps of document numbers
+
+Bitmaps are serialized roaring-style: the numbers are split into chunks
+of 65536 by their upper bits, and each chunk is stored either as a
+sorted array of 16-bit values (sparse chunks) or as a plain 8 KiB
+bitmap (dense chunks). In memory, a bitmap is a Python int, so that
+AND/OR/AND-NOT run at C speed.
+"""
+
+from struct import Struct, unpack_from
+
+from .cache import LRUCache
+from .cdb import CDBMaker, CDBReader
+from .compat import range
+from .text import enc_utf8
+
+_CHUNK_SIZE = 1 << 16
+_CHUNK_MASK = (1 << _CHUNK_SIZE) - 1
+_ARRAY_MAX = 4096  # above this, a bitmap chunk is smaller than an array
+
+_struct_I = Struct(b"<I")
+_pack_I = _struct_I.pack
+_unpack_I = _struct_I.unpack_from
+_struct_HBI = Struct(b"<HBI")  # chunk key, chunk type, cardinality
+_pack_HBI = _struct_HBI.pack
+_unpack_HBI = _struct_HBI.unpack_from
+_ARRAY = 0
+_BITMAP = 1
+
+# the positions of the bits set in each byte value
+_BYTE_BITS = tuple(tuple(b for b in range(8) if v >> b & 1) for v in range(256))
+
+
+class Bitmap:
+    """An immutable set of non-negative integers"""
+
+    __slots__ = ("_bits", "_bytes")
+
+    def __init__(self, bits=0):
+        self._bits = bits
+        self._bytes = None
+
+    @classmethod
+    def from_iterable(cls, numbers):
+        buf = bytearray()
+        for n in numbers:
+            i = n >> 3
+            if i >= len(buf):
+                buf.extend(bytes(i + 1 - len(buf)))
+            buf[i] |= 1 << (n & 7)
+        return cls(int.from_bytes(buf, "little"))
+
+    def __and__(self, other):
+        return Bitmap(self._bits & other._bits)
+
+    def __or__(self, other):
+        return Bitmap(self._bits | other._bits)
+
+    def __sub__(self, other):
+        return Bitmap(self._bits & ~other._bits)
+
+    def __bool__(self):
+        return self._bits != 0
+
+    def __len__(self):
+        return bin(self._bits).count("1")
+
+    def __eq__(self, other):
+        return isinstance(other, Bitmap) and self._bits == other._bits
+
+    def __hash__(self):
+        return hash(self._bits)
+
+    def _as_bytes(self):
+        if self._bytes is None:
+            bits = self._bits
+            self._bytes = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        return self._bytes
+
+    def __contains__(self, n):
+        data = self._as_bytes()
+        i = n >> 3
+        return i < len(data) and bool(data[i] >> (n & 7) & 1)
+
+    def __iter__(self):
+        """Yield the numbers in ascending order"""
+        data = self._as_bytes()
+        byte_bits = _BYTE_BITS
+        for i, v in enumerate(data):
+            if v:
+                base = i << 3
+                for b in byte_bits[v]:
+                    yield base + b
+
+    def serialize(self):
+        r = []
+        bits = self._bits
+        key = 0
+        while bits:
+            chunk = bits & _CHUNK_MASK
+            bits >>= _CHUNK_SIZE
+            if chunk:
+                chunk_bitmap = Bitmap(chunk)
+                card = len(chunk_bitmap)
+                if card <= _ARRAY_MAX:
+                    r.append(_pack_HBI(key, _ARRAY, card))
+                    r.append(Struct(f"<{card}H").pack(*chunk_bitmap))
+                else:
+                    r.append(_pack_HBI(key, _BITMAP, card))
+                    r.append(chunk.to_bytes(_CHUNK_SIZE // 8, "little"))
+            key += 1
+        return b"".join(r)
+
+    @classmethod
+    def deserialize(cls, data):
+        bits = 0
+        p = 0
+        size = len(data)
+        while p < size:
+            (key, kind, card) = _unpack_HBI(data, p)
+            p += _struct_HBI.size
+            if kind == _ARRAY:
+                buf = bytearray(_CHUNK_SIZE // 8)
+                end = p + 2 * card
+                for v in unpack_from(f"<{card}H", data, p):
+                    buf[v >> 3] |= 1 << (v & 7)
+                p = end
+            else:
+                end = p + _CHUNK_SIZE // 8
+                buf = data[p:end]
+                p = end
+            bits |= int.from_bytes(buf, "little") << (key * _CHUNK_SIZE)
+        return cls(bits)
+
+
+class BitmapTableWriter:
+    """Writes named bitmaps of the documents of an index to a CDB file"""
+
+    def __init__(self, f, num_docs):
+        self._writer = CDBMaker(f)
+        self._writer.add(b"", _pack_I(num_docs))
+
+    def add(self, name, numbers):
+        self._writer.add(enc_utf8(name), Bitmap.from_iterable(numbers).serialize())
+
+    def finalize(self):
+        self._writer.finalize()
+
+
+class BitmapTableReader:
+    """Reads the bitmaps of a BitmapTableWriter, caching the decoded ones"""
+
+    def __init__(self, path):
+        self._reader = CDBReader(path)
+        self._cache = LRUCache(512, name="bitmap.decoded")
+        (self.num_docs,) = _unpack_I(self._reader[b""])
+
+    def close(self):
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+
+    def get(self, name):
+        """Return the bitmap of a name (an empty one if unknown)"""
+        bitmap = self._cache.get(name)
+        if bitmap is None:
+            data = self._reader.get(enc_utf8(name))
+            bitmap = Bitmap.deserialize(data) if data is not None else Bitmap()
+            self._cache.put(name, bitmap)
+        return bitmap
@@ -0,0 +1,86 @@
+"""Thread-safe LRU cache bounded by entry count and approximate memory"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+from . import trace
+
+
+def sizeof_results(results):
+    """Estimate the memory footprint of a sequence of result tuples"""
+    getsizeof = sys.getsizeof
+    size = getsizeof(results)
+    for item in results:
+        size += getsizeof(item)
+        for field in item:
+            if field is not None:
+                size += getsizeof(field)
+    return size
+
+
+class LRUCache:
+    """Least-recently-used cache
+
+    The cache holds at most `maxsize` entries. If `maxbytes` is given,
+    the total of `sizeof(value)` over all entries is also kept below it.
+    Values larger than `maxbytes` on their own are not cached at all.
+    If `name` is given, the hits and misses are traced under that name.
+    """
+
+    def __init__(self, maxsize, maxbytes=None, sizeof=sys.getsizeof, name=None):
+        self._name = name
+        self._maxsize = maxsize
+        self._maxbytes = maxbytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                (value, size) = self._entries[key]
+            except KeyError:
+                (value, hit) = (default, False)
+            else:
+                self._entries.move_to_end(key)
+                hit = True
+        if self._name is not None:
+            trace.cache_access(self._name, hit)
+        return value
+
+    def put(self, key, value):
+        size = self._sizeof(value) if self._maxbytes is not None else 0
+        with self._lock:
+            entries = self._entries
+            old = entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[1]
+            if self._maxbytes is not None and size > self._maxbytes:
+                return
+            entries[key] = (value, size)
+            self._nbytes += size
+            while len(entries) > self._maxsize or (
+                self._maxbytes is not None and self._nbytes > self._maxbytes
+            ):
+                (_, (_, evicted_size)) = entries.popitem(last=False)
+                self._nbytes -= evicted_size
+
+    def invalidate(self, predicate=None):
+        """Remove the entries whose key satisfies predicate (all if None)"""
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                self._nbytes = 0
+                return
+            for key in [key for key in self._entries if predicate(key)]:
+                (_, size) = self._entries.pop(key)
+                self._nbytes -= size
@@ -1,6 +1,7 @@
 import codecs
 import re
 import unicodedata
+from functools import lru_cache
 
 _utf8_encoder = codecs.getencoder("utf-8")
 _utf8_decoder = codecs.getdecoder("utf-8")
@@ -19,7 +20,7 @@ def dec_utf8(s):
     return _utf8_decoder(s)[0]
 
 
-def normalize_token(t):
+def _normalize_token(t):
     key = t.replace("\u00a9", "c")
 
     def is_not_mn(c):
@@ -29,9 +30,7 @@ def normalize_token(t):
     return "".join(c for c in _unicode_normalize("NFKD", key) if is_not_mn(c))
 
 
-def normalize_index_key(key):
-    # remove space at the beginning and at the end of the string
-    key = key.strip().lower()
+def _normalize_index_key(key):
     key = key.replace("\u00a9", "c")
 
     def is_wd(c):
@@ -41,7 +40,66 @@ def normalize_index_key(key):
     return "".join(c for c in _unicode_normalize("NFKD", key) if is_wd(c))
 
 
+# Normalizing the characters of these blocks one by one gives the same
+# result as normalizing the whole string: their decompositions do not
+# interact (the combining marks are all removed). They cover the
+# repertoire of the dictionary, and any other string takes the slow path.
+_REPERTOIRE = re.compile("[\u0000-\u036f\u2000-\u206f]*")
+_REPERTOIRE_CHARS = [chr(c) for c in (*range(0x370), *range(0x2000, 0x2070))]
+_TOKEN_TABLE = str.maketrans(
+    {c: _normalize_token(c) for c in _REPERTOIRE_CHARS if _normalize_token(c) != c}
+)
+_INDEX_KEY_TABLE = str.maketrans(
+    {c: _normalize_index_key(c) for c in _REPERTOIRE_CHARS}
+)
+
+
+@lru_cache(maxsize=16384)
+def _normalize_token_nonascii(t):
+    if _REPERTOIRE.fullmatch(t):
+        return t.translate(_TOKEN_TABLE)
+    return _normalize_token(t)
+
+
+@lru_cache(maxsize=16384)
+def _normalize_index_key_lowered(key):
+    if key.isascii() or _REPERTOIRE.fullmatch(key):
+        return key.translate(_INDEX_KEY_TABLE)
+    return _normalize_index_key(key)
+
+
+def normalize_token(t):
+    if t.isascii():
+        return t
+    return _normalize_token_nonascii(t)
+
+
+def normalize_index_key(key):
+    # remove space at the beginning and at the end of the string
+    return _normalize_index_key_lowered(key.strip().lower())
+
+
 def ellipsis(s, length):
     if len(s) >= length:
         return s[: length - 1] + "\u2026"
     return s
+
+
+# The tail of a label is the part shared by the items of an entry:
+# "<c><o>phrase</o> (headword)</c>", "<h><v>variant</v> &rarr; headword</h>",
+# "<e>example</e> &mdash; <h>headword</h>"
+_LABEL_TAIL = re.compile(r"</o> \(| &rarr; | &mdash; ")
+
+
+def split_label(label):
+    """Split a label into a head and a tail which is shared by its entry"""
+    m = _LABEL_TAIL.search(label)
+    if m is None:
+        return (label, "")
+    return (label[: m.start()], label[m.start() :])
+
+
+def split_path(path):
+    """Split a path into the entry and the fragment (with its "#")"""
+    (entry, sep, fragment) = path.partition("#")
+    return (entry, sep + fragment)
@@ -0,0 +1,178 @@
+"""Lightweight tracing of the hot paths
+
+Spans time the stages of a request (archive reads, inflating blocks,
+transforms, queries, list updates, scheme-handler responses), counters
+count events, and caches report their hits and misses. Nothing is
+recorded until enable() is called, which the GUI does with --debug;
+until then, span() returns a shared no-op context manager.
+
+    with trace.span("archive.read"):
+        ...
+    trace.cache_access("static.files", hit)
+
+snapshot() returns what has been recorded as a dict, and dump() writes
+it as JSON.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+_SAMPLES = 1000  # latest durations kept per span, for the percentiles
+
+enabled = False
+
+_lock = threading.Lock()
+_spans = {}  # name -> [count, total, max, deque of the latest durations]
+_counters = {}  # name -> count
+_caches = {}  # name -> [hits, misses]
+_started = time.time()
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    global _started
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _caches.clear()
+        _started = time.time()
+
+
+def add_duration(name, elapsed):
+    with _lock:
+        stat = _spans.get(name)
+        if stat is None:
+            stat = _spans[name] = [0, 0.0, 0.0, deque(maxlen=_SAMPLES)]
+        stat[0] += 1
+        stat[1] += elapsed
+        if elapsed > stat[2]:
+            stat[2] = elapsed
+        stat[3].append(elapsed)
+
+
+class _Span:
+    __slots__ = ("_name", "_t")
+
+    def __init__(self, name):
+        self._name = name
+
+    def __enter__(self):
+        self._t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        add_duration(self._name, time.perf_counter() - self._t)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Return a context manager that times its block as the span name"""
+    if not enabled:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def traced(name):
+    """Decorator timing each call of a function as the span name"""
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return f(*args, **kwargs)
+            with _Span(name):
+                return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, n=1):
+    if enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def cache_access(name, hit):
+    """Count a hit (if hit is true) or a miss of the cache name"""
+    if enabled:
+        with _lock:
+            stat = _caches.get(name)
+            if stat is None:
+                stat = _caches[name] = [0, 0]
+            stat[0 if hit else 1] += 1
+
+
+def _percentile(samples, p):
+    return samples[max(0, min(len(samples) - 1, int(p / 100 * len(samples))))]
+
+
+def snapshot():
+    """Return the spans, counters and caches recorded
+
+    The durations are in ms; the percentiles are of the latest calls.
+    """
+    with _lock:
+        spans = {
+            name: (n, total, max_, sorted(samples))
+            for (name, (n, total, max_, samples)) in _spans.items()
+        }
+        counters = dict(_counters)
+        caches = {name: tuple(stat) for (name, stat) in _caches.items()}
+        started = _started
+
+    return {
+        "enabled": enabled,
+        "since": started,
+        "elapsed": time.time() - started,
+        "spans": {
+            name: {
+                "count": n,
+                "total_ms": 1000 * total,
+                "mean_ms": 1000 * total / n,
+                "p50_ms": 1000 * _percentile(samples, 50),
+                "p95_ms": 1000 * _percentile(samples, 95),
+                "max_ms": 1000 * max_,
+            }
+            for (name, (n, total, max_, samples)) in spans.items()
+        },
+        "counters": counters,
+        "caches": {
+            name: {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else None,
+            }
+            for (name, (hits, misses)) in caches.items()
+        },
+    }
+
+
+def dump(f):
+    """Write snapshot() as JSON to a file object or a file name"""
+    if isinstance(f, str):
+        with open(f, "w", encoding="utf-8") as fobj:
+            dump(fobj)
+        return
+    json.dump(snapshot(), f, indent=1, sort_keys=True)
+    f.write("\n")
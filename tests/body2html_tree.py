@@ -0,0 +1,235 @@
+"""The element-tree entry body transformer that body2html() replaced
+
+body2html_tree() builds an HTML tree per entry body and serializes it
+with lxml's pretty printer. It is the reference for the streaming
+ldoce5.transform_body.body2html(): tests/test_transform_body.py checks
+that both give the same HTML, and benchmarks/bench_body2html.py times
+them.
+"""
+
+import platform
+import re
+from urllib.parse import urlencode
+
+from lxml.etree import tounicode
+
+from ldoce5viewer.ldoce5.transform_body import _E, _preprocess_span
+from ldoce5viewer.ldoce5.utils import shorten_id
+from ldoce5viewer.utils.compat import basestring
+
+
+def _as_span(elem, root):
+    """transform an element as <span>"""
+
+    attrib = {"class": elem.tag.lower()}
+    _id = elem.get("id")
+    if _id is not None:
+        attrib["id"] = shorten_id(_id)
+
+    children = [elem.text]
+    for c in elem:
+        children.extend(_dispatch(c, root))
+        children.append(c.tail)
+
+    yield _E("span", attrib, children)
+
+
+def _as_div(elem, root):
+    """transform an element as <div>"""
+
+    attrib = {"class": elem.tag.lower()}
+    _id = elem.get("id")
+    if _id:
+        attrib["id"] = shorten_id(_id)
+
+    children = [elem.text]
+    for c in elem:
+        children.extend(_dispatch(c, root))
+        children.append(c.tail)
+
+    yield _E("div", attrib, children)
+
+
+def _trans_sense(elem, root):
+    attrib = {"class": elem.tag.lower()}
+    if elem.find('span[@class="sensenum"]') is not None:
+        attrib["class"] += " sensewithnum"
+    if elem.get("id", None) is not None:
+        attrib["id"] = shorten_id(elem.get("id"))
+
+    children = [elem.text]
+    for c in elem:
+        children.extend(_dispatch(c, root))
+        children.append(c.tail)
+
+    yield _E("div", attrib, children)
+
+
+def _trans_ref(elem, root):
+    topic = elem.get("topic")
+    if len(topic.split(".")) == 4:
+        id23 = shorten_id(topic)
+        href = "/fs/" + id23
+        if elem.get("bookmark", None) is not None:
+            href += "#" + shorten_id(elem.get("bookmark"))
+    else:
+        href = "./" + elem.get("topic")
+
+    text = elem.text
+
+    suffix = elem.find("SUFFIX")
+    if suffix is not None:
+        text += suffix.text
+
+    children = [text]
+    for c in elem:
+        children.extend(_dispatch(c, root))
+        children.append(c.tail)
+
+    yield _E("a", {"href": href, "class": "ref"}, children)
+
+
+def _trans_nondv(elem, root):
+    refhwd = elem.find("REFHWD")
+    href = "#"
+    text = ""
+    if refhwd is not None:
+        text = refhwd.text
+        href = "lookup:///?" + urlencode({"q": text.strip().encode("utf-8")})
+
+    suffix = elem.find("SUFFIX")
+    if suffix is not None:
+        text += suffix.text
+
+    yield _E("a", {"href": href, "class": "nondv"}, [text])
+
+
+def _trans_span(elem, root):
+    attrib = elem.attrib
+    text = elem.text
+    attr_class = attrib.get("class")
+    if attr_class:
+        if attr_class == "exabullet":
+            return
+        elif attr_class == "sensenum":
+            yield _E("span", attrib, (text, " "))
+        elif attr_class == "heading":
+            yield _E("div", attrib, (text,))
+        else:
+            yield _E("span", attrib, (text,))
+    elif text is not None:
+        yield text
+    else:
+        return
+
+
+def _trans_br(elem, root):
+    yield _E("br")
+
+
+def _trans_audio(elem, root):
+    topic = elem.get("topic")
+    res = elem.get("resource").lower()
+    path = "audio:///{0}/{1}".format(res, topic.split("/")[-1])
+    attrib = {"href": path, "class": "audio"}
+    if res == "exa_pron" or res == "sfx":
+        attrib["title"] = "Play"
+        img = "static:///images/speaker_eg.png"
+    elif res == "gb_hwd_pron":
+        attrib["title"] = "British"
+        img = "static:///images/speaker_br.png"
+    elif res == "us_hwd_pron":
+        attrib["title"] = "American"
+        img = "static:///images/speaker_am.png"
+    else:
+        attrib["title"] = "Not Supported"
+        img = "static:///images/speaker_eg.png"
+
+    children = (_E("img", {"src": img}),)
+    yield _E("a", attrib, children)
+
+
+def _trans_illustration(elem, root):
+    topic = elem.get("thumb")
+    filename = topic.split("/")[-1]
+    path_thumb = "/picture/thumbnail/" + filename
+    path_full = "/picture/fullsize/" + filename
+    attrib = {"src": path_thumb, "style": "float: right"}
+    children = (_E("img", attrib),)
+    yield _E("a", {"class": "illust", "href": path_full}, children)
+
+
+def _trans_skip(elem, root):
+    return ()
+
+
+def _trans_hwd(elem, root):
+    if root.find("Head/HYPHENATION") is None:
+        hwd = elem
+        if hwd is not None:
+            yield _E("span", {"class": "hwd"}, [hwd.text])
+    return
+
+
+_TRANS_MAP = {
+    "ACTIV": _trans_skip,
+    "Audio": _trans_audio,
+    "br": _trans_br,
+    "ColloBox": _as_div,
+    "Collocate": _as_div,
+    "ColloExa": _as_div,
+    "Crossref": _as_div,
+    "Head": _as_div,
+    "Deriv": _as_div,
+    "Entry": _as_div,
+    "EXAMPLE": _as_div,
+    "EXPL": _as_span,
+    "Exponent": _as_div,
+    "F2NBox": _as_div,
+    "GramBox": _as_div,
+    "GramExa": _as_div,
+    "Hint": _as_div,
+    "HWD": _trans_hwd,
+    "ILLUSTRATION": _trans_illustration,
+    "INFLX": _trans_skip,
+    "PhrVbEntry": _as_div,
+    "NonDV": _trans_nondv,
+    "Ref": _trans_ref,
+    "RunOn": _as_div,
+    "SECHEADING": _as_div,
+    "Section": _as_div,
+    "SE_EntryAssets": _trans_skip,
+    "Sense": _trans_sense,
+    "span": _trans_span,
+    "SpokenSect": _as_div,
+    "Subsense": _trans_sense,
+    "Tail": _as_div,
+    "ThesBox": _as_div,
+}
+
+
+def _dispatch(elem, root):
+    """invoke a proper transformation function for a given element"""
+    f = _TRANS_MAP.get(elem.tag, _as_span)
+    return f(elem, root)
+
+
+def body2html_tree(root):
+    """Transform an entry body as body2html() did before it streamed"""
+    _preprocess_span(root)
+    r = []
+
+    # pass the root element to the dispatcher
+    for el in _dispatch(root, root):
+        if not isinstance(el, basestring):
+            r.append(tounicode(el, pretty_print=True, method="html"))
+
+    # replace some characters
+    body = "".join(r).translate({0x2027: 0xB7})
+    body = re.sub(r"([→►↔])", r"<span>\1</span>", body)
+    if platform.release() == "XP" and platform.system() == "Windows":
+        body = re.sub(
+            r"([\u02cc\u02c8\u2194])", r'<span class="winxpsym">\1</span>', body
+        )
+
+    return body
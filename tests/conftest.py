@@ -0,0 +1,76 @@
+"""Fixtures shared by the tests: small indexes of synthetic items"""
+
+import os
+import os.path
+import sys
+import threading
+
+import pytest
+
+from tests.helpers import make_compact, make_fulltext, make_items
+
+
+@pytest.fixture(scope="session")
+def items():
+    return make_items(1000)
+
+
+@pytest.fixture(scope="session")
+def var_path(tmp_path_factory):
+    # no variations database; the searchers fall back to morph_en
+    return str(tmp_path_factory.mktemp("var") / "variations.cdb")
+
+
+@pytest.fixture(scope="session")
+def fulltext_dir(tmp_path_factory, items):
+    index_dir = str(tmp_path_factory.mktemp("fulltext") / "index")
+    make_fulltext(index_dir, items)
+    return index_dir
+
+
+@pytest.fixture(scope="session")
+def compact_path(tmp_path_factory, items):
+    path = os.path.join(str(tmp_path_factory.mktemp("compact")), "compact.idx")
+    make_compact(path, items)
+    return path
+
+
+@pytest.fixture
+def fast_switching():
+    """Switch threads as often as possible, to bring out races"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _run_threads(worker, n=8):
+    errors = []
+
+    def run(i):
+        try:
+            worker(i, errors)
+        except Exception as e:
+            errors.append((i, e))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+@pytest.fixture
+def run_threads():
+    """Run worker(i, errors) on n threads, and return the errors"""
+    return _run_threads
+
+
+@pytest.fixture(scope="session")
+def srcdir():
+    """The LDOCE5 data directory named by $LDOCE5_DATA_DIR, if any"""
+    path = os.environ.get("LDOCE5_DATA_DIR")
+    if not path:
+        pytest.skip("LDOCE5_DATA_DIR is not set")
+    return path
@@ -0,0 +1,81 @@
+"""Synthetic entries and readers of the LDOCE5 archive
+
+Shared by the tests and the benchmarks.
+"""
+
+import random
+import re
+
+# an entry that has every kind of item get_entry_items() extracts
+EXTRACT_ENTRY = """<Entry id="a.b.c.d">
+<Head><HYPHENATION>beau‧ti‧ful</HYPHENATION><FREQ/>
+<HWD as_filter="233| 334 u9"><BASE>beautiful</BASE><INFLX>beautifuls</INFLX><INFLX>beautifuler</INFLX><INFLX>beautiful</INFLX></HWD>
+<HOMNUM>2</HOMNUM><POS>adjective</POS><POS>noun</POS><GRAM>uncountable</GRAM><GEO>British</GEO>
+<LEXVAR id="x.y.lv.1" as_filter="341"><INFLX>beautyful</INFLX><INFLX>bf</INFLX><!-- note --></LEXVAR>
+<ORTHVAR id="x.y.ov.1"><INFLX>beautifull</INFLX></ORTHVAR><ORTHVAR><INFLX>noid</INFLX></ORTHVAR>
+<ABBR>btf<span>xx</span></ABBR></Head>
+<Sense id="e.f.s.1"><GRAM>countable</GRAM><DEF as_filter="233">very <GLOSS>nice</GLOSS> pretty<?pi x?> thing</DEF>
+<LEXVAR id="e.f.lv.2">beau·ˈti<span>no</span>ful</LEXVAR>
+<EXAMPLE id="e.f.ex.1" as_filter="u1"><BASE>She is <COLLOINEXA>very <span>s</span>beautiful</COLLOINEXA>   indeed <COLLOINEXA>truly</COLLOINEXA>.</BASE></EXAMPLE>
+<LEXUNIT id="e.f.lu.1" as_filter="334">beautiful people</LEXUNIT>
+<PROPFORM id="e.f.pf.1">be beautiful</PROPFORM><PROPFORMPREP id="e.f.pp.1">beautiful at</PROPFORMPREP>
+<COLLO id="e.f.co.1">really beautiful</COLLO>
+<Collocate id="e.f.cl.1"><COLLOC id="e.f.cc.1">a beautiful day</COLLOC><ORTHVAR id="e.f.ov.3">an beauty day</ORTHVAR><COLLEXA as_filter="235"><BASE>What a <COLLOINEXA>beautiful day</COLLOINEXA>!</BASE></COLLEXA></Collocate>
+<Collocate><COLLOC id="n.o.c.1">noid colloc</COLLOC></Collocate>
+</Sense>
+<Sense id="e.f.s.2"><DEF>second &amp; def</DEF><EXAMPLE id="e.f.ex.2"><BASE>plain example</BASE></EXAMPLE></Sense>
+<RunOn><DERIV id="r.u.n.1" as_filter="334 233"><BASE>beauˈtifully</BASE><INFLX>beautifullies</INFLX><INFLX>beautifully</INFLX></DERIV><POS>adverb</POS><GRAM>C</GRAM></RunOn>
+<PhrVbEntry id="p.v.e.1"><Head><PHRVBHWD as_filter="u2">beautify up</PHRVBHWD></Head><Sense id="p.v.s.1"><DEF>make nice</DEF><EXAMPLE id="p.v.ex.1"><BASE>beautify up the room</BASE></EXAMPLE></Sense></PhrVbEntry>
+<Exponent id="e.x.p.1"><EXP>lovely</EXP><ORTHVAR>luvly</ORTHVAR><DEF as_filter="233">attractive</DEF><THESEXA as_filter="234"><BASE>a <COLLOINEXA>lovely</COLLOINEXA> view</BASE></THESEXA></Exponent>
+<Exponent><EXP>noid</EXP></Exponent>
+</Entry>""".encode()
+
+# an entry that has every element body2html() writes
+BODY_ENTRY = """<Entry id="a.b.c.d">
+<Head><HWD>beau‧ti‧ful</HWD><HYPHENATION>beau‧ti‧ful</HYPHENATION>
+<Audio resource="GB_HWD_PRON" topic="gb/beautiful.mp3"/><Audio resource="US_HWD_PRON" topic="us/b.mp3"/>
+<Audio resource="EXA_PRON" topic="e/x.mp3"/><Audio resource="OTHER" topic="o/x.mp3"/>
+<POS> <span>adjective</span></POS><span class="neutral">, </span><GRAM><span> [</span>C<span>] </span></GRAM>
+<ILLUSTRATION thumb="pics/t/beau tiful é.jpg"/><INFLX>x</INFLX><ACTIV>y</ACTIV></Head>
+<Sense id="e.f.s.1"><span class="sensenum">1</span><DEF>very <NonDV><REFHWD> nice </REFHWD></NonDV> &amp; <Ref topic="a.b.c.e" bookmark="x.y.z.w">pretty</Ref> → thing</DEF>
+<span class="exabullet">*</span><EXAMPLE id="e.f.ex.1"><span class="neutral"> </span>She is <COLLOINEXA>very</COLLOINEXA> ► nice &lt;x&gt;<br/>ok ↔ ‧</EXAMPLE>
+<Crossref><span class="neutral">→ </span><Ref topic="some_topic">other<SUFFIX>s</SUFFIX></Ref><span>;</span></Crossref>
+<Subsense id=""><span class="heading">head</span><span class="x" title='a"b'>t</span>\r<span>plain</span></Subsense>
+<NonDV><SUFFIX>x</SUFFIX></NonDV><span class="sensenum"/><span class="empty"/></Sense>
+<Tail><SE_EntryAssets>x</SE_EntryAssets><GramBox id="g.b.x.1"><span>  spaced  </span></GramBox></Tail>
+</Entry>""".encode()
+
+_TOKEN = re.compile(r"\w+(?:\.?\w+)*", re.UNICODE)
+
+
+def archive_entries(srcdir):
+    from ldoce5viewer.ldoce5 import idmreader
+
+    files = idmreader.list_files(srcdir, "fs")
+    with idmreader.ArchiveReader(srcdir, "fs") as archive_reader:
+        return [archive_reader.read(location) for dirs, name, location in files]
+
+
+def corpus_stream(srcdir):
+    from ldoce5viewer.ldoce5 import idmreader
+    from ldoce5viewer.ldoce5.extract import get_entry_items
+
+    tokens = []
+    keys = []
+    files = idmreader.list_files(srcdir, "fs")
+    with idmreader.ArchiveReader(srcdir, "fs") as archive_reader:
+        for dirs, name, location in files:
+            (items, var) = get_entry_items(archive_reader.read(location))
+            for itemtype, label, path, content, sortkey, asfilter, prio in items:
+                tokens.extend(m.group().lower() for m in _TOKEN.finditer(content))
+                keys.append(sortkey)
+    return (tokens, keys)
+
+
+def synthetic_stream(n):
+    rand = random.Random(0)
+    words = ["take", "café", "naïve", "o'clock", "Ångström", "résumé", "well-known"]
+    words += ["déjà", "façade", "copyright©", "piñata", "Zürich", "x" * 12]
+    tokens = [rand.choice(words).lower() for _ in range(n)]
+    keys = [" ".join(rand.sample(words, 2)) for _ in range(n // 4)]
+    return (tokens, keys)
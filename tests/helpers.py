@@ -0,0 +1,51 @@
+"""Synthetic items and the small indexes made of them"""
+
+import random
+
+from ldoce5viewer import compact, fulltext
+
+# "back", "bake", "bell", ..., "tore"
+WORDS = tuple(
+    c + v for c in "bcdfghlmprstw" for v in ("ack", "ake", "ell", "ing", "ore")
+)
+ITEMTYPES = ("hm", "hv", "hp", "p", "pl")
+ASFILTERS = ("233", "234", "235", "334", "341", "u1")
+
+
+def make_items(num, seed=0):
+    """Return num (itemtype, content, asfilter, label, path, prio, sortkey)"""
+    rand = random.Random(seed)
+    items = []
+    for i in range(num):
+        words = [rand.choice(WORDS) for _ in range(rand.randint(1, 4))]
+        content = " ".join(words)
+        items.append(
+            (
+                rand.choice(ITEMTYPES),
+                content,
+                " ".join(rand.sample(ASFILTERS, 2)),
+                f"<h><n>{content}</n></h>",
+                f"/fs/u{i:07d}",
+                rand.randint(1, 30),
+                content,
+            )
+        )
+    return items
+
+
+def make_fulltext(index_dir, items):
+    ranks = fulltext.sort_ranks((item[6], item[5]) for item in items)
+    maker = fulltext.Maker(index_dir)
+    for item, rank in zip(items, ranks, strict=True):
+        maker.add_item(*item, rank)
+    maker.commit()
+    maker.close()
+
+
+def make_compact(path, items):
+    ranks = fulltext.sort_ranks((item[6], item[5]) for item in items)
+    maker = compact.Maker(path, path + ".tmp")
+    for item, rank in zip(items, ranks, strict=True):
+        maker.add_item(*item, rank)
+    maker.commit()
+    maker.close()
@@ -0,0 +1,79 @@
+import random
+from struct import pack
+
+import pytest
+
+from ldoce5viewer.utils.bitmap import Bitmap, BitmapTableReader, BitmapTableWriter
+
+SETS = [
+    set(),
+    {0},
+    {1, 2, 7, 8, 9},
+    {65535, 65536},
+    set(range(0, 20000, 3)),  # a dense chunk
+    set(range(4096)),  # the largest array chunk
+    set(range(4097)),  # the smallest bitmap chunk
+    {5, 70000, 300000, 300001},  # sparse chunks with empty ones between
+    set(random.Random(0).sample(range(200000), 5000)),
+]
+
+
+@pytest.mark.parametrize("numbers", SETS)
+def test_round_trip(numbers):
+    bitmap = Bitmap.from_iterable(numbers)
+    assert list(bitmap) == sorted(numbers)
+    assert len(bitmap) == len(numbers)
+    assert bool(bitmap) == bool(numbers)
+    assert Bitmap.deserialize(bitmap.serialize()) == bitmap
+    for n in (0, 1, 9, 65535, 65536, 70000, 300001, 10**7):
+        assert (n in bitmap) == (n in numbers)
+
+
+def test_from_iterable():
+    assert Bitmap.from_iterable([9, 3, 3, 0]) == Bitmap.from_iterable([0, 3, 9])
+    assert Bitmap.from_iterable([]) == Bitmap()
+
+
+def test_operations():
+    a = set(range(0, 100000, 2))
+    b = set(range(0, 100000, 3)) | {200000}
+    (ba, bb) = (Bitmap.from_iterable(a), Bitmap.from_iterable(b))
+    assert list(ba & bb) == sorted(a & b)
+    assert list(ba | bb) == sorted(a | b)
+    assert list(ba - bb) == sorted(a - b)
+    assert not (ba - ba)
+
+
+def test_format():
+    """Array and bitmap chunks, as written in the indexes"""
+    assert Bitmap().serialize() == b""
+    assert Bitmap.from_iterable([1, 2, 65536 + 3]).serialize() == (
+        pack("<HBI", 0, 0, 2)
+        + pack("<2H", 1, 2)
+        + pack("<HBI", 1, 0, 1)
+        + pack("<H", 3)
+    )
+    dense = Bitmap.from_iterable(range(5000)).serialize()
+    assert dense[:7] == pack("<HBI", 0, 1, 5000)
+    assert len(dense) == 7 + 8192
+    assert dense[7:] == (b"\xff" * 625).ljust(8192, b"\0")
+
+
+def test_table(tmp_path):
+    path = str(tmp_path / "filters.cdb")
+    with open(path, "wb") as f:
+        writer = BitmapTableWriter(f, 300002)
+        for i, numbers in enumerate(SETS):
+            writer.add(f"set:{i}", sorted(numbers))
+        writer.finalize()
+
+    reader = BitmapTableReader(path)
+    try:
+        assert reader.num_docs == 300002
+        for i, numbers in enumerate(SETS):
+            assert list(reader.get(f"set:{i}")) == sorted(numbers)
+            # decoded once, then cached
+            assert reader.get(f"set:{i}") is reader.get(f"set:{i}")
+        assert reader.get("unknown") == Bitmap()
+    finally:
+        reader.close()
@@ -0,0 +1,142 @@
+import pytest
+
+from ldoce5viewer import compact, fulltext
+from ldoce5viewer.utils.cache import LRUCache
+
+PARSES = [
+    ("content", "back"),
+    ("content", "bell cake -ring"),
+    ("content", '"back bake" & (tore NOT sing)'),
+    ("content", "hack itemtype:hm asfilter:233"),
+    ("content_wild", "ri?g* bell"),
+    ("asfilter", "233 OR (334 AND u1)"),
+    ("asfilter", "234 AND 235 OR 341"),
+]
+
+
+@pytest.fixture
+def searcher(compact_path, var_path):
+    searcher = compact.Searcher(compact_path, var_path)
+    yield searcher
+    searcher.close()
+
+
+def parser(searcher, name):
+    return {
+        "content": searcher._parser,
+        "content_wild": searcher._parser_wild,
+        "asfilter": searcher._asf_parser,
+    }[name]
+
+
+def test_parse(searcher):
+    assert searcher._parser.parse("bell cake -ring") == (
+        "and",
+        [
+            ("term", b"c", "bell"),
+            ("term", b"c", "cake"),
+            ("not", ("term", b"c", "ring")),
+        ],
+    )
+    assert searcher._asf_parser.parse("233 OR (334 AND u1)") == (
+        "or",
+        [("term", b"f", "233"), ("and", [("term", b"f", "334"), ("term", b"f", "u1")])],
+    )
+    with pytest.raises(compact._ParseError):
+        searcher._parser.parse("bell )")
+
+
+def test_concurrent_parses(searcher, fast_switching, run_threads):
+    expected = [parser(searcher, name).parse(s) for (name, s) in PARSES]
+
+    def worker(n, errors):
+        for i in range(200):
+            j = (n + i) % len(PARSES)
+            (name, s) = PARSES[j]
+            if parser(searcher, name).parse(s) != expected[j]:
+                errors.append((n, s))
+
+    assert run_threads(worker) == []
+
+
+def test_concurrent_searches(searcher, monkeypatch, fast_switching, run_threads):
+    monkeypatch.setattr(fulltext, "_result_cache", LRUCache(0))
+    monkeypatch.setattr(compact, "_result_cache", LRUCache(0))
+    queries = [
+        ("back", None, ()),
+        ("bell cake", None, ()),
+        ("tore -sing", "233 OR u1", ()),
+        ("hack", None, ("hm", "p")),
+    ]
+
+    def search(query):
+        collector = searcher.make_collector(20)
+        return searcher.search(collector, *query)
+
+    expected = [search(q) for q in queries]
+    assert all(expected)
+
+    def worker(n, errors):
+        for i in range(30):
+            j = (n + i) % len(queries)
+            # parse the queries anew each time
+            searcher._parse_cache.invalidate()
+            if search(queries[j]) != expected[j]:
+                errors.append((n, queries[j]))
+
+    assert run_threads(worker) == []
+
+
+def test_parse_cache(searcher, fast_switching, run_threads):
+    """Cached trees equal fresh parses, after searches and under contention"""
+    expected = [parser(searcher, name).parse(s) for (name, s) in PARSES]
+    searcher._parse_cache.invalidate()
+
+    def worker(n, errors):
+        for i in range(200):
+            if i % 10 == n:
+                searcher._parse_cache.invalidate()
+            j = (n + i) % len(PARSES)
+            (name, s) = PARSES[j]
+            if searcher._parse(parser(searcher, name), s) != expected[j]:
+                errors.append((n, s))
+            if name != "asfilter":
+                searcher.search(searcher.make_collector(10), s)
+
+    assert run_threads(worker) == []
+    for (name, s), tree in zip(PARSES, expected, strict=True):
+        p = parser(searcher, name)
+        assert searcher._parse(p, s) == tree == p.parse(s)
+
+
+SAME_AS_WHOOSH = [
+    ("back", None, ()),
+    ("back bell", None, ()),
+    ("bell NOT cake", None, ()),
+    ('"sell hake"', None, ()),
+    ("ba*", None, ("hm",)),
+    ("b?ck*", None, ()),
+    (None, "(asfilter:233 OR asfilter:234) AND (asfilter:u1)", ("hm",)),
+    ("bell", "asfilter:341", ("hm", "hp")),
+]
+
+
+@pytest.mark.parametrize("query", SAME_AS_WHOOSH)
+@pytest.mark.parametrize("limit", [None, 10])
+def test_same_results_as_whoosh(
+    searcher, fulltext_dir, var_path, monkeypatch, query, limit
+):
+    """The compact index answers as the whoosh index of the same items"""
+    monkeypatch.setattr(fulltext, "_result_cache", LRUCache(0))
+    monkeypatch.setattr(compact, "_result_cache", LRUCache(0))
+    reference = fulltext.Searcher(fulltext_dir, var_path)
+    try:
+        for highlight in (False, True):
+            results = [
+                s.search(s.make_collector(limit), *query, highlight=highlight)
+                for s in (searcher, reference)
+            ]
+            assert results[0]
+            assert results[0] == results[1]
+    finally:
+        reference.close()
@@ -0,0 +1,231 @@
+"""get_entry_items() against the items of the previous, per-kind extractor"""
+
+from ldoce5viewer.ldoce5.extract import get_entry_items
+from tests.entries import EXTRACT_ENTRY
+
+H = "<f>beautiful<s>2</s></f> <p>adjective, noun</p>"
+
+# (typecode, label, path, plain, sortkey, asfilter, prio), in index order
+ITEMS = [
+    (
+        "hm",
+        f"<h>{H}</h>",
+        "/fs/c.d",
+        "beautiful",
+        "beautiful",
+        ["233", "334", "u1", "u2", "u9"],
+        1,
+    ),
+    (
+        "hv",
+        f"<h><v>beautifuls</v> &rarr; {H}</h>",
+        "/fs/c.d",
+        "beautifuls",
+        "beautifuls",
+        ["233", "334", "u9"],
+        2,
+    ),
+    (
+        "hv",
+        f"<h><v>beautyful</v> &rarr; {H}</h>",
+        "/fs/c.d#lv.1",
+        "beautyful",
+        "beautyful",
+        ["341"],
+        2,
+    ),
+    ("hv", f"<h><v>bf</v> &rarr; {H}</h>", "/fs/c.d#lv.1", "bf", "bf", ["341"], 2),
+    (
+        "hv",
+        f"<h><v>beautifull</v> &rarr; {H}</h>",
+        "/fs/c.d#ov.1",
+        "beautifull",
+        "beautifull",
+        [],
+        2,
+    ),
+    ("hv", f"<h><v>btf</v> &rarr; {H}</h>", "/fs/c.d", "btf", "btf", [], 2),
+    (
+        "d",
+        f"<h>{H}</h>",
+        "/fs/c.d#s.1",
+        "very  prettyx thing",
+        "beautiful",
+        ["233"],
+        30,
+    ),
+    (
+        "pl",
+        f"<l><o>beautiful</o> ({H})</l>",
+        "/fs/c.d#lv.2",
+        "beautiful",
+        "beautiful",
+        [],
+        11,
+    ),
+    (
+        "pl",
+        f"<l><o>an beauty day</o> ({H})</l>",
+        "/fs/c.d#ov.3",
+        "an beauty day",
+        "an beauty day",
+        [],
+        11,
+    ),
+    ("d", f"<h>{H}</h>", "/fs/c.d#s.2", "second & def", "beautiful", [], 30),
+    ("d", f"<h>{H}</h>", "/fs/c.d#s.1", "make nice", "beautiful", [], 30),
+    (
+        "hm",
+        "<h><n>beautifully</n> <p>adverb</p></h>",
+        "/fs/c.d#n.1",
+        "beautifully",
+        "beautifully",
+        ["233"],
+        1,
+    ),
+    (
+        "hv",
+        "<h><v>beautifullies<v> &rarr; <n>beautifully</n> <p>adverb</p></h>",
+        "/fs/c.d#n.1",
+        "beautifullies",
+        "beautifullies",
+        ["233"],
+        1,
+    ),
+    (
+        "hp",
+        "<h><pv>beautify up</pv> <p>phrasal verb</p></h>",
+        "/fs/c.d#e.1",
+        "beautify up",
+        "beautify up",
+        ["u2"],
+        1,
+    ),
+    (
+        "e",
+        f"<h>{H}</h>",
+        "/fs/c.d#ex.1",
+        "She is very beautiful indeed truly .",
+        "beautiful",
+        ["u1"],
+        20,
+    ),
+    (
+        "p",
+        f"<c><o>very beautiful &hellip; truly</o> ({H})</c>",
+        "/fs/c.d#ex.1",
+        "very beautiful truly",
+        "very beautiful truly",
+        [],
+        15,
+    ),
+    ("e", f"<h>{H}</h>", "/fs/c.d#ex.2", "plain example", "beautiful", [], 20),
+    ("e", f"<h>{H}</h>", "/fs/c.d#ex.1", "beautify up the room", "beautiful", [], 20),
+    (
+        "pl",
+        f"<l><o>beautiful people</o> ({H})</l>",
+        "/fs/c.d#lu.1",
+        "beautiful people",
+        "beautiful people",
+        ["334"],
+        9,
+    ),
+    (
+        "p",
+        f"<c><o>beautiful at</o> ({H})</c>",
+        "/fs/c.d#pp.1",
+        "beautiful at",
+        "beautiful at",
+        [],
+        10,
+    ),
+    (
+        "p",
+        f"<c><o>be beautiful</o> ({H})</c>",
+        "/fs/c.d#pf.1",
+        "be beautiful",
+        "be beautiful",
+        [],
+        10,
+    ),
+    (
+        "e",
+        f"<h>{H}</h> &mdash; <b>a beautiful day</b>, <b>an beauty day</b>",
+        "/fs/c.d#cl.1",
+        "What a beautiful day !",
+        "beautiful",
+        ["235"],
+        20,
+    ),
+    (
+        "p",
+        f"<c><o>an beauty day</o> ({H})</c>",
+        "/fs/c.d#ov.3",
+        "an beauty day",
+        "an beauty day",
+        [],
+        11,
+    ),
+    ("e", f"<h>{H}</h>", "/fs/c.d#p.1", "a lovely view", "beautiful", ["234"], 20),
+    (
+        "d",
+        f"<h>{H}</h> &mdash; <b>lovely</b>, <b>luvly</b>",
+        "/fs/c.d#p.1",
+        "attractive",
+        "beautiful",
+        ["233"],
+        30,
+    ),
+    (
+        "p",
+        f"<c><o>really beautiful</o> ({H})</c>",
+        "/fs/c.d#co.1",
+        "really beautiful",
+        "really beautiful",
+        [],
+        10,
+    ),
+    (
+        "p",
+        f"<c><o>beautiful day</o> ({H})</c>",
+        "/fs/c.d#cc.1",
+        "beautiful day",
+        "beautiful day",
+        [],
+        10,
+    ),
+    (
+        "p",
+        f"<c><o>noid colloc</o> ({H})</c>",
+        "/fs/c.d#c.1",
+        "noid colloc",
+        "noid colloc",
+        [],
+        10,
+    ),
+]
+
+VARIATIONS = ["beautiful", "beautifull", "beautifuls", "beautyful", "bf", "btf"]
+
+
+def test_items():
+    (items, variations) = get_entry_items(EXTRACT_ENTRY)
+    # the asfilter ids, and the forms of a variant, come out of sets
+    items = [(*item[:5], sorted(item[5].split()), item[6]) for item in items]
+    assert [(ty, path) for (ty, _, path, *_) in items] == [
+        (ty, path) for (ty, _, path, *_) in ITEMS
+    ]
+    assert sorted(items) == sorted(ITEMS)
+
+
+def test_variations():
+    (items, variations) = get_entry_items(EXTRACT_ENTRY)
+    assert sorted(variations) == VARIATIONS
+    for word, others in variations.items():
+        assert sorted(others) == [v for v in VARIATIONS if v != word]
+
+
+def test_generator():
+    (items, variations) = get_entry_items(EXTRACT_ENTRY)
+    assert iter(items) is items
+    assert next(items)[0] == "hm"
@@ -0,0 +1,117 @@
+import pytest
+
+from ldoce5viewer import fulltext
+from ldoce5viewer.utils.cache import LRUCache
+from ldoce5viewer.utils.text import normalize_index_key
+
+QUERIES = [
+    ("back", None, ()),
+    ("ring*", None, ()),
+    ("bell cake", None, ()),
+    ("tore", "233", ()),
+    ("hack", None, ("hm", "p")),
+    (None, "334 OR u1", ("pl",)),
+]
+
+
+@pytest.fixture
+def no_result_cache(monkeypatch):
+    monkeypatch.setattr(fulltext, "_result_cache", LRUCache(0))
+
+
+@pytest.fixture
+def searcher(fulltext_dir, var_path):
+    searcher = fulltext.Searcher(fulltext_dir, var_path)
+    yield searcher
+    searcher.close()
+
+
+def run_query(searcher, query, limit=20):
+    (query_str1, query_str2, itemtypes) = query
+    return searcher.search(
+        searcher.make_collector(limit), query_str1, query_str2, itemtypes
+    )
+
+
+def test_concurrent_searches(searcher, no_result_cache, fast_switching, run_threads):
+    expected = [run_query(searcher, q) for q in QUERIES]
+    assert all(expected)
+
+    def worker(n, errors):
+        for i in range(30):
+            j = (n + i) % len(QUERIES)
+            if run_query(searcher, QUERIES[j]) != expected[j]:
+                errors.append((n, QUERIES[j]))
+
+    assert run_threads(worker) == []
+    # one whoosh searcher per thread, including this one
+    assert len(searcher._lives) == 9
+
+
+def test_parse_cache(searcher, fast_switching, run_threads):
+    """Cached trees equal fresh parses, after searches and under contention"""
+    parses = [
+        (searcher._parser, "back"),
+        (searcher._parser, "bell cake NOT ring"),
+        (searcher._parser, '"back bake" & (tore -sing)'),
+        (searcher._parser_wild, "ri?g* bell"),
+        (searcher._asf_parser, "233 OR (334 AND u1)"),
+    ]
+    expected = [parser.parse(s) for (parser, s) in parses]
+    searcher._parse_cache.invalidate()
+
+    def worker(n, errors):
+        for i in range(100):
+            if i % 10 == n:
+                searcher._parse_cache.invalidate()
+            j = (n + i) % len(parses)
+            (parser, s) = parses[j]
+            if searcher._parse(parser, s) != expected[j]:
+                errors.append((n, s))
+            if parser is not searcher._asf_parser:
+                searcher.search(searcher.make_collector(10), s)
+
+    assert run_threads(worker) == []
+    for (parser, s), tree in zip(parses, expected, strict=True):
+        assert searcher._parse(parser, s) == tree == parser.parse(s)
+
+
+def test_closed_searcher(fulltext_dir, var_path):
+    searcher = fulltext.Searcher(fulltext_dir, var_path)
+    run_query(searcher, QUERIES[0])
+    searcher.close()
+    with pytest.raises(fulltext.IndexError):
+        run_query(searcher, ("nomatch", None, ()))
+
+
+def test_sort_ranks():
+    keys = [("bell", 3), ("Back", 2), ("back", 1), ("cake", 1), ("back", 1)]
+    ranks = fulltext.sort_ranks(keys)
+    assert sorted(ranks) == list(range(len(keys)))
+    # equal keys keep their order
+    assert ranks == [3, 2, 0, 4, 1]
+
+
+@pytest.mark.parametrize("query", QUERIES[:5])
+@pytest.mark.parametrize("limit", [0, 1, 5, 20, None])
+def test_ranked_results(searcher, items, no_result_cache, query, limit):
+    """The top results in the (sortkey, prio) order, as a full sort gives"""
+    live = searcher._live()
+    (query_str1, query_str2, itemtypes) = query
+    q = searcher._parse(searcher._content_parser(query_str1), query_str1)
+    hits = live.searcher.search(q, limit=None)
+    matches = [items[docnum] for docnum in sorted(hits.docs())]
+    if query_str2:
+        matches = [item for item in matches if query_str2 in item[2].split()]
+    if itemtypes:
+        matches = [item for item in matches if item[0] in itemtypes]
+    assert matches
+    matches.sort(key=lambda item: (normalize_index_key(item[6]), item[5]))
+    matches = matches[:limit]
+    if "*" in query_str1:
+        # the sortkeys are matched against the pattern after the cut
+        pat = query_str1.replace("*", "")
+        matches = [item for item in matches if item[6].startswith(pat)]
+
+    results = run_query(searcher, query, limit)
+    assert [r[1] for r in results] == [item[4] for item in matches]
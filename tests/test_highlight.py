@@ -0,0 +1,97 @@
+"""Searcher.highlight() against the Hit.highlights() markup it replaces"""
+
+import os.path
+
+import pytest
+from whoosh.highlight import HtmlFormatter, WholeFragmenter
+
+from ldoce5viewer import compact, fulltext
+from tests.helpers import make_compact, make_fulltext
+
+TEXTS = [
+    'Back & forth, <b>backing</b> it\'s "back"',
+    "BACK backs backed; backing back Backs",
+    "the cake's bake & ring",
+    "a <ring> that rings and rang",
+    "nothing here",
+]
+QUERIES = ["back", "ring", "cake bake", "backs", "ring*"]
+
+
+def make_items(texts):
+    return [
+        ("p", text, "233", f"<n>{i}</n>", f"/fs/h{i}", 1, text)
+        for (i, text) in enumerate(texts)
+    ]
+
+
+@pytest.fixture(scope="module")
+def searchers(tmp_path_factory):
+    tmp = str(tmp_path_factory.mktemp("highlight"))
+    items = make_items(TEXTS)
+    make_fulltext(os.path.join(tmp, "fulltext"), items)
+    make_compact(os.path.join(tmp, "compact.idx"), items)
+    var_path = os.path.join(tmp, "variations.cdb")
+    searchers = {
+        "fulltext": fulltext.Searcher(os.path.join(tmp, "fulltext"), var_path),
+        "compact": compact.Searcher(os.path.join(tmp, "compact.idx"), var_path),
+    }
+    yield searchers
+    for searcher in searchers.values():
+        searcher.close()
+
+
+def whoosh_highlights(searcher, query_str, texts):
+    """Mark up texts as Hit.highlights() did with the results of query_str"""
+    live = searcher._live()
+    query = searcher._parse(searcher._content_parser(query_str), query_str)
+    hits = live.searcher.search(query, limit=None)
+    hits.fragmenter = WholeFragmenter()
+    hits.formatter = HtmlFormatter(
+        tagname="span", classname="s_match", termclass="s_term"
+    )
+    return [hits[0].highlights("content", text=text) for text in texts]
+
+
+def highlighted(searcher, query_str, texts):
+    results = [
+        (label, path, sortkey, prio, text)
+        for (_, text, _, label, path, prio, sortkey) in make_items(texts)
+    ]
+    return [r[4] for r in searcher.highlight(query_str, results)]
+
+
+@pytest.mark.parametrize("backend", ["fulltext", "compact"])
+@pytest.mark.parametrize("query_str", QUERIES)
+def test_same_markup_as_whoosh(searchers, backend, query_str):
+    expected = whoosh_highlights(searchers["fulltext"], query_str, TEXTS)
+    assert highlighted(searchers[backend], query_str, TEXTS) == expected
+
+
+@pytest.mark.parametrize("backend", ["fulltext", "compact"])
+def test_escaping(searchers, backend):
+    [text] = highlighted(searchers[backend], "back", [TEXTS[0]])
+    assert text == (
+        '<span class="s_match s_term0">Back</span> &amp; forth, '
+        "&lt;b&gt;backing&lt;/b&gt; "
+        'it\'s "<span class="s_match s_term1">back</span>"'
+    )
+
+
+@pytest.mark.parametrize("backend", ["fulltext", "compact"])
+def test_term_classes_recycled(searchers, backend):
+    [text] = highlighted(searchers[backend], "back", ["back Back BACK bAck baCk bacK"])
+    # a class per distinct matched text, five classes
+    assert text.count("s_term0") == 2
+    assert 's_term0">bacK<' in text
+
+
+@pytest.mark.parametrize("backend", ["fulltext", "compact"])
+def test_no_match_is_empty(searchers, backend):
+    assert highlighted(searchers[backend], "back", ["nothing here"]) == [""]
+
+
+@pytest.mark.parametrize("backend", ["fulltext", "compact"])
+def test_no_query(searchers, backend):
+    # not highlighted, and not escaped, as the stored content
+    assert highlighted(searchers[backend], "", [TEXTS[0]]) == [TEXTS[0]]
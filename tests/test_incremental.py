@@ -0,0 +1,140 @@
+import random
+from operator import itemgetter
+from struct import pack
+
+import pytest
+
+from ldoce5viewer import incremental
+from ldoce5viewer.utils.text import enc_utf8, normalize_index_key
+from tests.helpers import WORDS
+
+
+def make_items(num, seed=0):
+    """Return num (plain, typecode, label, path, prio) as the indexer adds"""
+    rand = random.Random(seed)
+    items = []
+    for i in range(num):
+        hwd = rand.choice(WORDS) + rand.choice(("", "e", "ing"))
+        entry = f"/fs/u{i // 4:07d}"
+        kind = i % 4
+        if kind == 0:
+            items.append((hwd, "h", f"<h>{hwd}</h>", entry, rand.randint(1, 30)))
+        elif kind == 1:
+            phr = f"{hwd} {rand.choice(WORDS)}"
+            items.append(
+                (phr, "p", f"<c><o>{phr}</o> ({hwd})</c>", f"{entry}#p{i}", 10)
+            )
+        elif kind == 2:
+            var = hwd + "s"
+            items.append((var, "v", f"<h><v>{var}</v> &rarr; {hwd}</h>", entry, 20))
+        else:
+            word = rand.choice(("Café", "naïve", "Zürich")) + hwd
+            items.append((word, "h", f"<h>{word}</h>", entry, 1))
+    return items
+
+
+def make_v2(path, items):
+    maker = incremental.Maker(path, path + ".tmp")
+    for item in items:
+        maker.add_item(*item)
+    maker.finalize()
+
+
+def make_v1(path, items):
+    """Write a version 1 index, with the labels and paths inline"""
+    records = []
+    for plain, typecode, label, item_path, prio in items:
+        plain_e = enc_utf8(normalize_index_key(plain))
+        (typecode_e, label_e, path_e) = (
+            enc_utf8(typecode),
+            enc_utf8(label),
+            enc_utf8(item_path),
+        )
+        records.append(
+            (
+                normalize_index_key(plain),
+                prio,
+                pack(
+                    "<HBHHB",
+                    len(plain_e),
+                    len(typecode_e),
+                    len(label_e),
+                    len(path_e),
+                    prio,
+                )
+                + plain_e
+                + typecode_e
+                + label_e
+                + path_e,
+            )
+        )
+    records.sort(key=itemgetter(0, 1))
+    offsets = []
+    p = 4 * 4
+    for _, _, data in records:
+        offsets.append(p)
+        p += len(data)
+    with open(path, "wb") as f:
+        f.write(pack("<4I", incremental._MAGIC, 1, len(records), p))
+        f.write(b"".join(data for (_, _, data) in records))
+        f.write(b"".join(pack("<I", x) for x in offsets))
+
+
+def expected(items, key, limit):
+    key = normalize_index_key(key)
+    matches = [item for item in items if normalize_index_key(item[0]).startswith(key)]
+    matches.sort(key=lambda item: (normalize_index_key(item[0]), item[4]))
+    return [
+        (label, item_path, normalize_index_key(plain), prio, None)
+        for (plain, typecode, label, item_path, prio) in matches[:limit]
+    ]
+
+
+ITEMS = make_items(2000)
+KEYS = ["b", "back", "bell", "Bell", "cake ring", "café", "CAFE", "zz", "z", "w"]
+
+
+@pytest.fixture(scope="module", params=["v1", "v2"])
+def searcher(request, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("incremental") / "incremental.db")
+    {"v1": make_v1, "v2": make_v2}[request.param](path, ITEMS)
+    with incremental.Searcher(path) as searcher:
+        assert searcher._version == (1 if request.param == "v1" else 2)
+        yield searcher
+
+
+@pytest.mark.parametrize("key", KEYS)
+@pytest.mark.parametrize("limit", [1, 10, 10000])
+def test_search(searcher, key, limit):
+    assert searcher.search(key, limit) == expected(ITEMS, key, limit)
+
+
+def test_empty_key(searcher):
+    assert searcher.search("", 10) == []
+    assert searcher.search(" - ", 10) == []
+
+
+def test_strings_pooled(tmp_path):
+    path = str(tmp_path / "incremental.db")
+    make_v2(path, ITEMS)
+    with incremental.Searcher(path) as searcher:
+        # the tails and entries of the 500 entries are shared
+        assert searcher._num_strings < 2 * len(ITEMS)
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        b"",
+        pack("<4I", 0x12345678, 2, 1, 16),
+        pack("<4I", incremental._MAGIC, 3, 1, 16),
+        pack("<4I", incremental._MAGIC, 1, 0, 0),
+        pack("<4I", incremental._MAGIC, 1, 1, 16),  # truncated
+    ],
+)
+def test_broken(tmp_path, header):
+    path = str(tmp_path / "incremental.db")
+    with open(path, "wb") as f:
+        f.write(header)
+    with pytest.raises(incremental.IndexError):
+        incremental.Searcher(path)
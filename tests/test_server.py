@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os.path
+
+import pytest
+
+from ldoce5viewer import incremental, server
+from tests.helpers import make_compact, make_fulltext
+
+TARGETS = [
+    "/incremental?q=ba&limit=20",
+    "/search?q=back",
+    "/search?q=bell+cake&index=de&limit=10",
+    "/search?q=ring*&filters=233&itemtypes=hm,p",
+    "/correct?q=bakc",
+]
+
+
+@pytest.fixture(scope="module")
+def lookup_server(tmp_path_factory, items):
+    index_dir = str(tmp_path_factory.mktemp("server"))
+    make_compact(os.path.join(index_dir, "compact_hp.idx"), items)
+    make_fulltext(os.path.join(index_dir, "fulltext_de"), items)
+    path = os.path.join(index_dir, "incremental.db")
+    maker = incremental.Maker(path, path + ".tmp")
+    for itemtype, content, asfilter, label, item_path, prio, sortkey in items:
+        maker.add_item(sortkey, "h", label, item_path, prio)
+    maker.finalize()
+
+    lookup_server = server.LookupServer(index_dir, index_dir, jobs=8)
+    yield lookup_server
+    lookup_server.close()
+
+
+def respond(lookup_server, *targets):
+    async def main():
+        return await asyncio.gather(
+            *(lookup_server.respond("GET", target) for target in targets)
+        )
+
+    return asyncio.run(main())
+
+
+def test_responses(lookup_server):
+    for status, content_type, body in respond(lookup_server, *TARGETS):
+        assert (status, content_type) == (200, server._JSON)
+        assert json.loads(body)
+
+
+def test_concurrent_requests(lookup_server, fast_switching):
+    expected = respond(lookup_server, *TARGETS)
+    assert respond(lookup_server, *(TARGETS * 20)) == expected * 20
+
+
+@pytest.mark.parametrize(
+    "target",
+    [
+        "/incremental?q=ba&limit=0",
+        "/search?q=back&limit=0",
+        "/search?q=back&index=de&limit=0",
+        "/search?q=back&index=de&limit=-5",
+        "/correct?q=bakc&limit=0",
+    ],
+)
+def test_limit_clamped(lookup_server, target):
+    """Limits below 1 return one result"""
+    ((status, content_type, body),) = respond(lookup_server, target)
+    assert status == 200
+    assert len(json.loads(body)) == 1
+
+
+@pytest.mark.parametrize(
+    "method, target, status",
+    [
+        ("POST", "/search?q=back", 405),
+        ("GET", "/nothing", 404),
+        ("GET", "/search?q=back&index=xx", 400),
+        ("GET", "/incremental?q=ba&limit=x", 400),
+    ],
+)
+def test_errors(lookup_server, method, target, status):
+    async def main():
+        return await lookup_server.respond(method, target)
+
+    (code, content_type, body) = asyncio.run(main())
+    assert code == status
+    assert "error" in json.loads(body)
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+from whoosh import index as wh_index
+
+from ldoce5viewer import spelling
+
+VOCABULARY = {
+    "hello": 30,
+    "help": 20,
+    "yellow": 5,
+    "world": 12,
+    "word": 40,
+    "spelling": 3,
+    "international": 2,
+}
+
+
+@pytest.fixture(scope="module")
+def corrector(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("spelling") / "spelling.cdb")
+    maker = spelling.Maker(path)
+    for word, freq in VOCABULARY.items():
+        maker.add_word(word, freq)
+    maker.commit()
+    corrector = spelling.Corrector(path)
+    yield corrector
+    corrector.close()
+
+
+def suggested(corrector, misspelled, limit=None):
+    return [word for (word, score) in corrector.suggest(misspelled, limit)]
+
+
+def test_edit_distance():
+    assert spelling.edit_distance("hello", "hello", 2) == 0
+    assert spelling.edit_distance("hello", "hxlxo", 2) == 2
+    assert spelling.edit_distance("hello", "help", 2) == 2
+    assert spelling.edit_distance("hello", "world", 2) == 3
+
+
+def test_two_substitutions(corrector):
+    assert "hello" in suggested(corrector, "hxlxo")
+    assert "world" in suggested(corrector, "wxrlx")
+
+
+def test_order(corrector):
+    # by distance, then by frequency
+    assert suggested(corrector, "helo") == ["hello", "help"]
+    assert suggested(corrector, "hello") == ["help", "yellow"]
+
+
+def edits(word, rand):
+    """A random string within an edit distance of 2 of word"""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    for _ in range(rand.randint(1, 2)):
+        i = rand.randrange(len(word))
+        op = rand.choice("sid")
+        if op == "s":
+            word = word[:i] + rand.choice(letters) + word[i + 1 :]
+        elif op == "i":
+            word = word[:i] + rand.choice(letters) + word[i:]
+        else:
+            word = word[:i] + word[i + 1 :]
+    return word
+
+
+def test_recall(corrector):
+    rand = random.Random(0)
+    for word in VOCABULARY:
+        for _ in range(200):
+            misspelled = edits(word, rand)
+            if misspelled != word and len(misspelled) > 1:
+                assert word in suggested(corrector, misspelled), misspelled
+
+
+@pytest.mark.parametrize("misspelled", ["bakc", "xing", "tpre", "hxcx", "rilng"])
+def test_whoosh_suggestions(fulltext_dir, misspelled):
+    """The suggestions of the whoosh corrector that it replaces are kept"""
+    corrector = spelling.Corrector(f"{fulltext_dir}/spelling.cdb")
+    index = wh_index.open_dir(fulltext_dir)
+    try:
+        with index.searcher() as searcher:
+            expected = searcher.corrector("content").suggest(misspelled, 100)
+        assert expected
+        assert set(expected) <= set(suggested(corrector, misspelled))
+    finally:
+        corrector.close()
+        index.close()
@@ -0,0 +1,188 @@
+import os.path
+from struct import pack
+
+import pytest
+from whoosh import index as wh_index
+from whoosh.fields import ID, IDLIST, STORED, TEXT, Schema
+
+from ldoce5viewer import fulltext, storedfields
+from ldoce5viewer.utils.text import enc_utf8, normalize_index_key
+
+DOCS = [
+    # label, path, prio, sortkey, content
+    ("<h>back</h>", "/fs/u001", 1, "back", "back"),
+    ("<e>back up</e> &mdash; <h>back</h>", "/fs/u001#p1", 2, "back up", "back up"),
+    ("<e>back off</e> &mdash; <h>back</h>", "/fs/u001#p2", 30, "back off", "off"),
+    ("<h>café</h>", "/fs/u002", 65535, "Café", "café au lait"),
+    ("<c><o>café au lait</o> (café)</c>", "/fs/u002#p1", 3, "café au lait", "x"),
+    ("<h><v>cafés</v> &rarr; café</h>", "/fs/u002", 20, "cafés", "cafés"),
+    ("", "", 0, "", ""),
+    ("a &mdash; b &mdash; c", "/x#y#z", 7, "Ünïcödé key", "x" * 70000),
+]
+
+
+def make(path, docs):
+    maker = storedfields.Maker(path, path + ".tmp")
+    try:
+        for label, item_path, prio, sortkey, content in docs:
+            maker.add(label, item_path, prio, sortkey, content)
+        maker.commit()
+    finally:
+        maker.close()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "stored.dat")
+
+
+def test_round_trip(path):
+    make(path, DOCS)
+    assert not os.path.exists(path + ".tmp")
+    reader = storedfields.Reader(path)
+    try:
+        assert reader.num_docs == len(DOCS)
+        for docnum, (label, item_path, prio, sortkey, content) in enumerate(DOCS):
+            key = normalize_index_key(sortkey)
+            assert reader.data(docnum) == (label, item_path, prio, key)
+            assert reader.sortkey(docnum) == key
+            assert reader.content(docnum) == content
+    finally:
+        reader.close()
+
+
+def test_strings_pooled(path):
+    make(path, DOCS[:3])
+    reader = storedfields.Reader(path)
+    # " &mdash; <h>back</h>" is the tail of two, "" the tail and fragment
+    # of the first, and "/fs/u001" the entry of all three: 3 heads, "",
+    # 1 tail, 1 entry, 2 fragments and 3 sortkeys
+    assert reader._num_strings == 11
+    reader.close()
+
+
+def make_v1(path, docs):
+    """Write a version 1 file, whose labels are split at " &mdash; " only"""
+    strings = {}
+
+    def intern(s):
+        return strings.setdefault(s, len(strings))
+
+    records = []
+    contents = []
+    for label, item_path, prio, sortkey, content in docs:
+        (head, sep, tail) = label.partition(" &mdash; ")
+        (entry, sep_path, fragment) = item_path.partition("#")
+        records.append(
+            storedfields._pack_record(
+                intern(head),
+                intern(tail) if sep else storedfields._NO_TAIL,
+                intern(entry),
+                intern(sep_path + fragment),
+                intern(normalize_index_key(sortkey)),
+                prio,
+            )
+        )
+        contents.append(enc_utf8(content))
+    pool = [enc_utf8(s) for s in strings]
+    p_string_offsets = 32 + storedfields._struct_record.size * len(docs)
+    p_content_offsets = p_string_offsets + 4 * (len(pool) + 1)
+    p_strings = p_content_offsets + 4 * (len(docs) + 1)
+    with open(path, "wb") as f:
+        f.write(
+            pack(
+                "<8I",
+                storedfields._MAGIC,
+                1,
+                len(docs),
+                len(pool),
+                p_string_offsets,
+                p_content_offsets,
+                p_strings,
+                p_strings + sum(map(len, pool)),
+            )
+        )
+        f.write(b"".join(records))
+        for blobs in (pool, contents):
+            offsets = [0]
+            for blob in blobs:
+                offsets.append(offsets[-1] + len(blob))
+            f.write(b"".join(pack("<I", x) for x in offsets))
+        f.write(b"".join(pool) + b"".join(contents))
+
+
+def test_version_1(path):
+    make_v1(path, DOCS)
+    reader = storedfields.Reader(path)
+    try:
+        for docnum, (label, item_path, prio, sortkey, content) in enumerate(DOCS):
+            key = normalize_index_key(sortkey)
+            assert reader.data(docnum) == (label, item_path, prio, key)
+            assert reader.content(docnum) == content
+    finally:
+        reader.close()
+
+
+def test_empty(path):
+    make(path, [])
+    reader = storedfields.Reader(path)
+    assert reader.num_docs == 0
+    reader.close()
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"\0" * 8,
+        pack("<8I", 0x12345678, 1, 0, 0, 0, 0, 0, 0),
+        pack("<8I", storedfields._MAGIC, 99, 0, 0, 0, 0, 0, 0),
+    ],
+)
+def test_broken(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    with pytest.raises(storedfields.IndexError):
+        storedfields.Reader(path)
+
+
+def test_fulltext_old_index(tmp_path, items, fulltext_dir, var_path):
+    """Indexes made before storedfields keep the fields in whoosh"""
+    schema = Schema(
+        content=TEXT(stored=True, spelling=True, analyzer=fulltext._analyzer),
+        data=STORED,
+        itemtype=ID,
+        asfilter=IDLIST,
+    )
+    schema["content"].scorable = False
+    old_dir = str(tmp_path / "old")
+    os.mkdir(old_dir)
+    index = wh_index.create_in(old_dir, schema)
+    writer = index.writer()
+    for itemtype, content, asfilter, label, item_path, prio, sortkey in items:
+        writer.add_document(
+            itemtype=itemtype,
+            content=content,
+            asfilter=asfilter,
+            data=(label, item_path, prio, normalize_index_key(sortkey)),
+        )
+    writer.commit()
+    index.close()
+
+    old = fulltext.Searcher(old_dir, var_path)
+    new = fulltext.Searcher(fulltext_dir, var_path)
+    try:
+        assert not os.path.exists(os.path.join(old_dir, "stored.dat"))
+        for query in ("back", "bell cake", "ring*"):
+            for highlight in (False, True):
+                results = [
+                    s.search(s.make_collector(None), query, highlight=highlight)
+                    for s in (old, new)
+                ]
+                assert results[0]
+                assert results[0] == results[1]
+        for s in (old, new):
+            assert s.search(s.make_collector(0), "back") == []
+    finally:
+        old.close()
+        new.close()
@@ -0,0 +1,104 @@
+import random
+import unicodedata
+
+import pytest
+
+from ldoce5viewer.utils.text import (
+    normalize_index_key,
+    normalize_token,
+    split_label,
+    split_path,
+)
+from tests.entries import corpus_stream, synthetic_stream
+
+
+def reference_normalize_token(t):
+    key = t.replace("©", "c")
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", key) if unicodedata.category(c) != "Mn"
+    )
+
+
+def reference_normalize_index_key(key):
+    key = key.strip().lower().replace("©", "c")
+    return "".join(
+        c
+        for c in unicodedata.normalize("NFKD", key)
+        if unicodedata.category(c) in ("Ll", "Nd")
+    )
+
+
+WORDS = [
+    "take",
+    "café",
+    "naïve",
+    "o'clock",
+    "Ångström",
+    "résumé",
+    "well-known",
+    "déjà",
+    "façade",
+    "copyright©",
+    "piñata",
+    "Zürich",
+    "ﬁne",  # a ligature
+    "x²",
+    "éè",  # combining marks
+    "a’b—c",  # general punctuation
+    "Ωmega",  # outside the repertoire: the slow path
+    "日本語",
+    "  Spaced Out  ",
+    "",
+]
+
+
+@pytest.mark.parametrize("word", WORDS)
+def test_words(word):
+    assert normalize_token(word.lower()) == reference_normalize_token(word.lower())
+    assert normalize_index_key(word) == reference_normalize_index_key(word)
+
+
+def test_repertoire():
+    """Each character up to U+036F and of general punctuation"""
+    for c in map(chr, (*range(0x370), *range(0x2000, 0x2070))):
+        assert normalize_token(c) == reference_normalize_token(c), hex(ord(c))
+        assert normalize_index_key(c) == reference_normalize_index_key(c), hex(ord(c))
+
+
+def test_random_strings():
+    rand = random.Random(0)
+    chars = [chr(c) for c in (*range(0x20, 0x370), *range(0x2000, 0x2070))]
+    chars += ["Α", "ω", "一", "ẞ", "ﬁ"]
+    for _ in range(5000):
+        s = "".join(rand.choice(chars) for _ in range(rand.randint(1, 12)))
+        assert normalize_token(s) == reference_normalize_token(s), repr(s)
+        assert normalize_index_key(s) == reference_normalize_index_key(s), repr(s)
+
+
+def check_stream(tokens, keys):
+    for t in tokens:
+        assert normalize_token(t) == reference_normalize_token(t), repr(t)
+    for k in keys:
+        assert normalize_index_key(k) == reference_normalize_index_key(k), repr(k)
+
+
+def test_synthetic_stream():
+    check_stream(*synthetic_stream(10000))
+
+
+def test_archive(srcdir):
+    check_stream(*corpus_stream(srcdir))
+
+
+def test_split():
+    assert split_label("<h>back</h>") == ("<h>back</h>", "")
+    assert split_label("<c><o>back up</o> (back)</c>") == (
+        "<c><o>back up",
+        "</o> (back)</c>",
+    )
+    assert split_label("<h><v>backs</v> &rarr; back</h>") == (
+        "<h><v>backs</v>",
+        " &rarr; back</h>",
+    )
+    assert split_path("/fs/u001#p1") == ("/fs/u001", "#p1")
+    assert split_path("/fs/u001") == ("/fs/u001", "")
@@ -0,0 +1,95 @@
+"""body2html() against the element-tree transformer it replaced"""
+
+import random
+
+import lxml.etree as et
+import pytest
+
+from ldoce5viewer.ldoce5.transform_body import _WRITE_MAP, body2html
+from tests.body2html_tree import body2html_tree
+from tests.entries import BODY_ENTRY, archive_entries
+
+BODIES = [
+    BODY_ENTRY,
+    b"<Entry><Sense><span>text</span></Sense></Entry>",
+    b"<Sense><EXPL>a <EXAMPLE>b</EXAMPLE><EXAMPLE>c</EXAMPLE></EXPL></Sense>",
+    b"<Tail><GramBox/><GramBox/>x<GramBox/><span/><GramBox/><span></span></Tail>",
+    b'<Entry><span class="heading">h</span><Ref topic="a">x<Sense/><br/></Ref></Entry>',
+    b'<Subsense><ACTIV/><Hint/><span class="exabullet"/><Hint/></Subsense>',
+    b"<GramExa><INFLX/></GramExa>",
+    b"<ACTIV>skipped</ACTIV>",
+    b"<span>bare text</span>",
+]
+
+
+_TAGS = list(_WRITE_MAP) + ["DEF", "BASE", "GLOSS"]
+_TAGS.remove("Ref")
+_TAGS.remove("ILLUSTRATION")
+_TAGS.remove("Audio")
+_TEXTS = [None, "", " ", "a", " a", "b ", " c d ", ";", ", →", " at "]
+_TEXTS += ["x‧y", "&<>", '"']
+
+
+def random_element(rand, depth=0):
+    tag = rand.choice(_TAGS) if depth else "Entry"
+    elem = et.Element(tag)
+    if tag == "span" and rand.random() < 0.5:
+        elem.set("class", rand.choice(["neutral", "sensenum", "heading", "exabullet"]))
+    if rand.random() < 0.3:
+        elem.set("id", rand.choice(["a.b.c.d", "x.y", ""]))
+    elem.text = rand.choice(_TEXTS) if depth else None
+    if depth < 4:
+        for _ in range(rand.randrange(5)):
+            c = random_element(rand, depth + 1)
+            c.tail = rand.choice(_TEXTS)
+            elem.append(c)
+    return elem
+
+
+def random_body(rand):
+    return et.tostring(random_element(rand))
+
+
+def render(data):
+    return (body2html(et.fromstring(data)), body2html_tree(et.fromstring(data)))
+
+
+@pytest.mark.parametrize("data", BODIES)
+def test_bodies(data):
+    (html, expected) = render(data)
+    assert html == expected
+
+
+def test_random_bodies():
+    rand = random.Random(0)
+    for _ in range(1000):
+        data = random_body(rand)
+        (html, expected) = render(data)
+        assert html == expected, data
+
+
+def test_pretty_printed():
+    """The newlines of lxml's pretty printer, that the viewer's pages keep"""
+    (html, expected) = render(BODIES[2])
+    assert html == (
+        '<div class="sense"><span class="expl">a '
+        '<div class="example">b</div>\n<div class="example">c</div></span></div>\n'
+    )
+    assert html == expected
+    (html, expected) = render(BODIES[3])
+    assert html == (
+        '<div class="tail">\n<div class="grambox"></div>\n<div class="grambox"></div>'
+        'x<div class="grambox"></div>\n<div class="grambox"></div>\n</div>\n'
+    )
+    assert html == expected
+
+
+def test_empty():
+    assert render(b"<ACTIV>skipped</ACTIV>") == ("", "")
+    assert render(b"<span>bare text</span>") == ("", "")
+
+
+def test_archive(srcdir):
+    for data in archive_entries(srcdir):
+        (html, expected) = render(data)
+        assert html == expected, data